@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI分析结果缓存
+按图片内容MD5（与 app.py 中的图片 id 相同）保存模型返回的类型和关键词，
+重复下载的图片和中断后重新运行时不再调用API
+"""
+
+import os
+import json
+import time
+import sqlite3
+import threading
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS analysis (
+    md5 TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    keywords TEXT NOT NULL,
+    model TEXT,
+    created_at REAL NOT NULL
+);
+"""
+
+
+class AnalysisCache:
+    """分析结果缓存类（线程安全，命中/未命中次数用于批量处理结束时的统计）"""
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, md5):
+        """查找缓存的分析结果，命中返回 {'type', 'keywords'}，未命中返回None"""
+        row = self._connect().execute(
+            'SELECT type, keywords FROM analysis WHERE md5 = ?', (md5,)
+        ).fetchone()
+        with self._stats_lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return {'type': row[0], 'keywords': json.loads(row[1])}
+
+    def put(self, md5, analysis, model=None):
+        """保存分析结果（同一内容再次分析时覆盖）"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO analysis (md5, type, keywords, model, created_at) VALUES (?, ?, ?, ?, ?)',
+                (md5, analysis['type'], json.dumps(analysis['keywords'], ensure_ascii=False), model, time.time())
+            )
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM analysis').fetchone()[0]
+
+    def stats(self):
+        """命中统计"""
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 3) if total else None,
+            'entries': len(self)
+        }
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self.hits = 0
+            self.misses = 0
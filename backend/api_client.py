@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型API客户端
+复用 requests.Session 连接池，带连接/读取超时、指数退避重试（遵循 Retry-After）和熔断，
+并统计每次请求的耗时与重试次数，供 rename.py 调整并发与速率
+"""
+
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# 可重试的HTTP状态码：限流与服务端临时错误
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class ApiError(Exception):
+    """API请求失败（重试耗尽或不可重试的错误）"""
+
+
+class CircuitOpenError(ApiError):
+    """熔断中：连续失败过多，暂停发起请求"""
+
+
+def parse_retry_after(value):
+    """解析 Retry-After 响应头（秒数或HTTP日期），返回等待秒数，无法解析时返回None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ApiClient:
+    """
+    线程安全的API客户端
+    - 同一个 Session 在线程间共享，连接池大小 pool_size 应不小于并发数
+    - 失败后按 backoff_base * 2^n 加全随机抖动等待，服务端给出 Retry-After 时至少等待该时长
+    - 连续 breaker_threshold 次失败后熔断 breaker_cooldown 秒，之后放行一个试探请求
+    """
+
+    def __init__(self, api_key, connect_timeout=10.0, read_timeout=120.0, max_retries=4,
+                 backoff_base=1.0, backoff_max=60.0, pool_size=10,
+                 breaker_threshold=5, breaker_cooldown=30.0):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}"
+        })
+
+        self._lock = threading.Lock()
+        # 熔断状态：连续失败次数、熔断截止时间、是否已有试探请求在进行
+        self._consecutive_failures = 0
+        self._open_until = 0.0
+        self._probing = False
+        # 统计
+        self._latencies = []
+        self._retry_counts = {}
+        self._counters = {'calls': 0, 'attempts': 0, 'succeeded': 0, 'failed': 0,
+                          'retries': 0, 'rejected': 0}
+
+    def post_json(self, url, payload):
+        """发送JSON请求，返回成功（2xx）的响应；失败时抛出 ApiError"""
+        with self._lock:
+            self._counters['calls'] += 1
+
+        attempt = 0
+        while True:
+            self._before_attempt()
+            started = time.perf_counter()
+            error, retry_after, retryable = None, None, True
+            try:
+                response = self.session.post(url, json=payload, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = f"网络错误：{e}"
+            except requests.exceptions.RequestException as e:
+                error, retryable = f"请求错误：{e}", False
+            else:
+                if response.ok:
+                    self._record(started, success=True, attempt=attempt)
+                    return response
+                error = f"HTTP {response.status_code}：{response.text[:200]}"
+                retryable = response.status_code in RETRY_STATUS
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+
+            # 不可重试的错误（如401、400）说明请求本身有问题，不计入熔断
+            self._record(started, success=False, attempt=attempt, count_failure=retryable)
+            if not retryable or attempt >= self.max_retries:
+                with self._lock:
+                    self._counters['failed'] += 1
+                    self._retry_counts[attempt] = self._retry_counts.get(attempt, 0) + 1
+                raise ApiError(f"API请求失败（已尝试 {attempt + 1} 次）：{error}")
+
+            delay = self.backoff_delay(attempt, retry_after)
+            attempt += 1
+            with self._lock:
+                self._counters['retries'] += 1
+            print(f"API请求失败，{delay:.1f} 秒后第 {attempt} 次重试：{error}")
+            time.sleep(delay)
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """第 attempt 次失败后的等待时间（全随机抖动，服务端要求时至少等待 Retry-After）"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    def _before_attempt(self):
+        """熔断检查：熔断期间直接拒绝；冷却结束后只放行一个试探请求"""
+        with self._lock:
+            if self._consecutive_failures < self.breaker_threshold:
+                return
+            if time.monotonic() < self._open_until or self._probing:
+                self._counters['rejected'] += 1
+                raise CircuitOpenError(
+                    f"API连续失败 {self._consecutive_failures} 次，熔断中，请稍后再试"
+                )
+            self._probing = True
+
+    def _record(self, started, success, attempt, count_failure=True):
+        """记录一次请求的耗时并更新熔断状态"""
+        latency = time.perf_counter() - started
+        with self._lock:
+            self._counters['attempts'] += 1
+            self._latencies.append(latency)
+            self._probing = False
+            if success:
+                self._counters['succeeded'] += 1
+                self._retry_counts[attempt] = self._retry_counts.get(attempt, 0) + 1
+                self._consecutive_failures = 0
+            elif count_failure:
+                self._consecutive_failures += 1
+                if self._consecutive_failures >= self.breaker_threshold:
+                    self._open_until = time.monotonic() + self.breaker_cooldown
+
+    @property
+    def circuit_open(self):
+        with self._lock:
+            return (self._consecutive_failures >= self.breaker_threshold
+                    and time.monotonic() < self._open_until)
+
+    def stats(self):
+        """请求统计：调用次数、重试次数分布（重试次数 -> 调用数）与耗时分位数（秒）"""
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = dict(self._counters)
+            stats['retry_histogram'] = dict(sorted(self._retry_counts.items()))
+            stats['circuit_open'] = (self._consecutive_failures >= self.breaker_threshold
+                                     and time.monotonic() < self._open_until)
+        if latencies:
+            stats['latency'] = {
+                'avg': round(sum(latencies) / len(latencies), 3),
+                'p50': round(latencies[len(latencies) // 2], 3),
+                'p95': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+                'max': round(latencies[-1], 3)
+            }
+        return stats
+
+    def reset_stats(self):
+        """清空统计（不影响熔断状态）"""
+        with self._lock:
+            self._latencies = []
+            self._retry_counts = {}
+            self._counters = dict.fromkeys(self._counters, 0)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+精简的列表接口输出格式
+完整格式中 url、thumbnail、srcset、tag、keywords 都可以由相对路径、图片ID和宽度推导，
+精简格式只输出不可推导的字段，/api?format=compact 按行数组返回，/api/export 按 NDJSON 逐行流式返回
+"""
+
+import json
+
+try:
+    import orjson  # 可选依赖，序列化速度比标准库快数倍
+except ImportError:
+    orjson = None
+
+# 精简格式的字段（顺序即 format=compact 中每行数组的顺序）
+COMPACT_FIELDS = ('id', 'path', 'width', 'height', 'size', 'uploaded_at', 'color')
+
+# 流式导出时每次发送的记录数
+EXPORT_CHUNK = 1000
+
+
+def dumps(payload):
+    """序列化为紧凑的UTF-8 JSON（bytes），安装了 orjson 时使用 orjson"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def compact_row(img):
+    """图片记录（ImageRecord）-> 精简格式的一行（按 COMPACT_FIELDS 顺序）"""
+    return [img.id, img.path, img.width, img.height, img.size, img.uploaded_at, img.color]
+
+
+def iter_ndjson(images, positions, chunk=EXPORT_CHUNK):
+    """按排序位置逐块生成 NDJSON（每行一个以 COMPACT_FIELDS 为键的对象），不构造完整列表"""
+    for start in range(0, len(positions), chunk):
+        yield b''.join(
+            dumps(dict(zip(COMPACT_FIELDS, compact_row(images[position])))) + b'\n'
+            for position in positions[start:start + chunk]
+        )
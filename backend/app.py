@@ -5,15 +5,26 @@
 """
 
 import os
-import json
 import glob
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from flask import Flask, request, jsonify, send_from_directory
-from PIL import Image
-import hashlib
+from flask import Flask, request, jsonify, send_file, send_from_directory
 
 # 导入配置
 from config import config
+from thumbnail_store import ThumbnailStore, FORMATS
+from image_record import ImageRecord, describe_path, extract_tags, extract_keywords
+from library_index import LibrarySnapshot, CategoryIndex, ORIENTATIONS, WIDTH_ALIASES, encode_cursor
+from indexer import LibraryIndexer
+from metadata_store import MetadataStore
+from perceptual_hash import NO_HASH, dhash_image, to_hex, from_hex
+from color_features import NO_ROW, COLOR_FAMILIES, FeatureMatrix, load_sample, sample_colors
+from pregenerate import spawn_background
+from api_format import COMPACT_FIELDS, dumps, compact_row, iter_ndjson
+from file_hash import md5_file, stat_fingerprint
+from image_probe import probe_dimensions
 
 # 项目根目录
 ROOT_DIR = config.ROOT_DIR
@@ -26,6 +37,37 @@ class Config:
     ALLOWED_EXTENSIONS = config.ALLOWED_EXTENSIONS
     # 缩略图缓存目录（基于backend目录）
     THUMBNAIL_DIR = config.THUMBNAIL_DIR
+    # 缩略图尺寸与质量
+    THUMBNAIL_SIZE = config.THUMBNAIL_SIZE
+    THUMBNAIL_QUALITY = config.THUMBNAIL_QUALITY
+    # 缩略图磁盘缓存上限（字节）
+    THUMBNAIL_CACHE_MAX_BYTES = config.THUMBNAIL_CACHE_MAX_MB * 1024 * 1024
+    # 每个进程同时生成缩略图（解码原图）的数量上限
+    THUMBNAIL_MAX_DECODES = config.THUMBNAIL_MAX_DECODES
+    # 响应式尺寸变体的宽度档位（升序）与编码质量
+    RESIZED_WIDTHS = config.RESIZED_WIDTHS
+    RESIZED_QUALITY = config.RESIZED_QUALITY
+    # 扫描发现变化后自动在后台预生成缩略图
+    PREGENERATE_AFTER_INDEX = config.PREGENERATE_AFTER_INDEX
+    # 近似重复判定的感知哈希汉明距离（允许的上限与默认值）
+    # 半径越大多索引哈希每段越短、候选越多：10万张图片时全库分组半径4约1秒、6约12秒、8以上超过1分钟（超出 worker 超时），
+    # 见 benchmarks/bench_duplicates.py
+    DUPLICATE_MAX_RADIUS = 6
+    DUPLICATE_RADIUS = min(config.DUPLICATE_RADIUS, DUPLICATE_MAX_RADIUS)
+    # /api 单次返回数量上限（完整格式 / 精简格式）
+    API_MAX_COUNT = 100
+    API_COMPACT_MAX_COUNT = 1000
+    # 数据目录与图片元数据数据库
+    DATA_DIR = config.DATA_DIR
+    CACHE_DB = config.CACHE_DB
+    # 颜色特征矩阵文件
+    FEATURE_FILE = config.FEATURE_FILE
+    # 后台索引扫描间隔（秒）
+    INDEX_INTERVAL = config.INDEX_INTERVAL
+    # 扫描时并行计算哈希、读取尺寸的线程数
+    SCAN_WORKERS = config.SCAN_WORKERS
+    # 原图浏览器缓存时间（秒），过期后凭 Last-Modified/ETag 重新验证
+    IMAGE_CACHE_MAX_AGE = config.IMAGE_CACHE_MAX_AGE
     # 静态文件目录（基于项目根目录）
     STATIC_DIR = config.STATIC_DIR
 
@@ -37,201 +79,470 @@ os.makedirs(Config.THUMBNAIL_DIR, exist_ok=True)
 
 class WallpaperManager:
     def __init__(self):
-        # 使用 backend 目录定义缓存文件的绝对路径
-        self.cache_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wallpaper_cache.json')
+        # 图片元数据存储（SQLite）
+        self.store = MetadataStore(Config.CACHE_DB)
+        # 旧版JSON缓存文件，首次启动时导入数据库
+        self.legacy_cache_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wallpaper_cache.json')
+        self.migrate_legacy_cache()
+        # 颜色特征矩阵（行号保存在数据库中）
+        self.features = FeatureMatrix(Config.FEATURE_FILE)
         self.image_cache = self.load_cache()
+        # 反向索引：图片ID -> 相对路径元组（内容相同的副本共用一个ID），相对路径 -> 图片ID
+        self.id_index = {}
+        self.path_index = {}
+        # 分类树及计数
+        self.category_index = CategoryIndex()
+        # 索引变更计数：与生成快照时的值相同说明图库没有变化，无需重建快照
+        self._changes = 0
+        self._snapshot_changes = -1
+        self.rebuild_index()
+        # 当前图库快照（由后台索引线程更新，请求只读取）
+        self.snapshot = None
+        self._generation = 0
+        # 最近一次扫描的完成时间与耗时
+        self.last_scan_at = None
+        self.last_scan_duration = None
+        # 最近一次扫描中新增或变化的图片文件路径（供缩略图预生成）
+        self.last_changed_paths = []
+        # 保证同一时间只有一个扫描或清空缓存操作
+        self._scan_lock = threading.Lock()
+        # 数据库中的图库版本标记，多进程部署时用于发现其他进程写入的变化
+        self._store_version = self.store.get_meta('library_version')
+    
+    def migrate_legacy_cache(self):
+        """把旧版 wallpaper_cache.json 一次性导入数据库"""
+        if not os.path.exists(self.legacy_cache_file) or self.store.get_meta('migrated_from'):
+            return
+        try:
+            count = self.store.migrate_from_json(self.legacy_cache_file, self.describe_path)
+            print(f"已从 {self.legacy_cache_file} 导入 {count} 条图片缓存")
+        except Exception as e:
+            # 保留旧文件以便排查，本次启动将重新扫描生成数据
+            print(f"导入旧缓存失败: {self.legacy_cache_file}, 错误: {e}")
     
     def load_cache(self):
-        """加载图片缓存"""
-        if os.path.exists(self.cache_file):
-            try:
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except:
-                return {}
-        return {}
+        """从数据库加载图片缓存（相对路径 -> ImageRecord）"""
+        cache = {}
+        for row, keywords in self.store.iter_images():
+            path = row['path']
+            cache[path] = ImageRecord(
+                path, row['id'], row['width'], row['height'], row['size'], row['uploaded_at'], row['color'],
+                mtime=row['mtime'],
+                fingerprint=self.store.row_fingerprint(row),
+                phash=from_hex(row['phash']),
+                feature_row=row['feature_row']
+            )
+        self.features.reserve(
+            record.feature_row for record in cache.values()
+            if record.feature_row not in (None, NO_ROW)
+        )
+        return cache
     
-    def save_cache(self):
-        """保存图片缓存"""
-        with open(self.cache_file, 'w', encoding='utf-8') as f:
-            json.dump(self.image_cache, f, ensure_ascii=False, indent=2)
+    def save_image(self, record):
+        """更新单张图片的缓存并写入数据库"""
+        relative_path = record.path
+        self.image_cache[relative_path] = record
+        self._index_add(relative_path, record.id)
+        category, image_type, keywords = self.describe_path(relative_path)
+        self.store.upsert_image(relative_path, record.mtime, record.to_dict(), category, image_type, keywords,
+                                record.fingerprint, to_hex(record.phash) if record.phash is not None else None,
+                                record.feature_row, record.color)
+    
+    def remove_image(self, relative_path):
+        """移除单张图片的缓存和数据库记录"""
+        cached = self.image_cache.pop(relative_path, None)
+        if cached:
+            self.features.free(cached.feature_row)
+        self._index_remove(relative_path)
+        self.store.delete_image(relative_path)
+    
+    def rebuild_index(self):
+        """根据图片缓存重建反向索引和分类树（构建完成后整体替换，并发读取不会看到半成品）"""
+        id_index = {}
+        path_index = {}
+        category_index = CategoryIndex()
+        for cache_key, record in self.image_cache.items():
+            image_id = record.id
+            id_index[image_id] = id_index.get(image_id, ()) + (cache_key,)
+            path_index[cache_key] = image_id
+            category_index.add(*self._category_info(cache_key))
+        self.id_index, self.path_index, self.category_index = id_index, path_index, category_index
+        self._changes += 1
+    
+    def _index_add(self, relative_path, image_id):
+        """登记一条索引（同一路径的旧ID会被替换）"""
+        self._index_remove(relative_path)
+        self.id_index[image_id] = self.id_index.get(image_id, ()) + (relative_path,)
+        self.path_index[relative_path] = image_id
+        self.category_index.add(*self._category_info(relative_path))
+        self._changes += 1
+    
+    def _index_remove(self, relative_path):
+        """移除一条索引"""
+        image_id = self.path_index.pop(relative_path, None)
+        if image_id is None:
+            return
+        # 元组整体替换，并发读取不会看到修改中的数据；还有其他副本时ID继续指向剩下的路径
+        remaining = tuple(path for path in self.id_index.get(image_id, ()) if path != relative_path)
+        if remaining:
+            self.id_index[image_id] = remaining
+        else:
+            self.id_index.pop(image_id, None)
+        self.category_index.remove(*self._category_info(relative_path))
+        self._changes += 1
+    
+    def _category_info(self, relative_path):
+        """分类树所需的（标签, 图片类型, 关键词）"""
+        _, image_type, keywords = self.describe_path(relative_path)
+        return self.extract_tags(relative_path), image_type, keywords
+    
+    def get_image_path(self, image_id):
+        """根据图片ID查找相对路径（有多个副本时返回最早登记的一个），找不到返回None"""
+        paths = self.id_index.get(image_id)
+        return paths[0] if paths else None
     
     def clear_cache(self):
         """清空缓存，强制重新扫描"""
-        self.image_cache = {}
-        if os.path.exists(self.cache_file):
-            os.remove(self.cache_file)
+        with self._scan_lock:
+            self.image_cache = {}
+            self.rebuild_index()
+            self.store.clear()
+            self.features.reserve(())
+            self._bump_store_version()
         print("缓存已清空，下次扫描将重新生成所有数据")
     
+    def get_snapshot(self):
+        """获取当前图库快照（尚未扫描过时同步扫描一次）"""
+        snapshot = self.snapshot
+        if snapshot is None:
+            snapshot = self.refresh_snapshot(only_if_missing=True)
+        return snapshot
+    
+    def refresh_snapshot(self, only_if_missing=False):
+        """重新扫描图库，有变化时写入数据库并发布新快照"""
+        with self._scan_lock:
+            # 等待锁期间其他线程可能已完成首次扫描
+            if only_if_missing and self.snapshot is not None:
+                return self.snapshot
+            # 其他进程修改过数据库（例如在另一个worker中清空了缓存），先同步
+            if self.store.get_meta('library_version') != self._store_version:
+                self._reload_from_store()
+            
+            started = time.time()
+            changes_before = self._changes
+            images = self.scan_images()
+            self.last_scan_at = time.time()
+            self.last_scan_duration = self.last_scan_at - started
+            if self._changes != changes_before:
+                # 特征向量先落盘，再通知其他进程按数据库中的行号读取
+                self.features.flush()
+                self._bump_store_version()
+            return self._publish_snapshot(images)
+    
+    def sync_from_store(self):
+        """
+        不扫描文件系统，只从数据库同步其他进程（负责扫描的worker）写入的变化
+        有变化时发布新快照
+        """
+        version = self.store.get_meta('library_version')
+        if self.snapshot is not None and version == self._store_version:
+            return self.snapshot
+        with self._scan_lock:
+            self._reload_from_store()
+            self.last_scan_at = time.time()
+            self.last_scan_duration = 0.0
+            return self._publish_snapshot(list(self.image_cache.values()))
+    
+    def _reload_from_store(self):
+        """从数据库重新加载图片缓存和索引（调用方需持有扫描锁）"""
+        self._store_version = self.store.get_meta('library_version')
+        self.image_cache = self.load_cache()
+        self.rebuild_index()
+    
+    def _bump_store_version(self):
+        """更新数据库中的图库版本标记，通知其他进程同步"""
+        self._store_version = str(time.time_ns())
+        self.store.set_meta('library_version', self._store_version)
+    
+    def _publish_snapshot(self, images):
+        """索引有变化时生成新快照（调用方需持有扫描锁）"""
+        if self.snapshot is None or self._changes != self._snapshot_changes:
+            self._generation += 1
+            self._snapshot_changes = self._changes
+            self.snapshot = LibrarySnapshot(
+                images,
+                generation=self._generation,
+                scan_duration=self.last_scan_duration or 0.0,
+                categories=self.category_index.to_list(),
+                phashes={
+                    record.path: record.phash
+                    for record in self.image_cache.values()
+                    if record.phash not in (None, NO_HASH)
+                },
+                features=self.features,
+                feature_rows={
+                    record.id: record.feature_row
+                    for record in self.image_cache.values()
+                    if record.feature_row not in (None, NO_ROW)
+                }
+            )
+        return self.snapshot
+    
     def scan_images(self):
         """扫描所有图片文件"""
         images = []
+        seen_keys = set()
+        # 新增或变化的文件：(文件路径, 相对路径, stat结果)
+        pending = []
+        changed_paths = []
+        # 未变化但还没有感知哈希或颜色特征的文件（升级前扫描的记录）：(文件路径, 缓存键, 在images中的位置)
+        backfill = []
         
-        for root, dirs, files in os.walk(Config.IMAGE_BASE_DIR):
-            for file in files:
-                if self.is_image_file(file):
-                    file_path = os.path.join(root, file)
-                    relative_path = os.path.relpath(file_path, Config.IMAGE_BASE_DIR)
-                    
-                    # 检查是否需要重新扫描（文件修改时间）
-                    file_mtime = os.path.getmtime(file_path)
-                    cache_key = relative_path
-                    
-                    if cache_key in self.image_cache:
-                        if self.image_cache[cache_key]['mtime'] == file_mtime:
-                            # 使用缓存数据
-                            images.append(self.image_cache[cache_key]['data'])
-                            continue
-                    
-                    # 获取图片信息
+        for file_path, relative_path, st in self.walk_images(Config.IMAGE_BASE_DIR):
+            # 统一使用'/'分隔的相对路径作为缓存键
+            cache_key = relative_path
+            seen_keys.add(cache_key)
+            
+            # 检查是否需要重新扫描（大小、修改时间、inode）
+            fingerprint = stat_fingerprint(st)
+            
+            cached = self.image_cache.get(cache_key)
+            if cached and self.is_unchanged(cache_key, cached, fingerprint, st.st_mtime):
+                # 使用缓存数据
+                images.append(cached)
+                if cached.phash is None or cached.feature_row is None:
+                    backfill.append((file_path, cache_key, len(images) - 1))
+                continue
+            
+            pending.append((file_path, relative_path, st))
+        
+        def analyze(item):
+            file_path, relative_path, st = item
+            record = self.get_image_info(file_path, relative_path, st)
+            if record is None:
+                return None, None
+            record.phash, vector, record.color = self.compute_signatures(file_path, record.id)
+            return record, vector
+        
+        # 并行计算新文件的哈希、尺寸和颜色特征（hashlib、PIL与NumPy计算时释放GIL），结果按顺序串行写入
+        if pending:
+            with ThreadPoolExecutor(max_workers=Config.SCAN_WORKERS) as pool:
+                for (file_path, relative_path, st), (record, vector) in zip(pending, pool.map(analyze, pending)):
                     try:
-                        img_info = self.get_image_info(file_path, relative_path)
-                        if img_info:
-                            images.append(img_info)
+                        if record:
+                            images.append(record)
                             
-                            # 更新缓存
-                            self.image_cache[cache_key] = {
-                                'mtime': file_mtime,
-                                'data': img_info
-                            }
+                            # 文件变化时沿用原来的特征行
+                            cached = self.image_cache.get(relative_path)
+                            record.feature_row = self.store_features(vector, cached.feature_row if cached else None)
+                            # 更新缓存（每张图片单独提交）
+                            self.save_image(record)
+                            changed_paths.append(file_path)
                     except Exception as e:
                         print(f"处理图片失败: {file_path}, 错误: {e}")
         
-        # 保存缓存
-        self.save_cache()
+        def analyze_missing(item):
+            file_path, cache_key, _ = item
+            cached = self.image_cache[cache_key]
+            phash, vector, color = self.compute_signatures(file_path, cached.id)
+            return phash, (vector, color)
+        
+        # 为旧记录补充感知哈希、颜色特征和主色调（只在升级后的第一次扫描时较慢）
+        if backfill:
+            with ThreadPoolExecutor(max_workers=Config.SCAN_WORKERS) as pool:
+                for (file_path, cache_key, position), (phash, colors) in zip(backfill,
+                                                                             pool.map(analyze_missing, backfill)):
+                    cached = self.image_cache[cache_key]
+                    if cached.phash is None:
+                        cached.phash = phash
+                        self.store.update_phash(cache_key, to_hex(phash))
+                    if cached.feature_row is None:
+                        vector, color = colors
+                        # 当前快照仍在使用旧的记录，主色调变化时换成新记录而不是原地修改
+                        cached = self.image_cache[cache_key] = images[position] = cached.copy(
+                            feature_row=self.store_features(vector), color=color
+                        )
+                        self.store.update_colors(cache_key, cached.feature_row, color)
+                    self._changes += 1
+        
+        # 移除已删除文件的缓存和索引
+        for cache_key in [key for key in self.image_cache if key not in seen_keys]:
+            self.remove_image(cache_key)
+        
+        self.last_changed_paths = changed_paths
         return images
     
+    def is_unchanged(self, cache_key, cached, fingerprint, file_mtime):
+        """判断文件自上次扫描后是否未变化"""
+        if cached.fingerprint is not None:
+            return cached.fingerprint == fingerprint
+        # 旧记录没有指纹，退回比较修改时间，未变化时补充指纹
+        if cached.mtime != file_mtime:
+            return False
+        cached.fingerprint = fingerprint
+        self.store.update_fingerprint(cache_key, fingerprint)
+        return True
+    
+    def walk_images(self, base_dir):
+        """
+        遍历目录下的图片文件，生成 (文件路径, '/'分隔的相对路径, stat结果)
+        使用 os.scandir，每个文件只调用一次 stat，后续的变化判断和图片信息都复用这一结果
+        """
+        stack = [(str(base_dir), '')]
+        while stack:
+            directory, prefix = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError as e:
+                print(f"读取目录失败: {directory}, 错误: {e}")
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        stack.append((entry.path, prefix + entry.name + '/'))
+                        continue
+                    if not self.is_image_file(entry.name):
+                        continue
+                    st = entry.stat()
+                except OSError as e:
+                    print(f"读取文件状态失败: {entry.path}, 错误: {e}")
+                    continue
+                yield entry.path, prefix + entry.name, st
+    
     def is_image_file(self, filename):
         """检查是否为支持的图片格式"""
         return any(filename.lower().endswith(ext) for ext in Config.ALLOWED_EXTENSIONS)
     
-    def get_image_info(self, file_path, relative_path):
-        """获取图片详细信息"""
+    def compute_signatures(self, file_path, image_id):
+        """
+        只解码一次图片，计算感知哈希（dHash，用于近似重复检测）、颜色特征向量与主色调，
+        返回 (哈希, 向量, '#rrggbb')。优先使用已生成的缩略图（解码很快），没有或无法读取时从原图缩小解码；
+        都无法解码时返回 (NO_HASH, None, None)，文件变化前不再重试
+        """
+        thumbnail_path = thumbnail_store.path_for(image_id)
+        for source in (thumbnail_path, file_path):
+            try:
+                sample = load_sample(source)
+            except Exception:
+                continue
+            vector, color = sample_colors(sample)
+            return dhash_image(sample), vector, color
+        return NO_HASH, None, None
+    
+    def store_features(self, vector, feature_row=None):
+        """把特征向量写入特征矩阵（沿用 feature_row 或分配新行），返回行号；向量为None时释放原行并返回 NO_ROW"""
+        if feature_row == NO_ROW:
+            feature_row = None
+        if vector is None:
+            self.features.free(feature_row)
+            return NO_ROW
+        return self.features.put(vector, feature_row)
+    
+    def get_image_info(self, file_path, relative_path, st=None):
+        """获取图片记录（st 为扫描时已取得的 stat 结果，尺寸只解析文件头）"""
         try:
-            with Image.open(file_path) as img:
-                width, height = img.size
-                # 生成唯一ID
-                file_hash = self.get_file_hash(file_path)
-                
-                return {
-                    'id': file_hash,
-                    'url': f'/images/{relative_path.replace(os.sep, "/")}',
-                    'thumbnail': f'/thumbnails/{file_hash}.jpg',
-                    'tag': self.extract_tags(relative_path),
-                    'width': width,
-                    'height': height,
-                    'size': os.path.getsize(file_path),
-                    'uploaded_at': datetime.fromtimestamp(os.path.getctime(file_path)).isoformat()
-                }
+            if st is None:
+                st = os.stat(file_path)
+            width, height = probe_dimensions(file_path)
+            # 生成唯一ID
+            file_hash = self.get_file_hash(file_path)
+            
+            return ImageRecord(
+                relative_path,
+                file_hash,
+                width,
+                height,
+                st.st_size,
+                datetime.fromtimestamp(st.st_ctime).isoformat(),
+                mtime=st.st_mtime,
+                fingerprint=stat_fingerprint(st)
+            )
         except Exception as e:
             print(f"读取图片信息失败: {file_path}, 错误: {e}")
             return None
     
+    def describe_path(self, relative_path):
+        """解析路径得到（顶层文件夹, 图片类型, 关键词列表），用于数据库索引字段"""
+        return describe_path(relative_path)
+    
     def get_file_hash(self, file_path):
         """生成文件哈希"""
-        hasher = hashlib.md5()
-        with open(file_path, 'rb') as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hasher.update(chunk)
-        return hasher.hexdigest()
+        return md5_file(file_path)
     
     def extract_tags(self, relative_path):
         """从路径中提取标签"""
-        # 基于文件夹结构生成标签
-        path_parts = relative_path.split(os.sep)
-        tags = []
-        
-        # 添加文件夹名作为标签
-        for part in path_parts[:-1]:  # 排除文件名
-            if part:
-                tags.append(part)
-        
-        # 添加文件名（不含扩展名）作为标签
-        filename = path_parts[-1]
-        if filename:
-            name_without_ext = os.path.splitext(filename)[0]
-            if name_without_ext:
-                # 解析重命名后的文件名，提取6个关键词标签
-                name_parts = name_without_ext.split('_')
-                if len(name_parts) >= 7:  # 类型_关键词1_关键词2_关键词3_关键词4_关键词5_关键词6
-                    # 添加图片类型作为标签
-                    if name_parts[0]:
-                        tags.append(name_parts[0])
-                    # 添加6个关键词作为独立标签
-                    for i in range(1, 7):
-                        if i < len(name_parts) and name_parts[i]:
-                            tags.append(name_parts[i])
-                else:
-                    # 如果不是重命名格式，直接使用文件名
-                    tags.append(name_without_ext)
-        
-        return '_'.join(tags) if tags else 'uncategorized'
+        return extract_tags(relative_path)
     
     def extract_keywords(self, relative_path):
         """专门提取重命名后的6个关键词"""
-        path_parts = relative_path.split(os.sep)
-        filename = path_parts[-1]
-        if filename:
-            name_without_ext = os.path.splitext(filename)[0]
-            if name_without_ext:
-                # 解析重命名格式：类型_关键词1_关键词2_关键词3_关键词4_关键词5_关键词6
-                name_parts = name_without_ext.split('_')
-                if len(name_parts) >= 7:
-                    # 返回6个关键词
-                    return name_parts[1:7]
-        
-        return []
+        return extract_keywords(relative_path)
     
     def get_categories(self):
-        """获取所有分类信息"""
-        all_images = self.scan_images()
-        
-        # 提取所有标签
-        tags = set()
-        for img in all_images:
-            tag = img.get('tag', 'uncategorized')
-            if tag:
-                tags.add(tag)
-        
-        # 按文件夹结构组织分类
-        categories = []
-        folder_tags = set()
-        
-        for tag in sorted(tags):
-            parts = tag.split('_')
-            if len(parts) > 1:
-                # 如果是复合标签，添加父级文件夹
-                parent_tag = parts[0]
-                if parent_tag not in folder_tags:
-                    folder_tags.add(parent_tag)
-                    categories.append({
-                        'id': parent_tag,
-                        'name': parent_tag,
-                        'type': 'folder',
-                        'count': self.get_category_count(parent_tag, all_images)
-                    })
-            else:
-                # 单个标签
-                categories.append({
-                    'id': tag,
-                    'name': tag,
-                    'type': 'file',
-                    'count': self.get_category_count(tag, all_images)
-                })
-        
-        return categories
-    
-    def get_category_count(self, category_id, all_images):
-        """获取分类中的图片数量"""
-        count = 0
-        for img in all_images:
-            tag = img.get('tag', '')
-            if category_id in tag or tag.startswith(category_id + '_'):
-                count += 1
-        return count
+        """获取所有分类信息（读取快照中预先生成的分类树）"""
+        return self.get_snapshot().categories
 
 # 全局实例
 wallpaper_manager = WallpaperManager()
+library_indexer = LibraryIndexer(
+    wallpaper_manager,
+    Config.IMAGE_BASE_DIR,
+    interval=Config.INDEX_INTERVAL,
+    lock_file=os.path.join(Config.DATA_DIR, 'indexer.lock'),
+    on_change=spawn_background if Config.PREGENERATE_AFTER_INDEX else None,
+    extensions=Config.ALLOWED_EXTENSIONS
+)
+thumbnail_store = ThumbnailStore(
+    Config.THUMBNAIL_DIR,
+    size=Config.THUMBNAIL_SIZE,
+    quality=Config.THUMBNAIL_QUALITY,
+    max_bytes=Config.THUMBNAIL_CACHE_MAX_BYTES,
+    variant_quality=Config.RESIZED_QUALITY,
+    max_decodes=Config.THUMBNAIL_MAX_DECODES
+)
+
+def start_library_indexer():
+    """
+    在处理请求的进程中启动后台索引线程（仅开发服务器使用：调试模式的重载器在子进程中处理请求）
+    gunicorn 部署时由 gunicorn.conf.py 的 post_fork 在每个 worker 启动后立即启动，不等待第一个请求
+    """
+    library_indexer.ensure_started()
+
+def snapshot_not_modified(snapshot):
+    """客户端缓存的内容与当前快照一致时，直接返回304响应"""
+    if request.if_none_match.contains_weak(snapshot.etag):
+        response = app.response_class(status=304)
+        response.set_etag(snapshot.etag, weak=True)
+        return response
+    return None
+
+def with_snapshot_etag(response, snapshot):
+    """为列表接口响应附加快照弱ETag，要求浏览器每次重新验证"""
+    response.set_etag(snapshot.etag, weak=True)
+    response.cache_control.no_cache = True
+    return response
+
+def parse_facet_filters(args):
+    """
+    解析 /api 的分面筛选参数，返回 (筛选条件, 错误信息)
+    orientation、color 可用逗号分隔多个取值（任一匹配即可）；min_width 为像素数或别名（如 4k）
+    """
+    orientations = [value for value in args.get('orientation', '').lower().split(',') if value]
+    colors = [value for value in args.get('color', '').lower().split(',') if value]
+    min_width = args.get('min_width', '').lower()
+    
+    invalid = [value for value in orientations if value not in ORIENTATIONS]
+    if invalid:
+        return None, f'不支持的方向: {", ".join(invalid)}（可选 {" / ".join(ORIENTATIONS)}）'
+    invalid = [value for value in colors if value not in COLOR_FAMILIES]
+    if invalid:
+        return None, f'不支持的颜色: {", ".join(invalid)}（可选 {" / ".join(COLOR_FAMILIES)}）'
+    if min_width:
+        min_width = WIDTH_ALIASES.get(min_width, min_width)
+        try:
+            min_width = int(min_width)
+        except ValueError:
+            return None, f'min_width 应为像素数或 {" / ".join(WIDTH_ALIASES)}'
+    return {'orientations': orientations, 'colors': colors, 'min_width': min_width or None}, None
 
 @app.route('/api')
 def api_wallpapers():
@@ -241,42 +552,60 @@ def api_wallpapers():
         cid = request.args.get('cid', 'all')  # 分类ID
         start = int(request.args.get('start', 0))  # 起始位置
         count = int(request.args.get('count', 30))  # 数量
+        after = request.args.get('after')  # 游标：上一页响应中的 next_cursor
+        output_format = request.args.get('format', 'full')  # full（默认）或 compact
         
-        # 限制单次返回数量（最大100条）
-        count = min(count, 100)
-        
-        # 扫描图片（这里可以优化为只扫描需要的部分）
-        all_images = wallpaper_manager.scan_images()
+        if output_format not in ('full', 'compact'):
+            return jsonify({
+                'code': 400,
+                'message': f'不支持的输出格式: {output_format}（可选 full / compact）',
+                'data': []
+            }), 400
         
-        # 按分类过滤
-        if cid != 'all':
-            filtered_images = [
-                img for img in all_images
-                if cid in img.get('tag', '') or img.get('tag', '').startswith(cid)
-            ]
-        else:
-            filtered_images = all_images
+        # 限制单次返回数量（完整格式最多100条，精简格式最多1000条）
+        count = min(count, Config.API_COMPACT_MAX_COUNT if output_format == 'compact' else Config.API_MAX_COUNT)
         
-        # 分页
-        end = start + count
-        paginated_images = filtered_images[start:end]
+        # 方向、最小宽度、主色调筛选（可与分类组合）
+        filters, error = parse_facet_filters(request.args)
+        if error:
+            return jsonify({
+                'code': 400,
+                'message': error,
+                'data': []
+            }), 400
         
-        # 构造响应数据，为每个图片添加关键词信息
-        for img in paginated_images:
-            # 提取6个关键词
-            keywords = wallpaper_manager.extract_keywords(img.get('url', ''))
-            img['keywords'] = keywords
+        # 在后台索引线程维护的图库快照上按分类索引和分面位图分页
+        snapshot = wallpaper_manager.get_snapshot()
+        try:
+            paginated_images, total, has_more = snapshot.page(cid, start, count, after, **filters)
+        except ValueError as e:
+            return jsonify({
+                'code': 400,
+                'message': str(e),
+                'data': []
+            }), 400
+        # 参数（包括游标）全部校验通过后才处理条件请求，无效请求不会因为 ETag 匹配而得到304
+        not_modified = snapshot_not_modified(snapshot)
+        if not_modified:
+            return not_modified
         
         # 构造响应数据
         result = {
             'code': 200,
-            'data': paginated_images,
-            'total': len(filtered_images),
-            'has_more': end < len(filtered_images),
+            'data': [img.to_dict() for img in paginated_images],
+            'total': total,
+            'has_more': has_more,
+            # 下一页游标，没有更多数据时为null
+            'next_cursor': encode_cursor(paginated_images[-1]) if has_more and paginated_images else None,
             'limit': count  # 返回实际使用的限制数量
         }
         
-        return jsonify(result)
+        if output_format == 'compact':
+            # 精简格式：data 为按 fields 顺序排列的行数组，url 等可推导的字段由客户端按 path、id 拼接
+            result['fields'] = COMPACT_FIELDS
+            result['data'] = [compact_row(img) for img in paginated_images]
+            return with_snapshot_etag(app.response_class(dumps(result), mimetype='application/json'), snapshot)
+        return with_snapshot_etag(jsonify(result), snapshot)
         
     except Exception as e:
         return jsonify({
@@ -285,16 +614,196 @@ def api_wallpapers():
             'data': []
         }), 500
 
+@app.route('/api/export')
+def api_export():
+    """
+    以 NDJSON 流式导出整个图库（可用 cid 与 /api 相同的筛选参数缩小范围），每行一张图片的精简记录
+    导出期间固定使用同一个快照，不会因为后台扫描而前后不一致
+    """
+    cid = request.args.get('cid', 'all')
+    filters, error = parse_facet_filters(request.args)
+    if error:
+        return jsonify({
+            'code': 400,
+            'message': error
+        }), 400
+    
+    snapshot = wallpaper_manager.get_snapshot()
+    not_modified = snapshot_not_modified(snapshot)
+    if not_modified:
+        return not_modified
+    positions = snapshot.positions(cid, **filters)
+    response = app.response_class(iter_ndjson(snapshot.images, positions), mimetype='application/x-ndjson')
+    response.headers['X-Total-Count'] = str(len(positions))
+    return with_snapshot_etag(response, snapshot)
+
+@app.route('/search')
+def api_search():
+    """按关键词搜索壁纸"""
+    try:
+        # 获取参数：q 为空格或'+'分隔的关键词，词尾加'*'表示前缀匹配
+        query = request.args.get('q', '')
+        mode = request.args.get('mode', 'and')
+        prefix = request.args.get('prefix', '').lower() in ('1', 'true', 'yes')
+        start = int(request.args.get('start', 0))
+        count = min(int(request.args.get('count', 30)), 100)
+        after = request.args.get('after')
+        
+        if mode not in ('and', 'or'):
+            return jsonify({
+                'code': 400,
+                'message': f'不支持的搜索模式: {mode}（可选 and / or）',
+                'data': []
+            }), 400
+        
+        terms = [term for term in query.replace('+', ' ').split() if term]
+        if not terms:
+            return jsonify({
+                'code': 400,
+                'message': '缺少搜索关键词参数q',
+                'data': []
+            }), 400
+        
+        snapshot = wallpaper_manager.get_snapshot()
+        positions = snapshot.search(terms, mode, prefix)
+        try:
+            paginated_images, total, has_more = snapshot.paginate(positions, start, count, after)
+        except ValueError as e:
+            return jsonify({
+                'code': 400,
+                'message': str(e),
+                'data': []
+            }), 400
+        # 与 /api 相同：游标校验通过后才处理条件请求
+        not_modified = snapshot_not_modified(snapshot)
+        if not_modified:
+            return not_modified
+        
+        return with_snapshot_etag(jsonify({
+            'code': 200,
+            'data': [img.to_dict() for img in paginated_images],
+            'total': total,
+            'has_more': has_more,
+            'next_cursor': encode_cursor(paginated_images[-1]) if has_more and paginated_images else None,
+            'limit': count,
+            'terms': terms,
+            'mode': mode,
+            'facets': snapshot.facets(positions)
+        }), snapshot)
+        
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': f'搜索失败: {str(e)}',
+            'data': []
+        }), 500
+
+@app.route('/duplicates')
+def api_duplicates():
+    """
+    近似重复报告（按感知哈希的汉明距离判定）
+    给出 id 时返回与该图片近似重复的图片；否则返回全部重复分组，每组第一张为分辨率最高、建议保留的图片
+    """
+    try:
+        radius = int(request.args.get('radius', Config.DUPLICATE_RADIUS))
+        image_id = request.args.get('id')
+        start = int(request.args.get('start', 0))
+        count = min(int(request.args.get('count', 30)), 100)
+        
+        if not 0 <= radius <= Config.DUPLICATE_MAX_RADIUS:
+            return jsonify({
+                'code': 400,
+                'message': f'radius 应在 0 到 {Config.DUPLICATE_MAX_RADIUS} 之间',
+                'data': []
+            }), 400
+        
+        snapshot = wallpaper_manager.get_snapshot()
+        if image_id:
+            if image_id not in snapshot.rank:
+                return jsonify({
+                    'code': 404,
+                    'message': f'图片不存在: {image_id}',
+                    'data': []
+                }), 404
+            return jsonify({
+                'code': 200,
+                'id': image_id,
+                'radius': radius,
+                'data': [
+                    dict(snapshot.images[position].to_dict(), distance=distance)
+                    for distance, position in snapshot.near_duplicates(image_id, radius)
+                ]
+            })
+        
+        groups = snapshot.duplicate_groups(radius)
+        return jsonify({
+            'code': 200,
+            'radius': radius,
+            'total': len(groups),
+            # 删除每组中除第一张外的图片可以释放的数量
+            'duplicate_images': sum(len(images) - 1 for images in groups),
+            'has_more': start + count < len(groups),
+            'data': [
+                {'keep': images[0].id, 'images': [img.to_dict() for img in images]}
+                for images in groups[start:start + count]
+            ],
+            'hashed': len(snapshot.phashes),
+            'limit': count
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': f'获取重复图片失败: {str(e)}',
+            'data': []
+        }), 500
+
+@app.route('/similar/<file_hash>')
+def api_similar(file_hash):
+    """颜色分布相似的图片（"更多类似"），按相似度从高到低排列"""
+    try:
+        count = min(int(request.args.get('count', 30)), 100)
+        
+        snapshot = wallpaper_manager.get_snapshot()
+        if file_hash not in snapshot.rank:
+            return jsonify({
+                'code': 404,
+                'message': f'图片不存在: {file_hash}',
+                'data': []
+            }), 404
+        
+        return jsonify({
+            'code': 200,
+            'id': file_hash,
+            'data': [
+                dict(snapshot.images[snapshot.rank[other]].to_dict(), score=round(score, 4))
+                for score, other in snapshot.similar(file_hash, count)
+            ],
+            # 尚未提取颜色特征（例如升级后首次扫描未完成）的图片没有相似结果
+            'indexed': file_hash in snapshot.feature_rows,
+            'limit': count
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'code': 500,
+            'message': f'获取相似图片失败: {str(e)}',
+            'data': []
+        }), 500
+
 @app.route('/categories')
 def api_categories():
     """获取所有分类"""
     try:
-        categories = wallpaper_manager.get_categories()
+        snapshot = wallpaper_manager.get_snapshot()
+        not_modified = snapshot_not_modified(snapshot)
+        if not_modified:
+            return not_modified
         
-        return jsonify({
+        return with_snapshot_etag(jsonify({
             'code': 200,
-            'categories': categories
-        })
+            'categories': snapshot.categories
+        }), snapshot)
         
     except Exception as e:
         return jsonify({
@@ -315,11 +824,48 @@ def api_config():
         }
     })
 
+@app.route('/index-status')
+def api_index_status():
+    """获取后台索引状态"""
+    snapshot = wallpaper_manager.snapshot
+    status = {
+        'running': library_indexer.running,
+        'pid': os.getpid(),
+        'role': library_indexer.role,
+        'mode': library_indexer.mode,
+        'interval': library_indexer.interval,
+        'last_error': library_indexer.last_error,
+        'generation': None,
+        'image_count': 0,
+        'snapshot_built_at': None,
+        'scanned_at': None,
+        'age_seconds': None,
+        'last_scan_duration': None
+    }
+    if snapshot is not None:
+        status.update({
+            'generation': snapshot.generation,
+            'image_count': len(snapshot),
+            'snapshot_built_at': datetime.fromtimestamp(snapshot.scanned_at).isoformat()
+        })
+    if wallpaper_manager.last_scan_at is not None:
+        # 索引年龄：距最近一次确认图库状态的扫描的时间
+        status.update({
+            'scanned_at': datetime.fromtimestamp(wallpaper_manager.last_scan_at).isoformat(),
+            'age_seconds': round(time.time() - wallpaper_manager.last_scan_at, 3),
+            'last_scan_duration': round(wallpaper_manager.last_scan_duration, 3)
+        })
+    return jsonify({
+        'code': 200,
+        'index': status
+    })
+
 @app.route('/clear-cache')
 def api_clear_cache():
     """清空缓存并重新扫描"""
     try:
         wallpaper_manager.clear_cache()
+        library_indexer.trigger()
         return jsonify({
             'code': 200,
             'message': '缓存已清空，下次访问将重新生成'
@@ -338,56 +884,108 @@ def index():
 
 @app.route('/images/<path:filename>')
 def serve_image(filename):
-    """提供图片文件"""
-    return send_from_directory(Config.IMAGE_BASE_DIR, filename)
+    """提供图片文件（支持 Last-Modified/If-Modified-Since 与 ETag 条件请求）"""
+    return send_from_directory(
+        Config.IMAGE_BASE_DIR,
+        filename,
+        conditional=True,
+        max_age=Config.IMAGE_CACHE_MAX_AGE
+    )
 
 @app.route('/thumbnails/<filename>')
 def serve_thumbnail(filename):
-    """动态生成并提供缩略图"""
-    import io
-    from flask import Response
-    
+    """提供缩略图（优先读取磁盘缓存，未命中时生成并写入缓存）"""
     # 提取文件哈希
     if not filename.endswith('.jpg'):
         return "Invalid thumbnail format", 400
     
     file_hash = filename[:-4]  # 去掉.jpg后缀
+    if not thumbnail_store.is_valid_id(file_hash):
+        return "Invalid thumbnail id", 400
     
-    # 在缓存中查找对应的原图路径
-    for cache_key, cache_data in wallpaper_manager.image_cache.items():
-        if cache_data['data']['id'] == file_hash:
-            # 找到对应的原图 - 正确处理Windows路径分隔符
-            # cache_key已经是相对路径格式，直接使用
-            original_path = os.path.join(Config.IMAGE_BASE_DIR, cache_key)
-            
-            if os.path.exists(original_path):
-                try:
-                    # 使用PIL生成缩略图
-                    with Image.open(original_path) as img:
-                        # 保持宽高比，设置最大尺寸
-                        img.thumbnail((300, 300), Image.Resampling.LANCZOS)
-                        
-                        # 转换为JPEG格式并返回
-                        buffer = io.BytesIO()
-                        if img.mode != 'RGB':
-                            img = img.convert('RGB')
-                        img.save(buffer, format='JPEG', quality=85)
-                        buffer.seek(0)
-                        
-                        return Response(
-                            buffer.getvalue(),
-                            mimetype='image/jpeg',
-                            headers={
-                                'Cache-Control': 'public, max-age=31536000',  # 缓存1年
-                                'ETag': f'"{file_hash}"'
-                            }
-                        )
-                except Exception as e:
-                    print(f"生成缩略图失败: {e}")
-                    break
+    response = send_rendered(file_hash)
+    if response is None:
+        # 如果找不到原图，返回404
+        return "Thumbnail not found", 404
+    return response
+
+@app.route('/resized/<file_hash>')
+def serve_resized(file_hash):
+    """
+    提供响应式尺寸变体：?w= 取不小于该宽度的最小档位（缺省为最大档位），
+    按 Accept 头协商格式（AVIF > WebP > JPEG），生成后写入缩略图磁盘缓存
+    """
+    if not thumbnail_store.is_valid_id(file_hash):
+        return "Invalid image id", 400
+    
+    width = pick_resized_width(request.args.get('w', type=int))
+    response = send_rendered(file_hash, width, negotiate_image_format())
+    if response is None:
+        return "Image not found", 404
+    # 同一URL按 Accept 返回不同格式，共享缓存需区分
+    response.vary.add('Accept')
+    return response
+
+def pick_resized_width(requested):
+    """选择不小于请求宽度的最小档位；未指定或超过最大档位时取最大档位"""
+    for width in Config.RESIZED_WIDTHS:
+        if requested is not None and width >= requested:
+            return width
+    return Config.RESIZED_WIDTHS[-1]
+
+def negotiate_image_format():
+    """按 Accept 头选择变体格式：只认明确列出的类型（*/* 不代表支持 WebP/AVIF）"""
+    accepted = {mimetype for mimetype, quality in request.accept_mimetypes if quality > 0}
+    for image_format in ('avif', 'webp'):
+        if image_format in thumbnail_store.formats and f'image/{image_format}' in accepted:
+            return image_format
+    return 'jpeg'
+
+def send_rendered(file_hash, width=None, image_format='jpeg'):
+    """
+    发送缩略图（width为None）或尺寸变体：优先读取磁盘缓存，未命中时从原图生成并写入缓存
+    找不到原图时返回None
+    """
+    etag = thumbnail_store.etag_for(file_hash, width, image_format)
+    
+    # 命中磁盘缓存，直接发送文件，无需PIL处理
+    rendered_path = thumbnail_store.get(file_hash, width, image_format)
+    if rendered_path:
+        try:
+            return send_rendered_file(rendered_path, etag, image_format)
+        except FileNotFoundError:
+            # 文件刚被淘汰或删除，重新生成
+            thumbnail_store.forget(file_hash, width, image_format)
+    
+    # 通过反向索引查找对应的原图路径
+    relative_path = wallpaper_manager.get_image_path(file_hash)
+    if relative_path is None:
+        return None
     
-    # 如果找不到原图，返回404
-    return "Thumbnail not found", 404
+    # 缓存文件已被淘汰但客户端仍有缓存时，内容不变（按ID寻址），无需重新生成
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    
+    original_path = os.path.join(Config.IMAGE_BASE_DIR, relative_path)
+    if not os.path.exists(original_path):
+        return None
+    try:
+        rendered_path = thumbnail_store.render(file_hash, original_path, width, image_format)
+        return send_rendered_file(rendered_path, etag, image_format)
+    except Exception as e:
+        print(f"生成缩略图失败: {e}")
+        return None
+
+def send_rendered_file(path, etag, image_format):
+    """发送缩略图/变体文件（由WSGI服务器的sendfile零拷贝传输）"""
+    return send_file(
+        path,
+        mimetype=FORMATS[image_format][1],
+        etag=etag,
+        max_age=31536000  # 缓存1年
+    )
 
 
 @app.route('/set-wallpaper', methods=['POST'])
@@ -512,4 +1110,6 @@ if __name__ == '__main__':
     print("访问 http://localhost:5000/ 查看前端")
     print("访问 http://localhost:5000/api 测试API")
     print("访问 http://localhost:5000/categories 测试分类")
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    print("生产环境请使用 gunicorn -c gunicorn.conf.py 启动")
+    app.before_request(start_library_indexer)
+    app.run(host='0.0.0.0', port=5000, debug=config.DEBUG)
\ No newline at end of file
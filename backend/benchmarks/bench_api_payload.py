@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+列表接口输出格式基准测试
+在模拟的10万张图片上对比：
+- 一页数据：完整格式（Flask jsonify 使用的标准库 json）与精简格式（行数组，标准库 json / orjson）的大小和序列化耗时
+- 全库导出：一次性序列化完整列表与 /api/export 的逐块 NDJSON，比较总大小、耗时与序列化过程的峰值内存
+  （两者都在 tracemalloc 下运行，耗时只用于相互比较）
+
+用法：python benchmarks/bench_api_payload.py [图片数量，默认100000]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_format
+from api_format import COMPACT_FIELDS, compact_row, iter_ndjson
+from image_record import ImageRecord
+
+TYPES = ['风光', '美女', '动漫', '汽车', '城市']
+KEYWORDS = ['黄昏', '山脉', '雾气', '湖泊', '森林', '日出', '海边', '日落', '沙滩', '椰树', '云彩', '晚霞']
+
+
+def build_images(size):
+    """模拟的图片记录"""
+    random.seed(0)
+    images = []
+    for i in range(size):
+        image_type = random.choice(TYPES)
+        keywords = random.sample(KEYWORDS, 6)
+        image_id = hashlib.md5(str(i).encode()).hexdigest()
+        name = f'{image_type}_{"_".join(keywords)}'
+        images.append(ImageRecord(f'{image_type}/{name}.jpg', image_id, 3840, 2160, random.randrange(200000, 8000000),
+                                  f'2025-01-01T00:00:{i % 60:02d}.{i:06d}', '#%06x' % random.getrandbits(24)))
+    return images
+
+
+def measure(func, repeat=1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - started) / repeat
+
+
+def traced(func):
+    """运行 func，返回 (结果, 耗时, 峰值内存MB)"""
+    tracemalloc.start()
+    result, elapsed = measure(func)
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def stream_export(images):
+    """消费 /api/export 的生成器（模拟逐块发送给客户端），返回总字节数"""
+    return sum(len(chunk) for chunk in iter_ndjson(images, range(len(images))))
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    images = build_images(size)
+    page = images[:1000]
+    orjson = api_format.orjson
+    print(f"图片数: {size}，orjson: {'已安装' if orjson else '未安装'}")
+
+    # Flask 2.3 的 jsonify 默认 ensure_ascii、sort_keys
+    body, elapsed = measure(lambda: json.dumps({'data': [img.to_dict() for img in page]},
+                                               ensure_ascii=True, sort_keys=True).encode(), 20)
+    print(f"1000条 完整格式 json:     {len(body) / 1024:7.1f} KB，{elapsed * 1000:6.2f} ms")
+    api_format.orjson = None
+    body, elapsed = measure(lambda: api_format.dumps({'fields': COMPACT_FIELDS,
+                                                      'data': [compact_row(img) for img in page]}), 20)
+    print(f"1000条 精简格式 json:     {len(body) / 1024:7.1f} KB，{elapsed * 1000:6.2f} ms")
+    api_format.orjson = orjson
+    if orjson:
+        body, elapsed = measure(lambda: api_format.dumps({'fields': COMPACT_FIELDS,
+                                                          'data': [compact_row(img) for img in page]}), 20)
+        print(f"1000条 精简格式 orjson:   {len(body) / 1024:7.1f} KB，{elapsed * 1000:6.2f} ms")
+
+    full = [img.to_dict() for img in images]
+    body, elapsed, peak = traced(lambda: json.dumps({'data': full}, ensure_ascii=True, sort_keys=True).encode())
+    print(f"全库 完整列表一次性序列化: {len(body) / 1024 / 1024:6.1f} MB，{elapsed:5.2f} 秒，峰值内存 {peak:6.1f} MB")
+    del body, full
+    total, elapsed, peak = traced(lambda: stream_export(images))
+    print(f"全库 NDJSON流式导出:       {total / 1024 / 1024:6.1f} MB，{elapsed:5.2f} 秒，峰值内存 {peak:6.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
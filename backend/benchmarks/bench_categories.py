@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分类统计基准测试
+对比旧版 get_categories（每个分类再遍历一次全部图片）与增量维护的 CategoryIndex
+
+用法：python benchmarks/bench_categories.py [图片数量，默认50000]
+"""
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import wallpaper_manager
+from library_index import CategoryIndex
+
+TYPES = ['风光', '美女', '动漫', '汽车', '城市']
+KEYWORDS = ['黄昏', '山脉', '雾气', '湖泊', '森林', '日出', '长发', '室内', '街道', '夜景',
+            '跑车', '少女', '海边', '云彩', '雪山', '霓虹', '花海', '星空', '建筑', '复古']
+
+
+def build_paths(size):
+    """构造模拟图片路径：大部分为AI重命名格式，约2%为根目录下未重命名的文件"""
+    random.seed(0)
+    paths = []
+    for i in range(size):
+        if i % 50 == 0:
+            paths.append(f'IMG{i}.jpg')
+        else:
+            image_type = random.choice(TYPES)
+            keywords = random.sample(KEYWORDS, 6)
+            paths.append(f'{image_type}/{image_type}_{"_".join(keywords)}.jpg')
+    return paths
+
+
+def old_get_categories(all_images):
+    """旧实现（摘自改动前的 WallpaperManager.get_categories）"""
+    def get_category_count(category_id):
+        count = 0
+        for img in all_images:
+            tag = img.get('tag', '')
+            if category_id in tag or tag.startswith(category_id + '_'):
+                count += 1
+        return count
+
+    tags = set()
+    for img in all_images:
+        tag = img.get('tag', 'uncategorized')
+        if tag:
+            tags.add(tag)
+
+    categories = []
+    folder_tags = set()
+    for tag in sorted(tags):
+        parts = tag.split('_')
+        if len(parts) > 1:
+            parent_tag = parts[0]
+            if parent_tag not in folder_tags:
+                folder_tags.add(parent_tag)
+                categories.append({'id': parent_tag, 'count': get_category_count(parent_tag)})
+        else:
+            categories.append({'id': tag, 'count': get_category_count(tag)})
+    return categories
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    paths = build_paths(size)
+    all_images = [{'tag': wallpaper_manager.extract_tags(path)} for path in paths]
+    infos = [wallpaper_manager._category_info(path) for path in paths]
+
+    started = time.perf_counter()
+    old_result = old_get_categories(all_images)
+    old_time = time.perf_counter() - started
+
+    index = CategoryIndex()
+    started = time.perf_counter()
+    for info in infos:
+        index.add(*info)
+    build_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    new_result = index.to_list()
+    list_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    index.remove(*infos[1])
+    index.add(*infos[1])
+    update_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(1000):
+        index.to_list()
+    read_time = (time.perf_counter() - started) / 1000
+
+    print(f"图片数: {size}, 顶层分类: 旧 {len(old_result)} / 新 {len(new_result)}")
+    print(f"旧实现每次请求:          {old_time * 1000:10.1f} ms")
+    print(f"新实现全量构建(仅启动时): {build_time * 1000:10.1f} ms")
+    print(f"新实现单张图片增删:       {update_time * 1e6:10.1f} us")
+    print(f"新实现生成分类列表:       {list_time * 1000:10.3f} ms")
+    print(f"新实现每次请求(已缓存):   {read_time * 1e6:10.3f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+compress_image 基准测试
+在临时目录生成模拟语料（4K/8K JPEG 与 4K PNG，带噪点避免被过度压缩），
+分别在独立子进程中运行旧实现与当前实现，报告每张耗时和进程峰值内存（RSS）
+
+用法：python benchmarks/bench_compress.py [每种规格的图片数量，默认4]
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import resource
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+SPECS = [
+    ('4K.jpg', (3840, 2160), 'JPEG'),
+    ('8K.jpg', (7680, 4320), 'JPEG'),
+    ('4K.png', (3840, 2160), 'PNG'),
+]
+
+
+def old_compress_image(image_path, max_size_mb=2.0, target_width=800):
+    """旧实现（摘自改动前的 rename.compress_image）"""
+    with Image.open(image_path) as img:
+        file_size = os.path.getsize(image_path) / (1024 * 1024)
+        if file_size <= max_size_mb and img.width <= target_width:
+            with open(image_path, 'rb') as f:
+                return f.read()
+        if img.width > target_width:
+            ratio = target_width / img.width
+            img = img.resize((target_width, int(img.height * ratio)), Image.Resampling.LANCZOS)
+        if img.mode not in ('RGB', 'L'):
+            if img.mode == 'RGBA':
+                background = Image.new('RGB', img.size, (255, 255, 255))
+                background.paste(img, mask=img.split()[-1])
+                img = background
+            else:
+                img = img.convert('RGB')
+        output = io.BytesIO()
+        img.save(output, format='JPEG', quality=75, optimize=True)
+        compressed_data = output.getvalue()
+        if len(compressed_data) > max_size_mb * 1024 * 1024:
+            output = io.BytesIO()
+            img.save(output, format='JPEG', quality=60, optimize=True)
+            compressed_data = output.getvalue()
+        return compressed_data
+
+
+def build_corpus(directory, count):
+    """生成带渐变和噪点的模拟壁纸"""
+    random.seed(0)
+    paths = []
+    for name, size, image_format in SPECS:
+        for i in range(count):
+            base = Image.linear_gradient('L').resize(size).convert('RGB')
+            noise = Image.effect_noise(size, random.randint(20, 60)).convert('RGB')
+            img = Image.blend(base, noise, 0.4)
+            if image_format == 'PNG':
+                img = img.convert('RGBA')
+            path = os.path.join(directory, f'{i}_{name}')
+            img.save(path, format=image_format, **({'quality': 92} if image_format == 'JPEG' else {}))
+            paths.append(path)
+    return paths
+
+
+def run_implementation(name, paths):
+    """在当前（子）进程中运行一种实现，输出JSON结果"""
+    if name == 'old':
+        compress = old_compress_image
+    else:
+        from rename import compress_image as compress
+
+    results = {}
+    for path in paths:
+        started = time.perf_counter()
+        data = compress(path)
+        elapsed = time.perf_counter() - started
+        kind = path.rsplit('_', 1)[-1]
+        item = results.setdefault(kind, {'seconds': [], 'bytes': []})
+        item['seconds'].append(elapsed)
+        item['bytes'].append(len(data))
+    print(json.dumps({'results': results, 'peak_rss_mb': peak_rss_mb()}))
+
+
+def peak_rss_mb():
+    """当前进程的峰值RSS（MB）"""
+    # ru_maxrss 在 exec 后会保留父进程的值，优先读取只统计本进程的 VmHWM
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Linux 上 ru_maxrss 单位为KB，macOS 上为字节
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024 / (1024 if sys.platform == 'darwin' else 1)
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--run':
+        run_implementation(sys.argv[2], sys.argv[3:])
+        return
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    work_dir = tempfile.mkdtemp(prefix='bench-compress-')
+    try:
+        paths = build_corpus(work_dir, count)
+        print(f"语料：{len(paths)} 张（{', '.join(name for name, _, _ in SPECS)} 各 {count} 张）")
+        for name in ('old', 'new'):
+            # 每种实现在独立进程中运行，峰值内存互不影响
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--run', name] + paths,
+                capture_output=True, text=True, check=True,
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+            ).stdout
+            report = json.loads(output.strip().splitlines()[-1])
+            print(f"[{name}] 峰值RSS {report['peak_rss_mb']:.0f} MB")
+            for kind, item in report['results'].items():
+                seconds = item['seconds']
+                print(f"    {kind:7s} 平均 {sum(seconds) / len(seconds) * 1000:7.1f} ms/张，"
+                      f"输出平均 {sum(item['bytes']) / len(item['bytes']) / 1024:6.1f} KB")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
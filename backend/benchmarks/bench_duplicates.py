@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+近似重复索引基准测试
+生成随机64位感知哈希，其中一部分是在原哈希上随机翻转几位得到的"重新编码副本"，
+对比多索引哈希（HammingIndex）与逐个比较的单次查询耗时，以及全库分组耗时（逐个比较需要两两比较，只给出估算）。
+多索引哈希把哈希切成 半径+1 段，半径越大每段越短、候选越多，因此对每个半径分别给出耗时
+
+用法：python benchmarks/bench_duplicates.py [图片数量，默认100000] [汉明距离半径，逗号分隔，默认2,4,6,8,10]
+"""
+
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from perceptual_hash import HammingIndex, hamming
+
+
+def build_hashes(size, radius):
+    """约5%的图片是已有图片翻转 1..radius 位得到的近似副本"""
+    random.seed(0)
+    hashes = {}
+    planted = 0
+    for i in range(size):
+        if hashes and random.random() < 0.05:
+            value = hashes[random.randrange(len(hashes))]
+            for bit in random.sample(range(64), random.randint(1, radius)):
+                value ^= 1 << bit
+            planted += 1
+        else:
+            value = random.getrandbits(64)
+        hashes[i] = value
+    return hashes, planted
+
+
+def brute_force(hashes, value, radius):
+    return sorted((hamming(value, other), key) for key, other in hashes.items() if hamming(value, other) <= radius)
+
+
+def bench_radius(hashes, queries, radius):
+    """返回 (建索引秒数, 单次查询秒数, 逐个比较单次查询秒数, 分组秒数, 组数, 重复张数)"""
+    started = time.perf_counter()
+    index = HammingIndex(radius)
+    for key, value in hashes.items():
+        index.add(key, value)
+    build = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for key in queries:
+        index.search(hashes[key])
+    indexed = (time.perf_counter() - started) / len(queries)
+
+    started = time.perf_counter()
+    for key in queries[:10]:
+        expected = brute_force(hashes, hashes[key], radius)
+        # 校验结果与逐个比较一致
+        assert sorted(index.search(hashes[key])) == expected
+    linear = (time.perf_counter() - started) / 10
+
+    started = time.perf_counter()
+    groups = index.groups()
+    grouping = time.perf_counter() - started
+    return build, indexed, linear, grouping, len(groups), sum(len(g) - 1 for g in groups)
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    radii = [int(r) for r in sys.argv[2].split(',')] if len(sys.argv) > 2 else [2, 4, 6, 8, 10]
+    # 所有半径使用同一批哈希，近似副本翻转的位数覆盖最大半径
+    hashes, planted = build_hashes(size, max(radii))
+    queries = random.sample(list(hashes), 200)
+    print(f"{size} 个哈希，其中 {planted} 个为近似副本（翻转 1-{max(radii)} 位）")
+    print("半径  建索引(秒)  单次查询(ms)  逐个比较(ms)  全库分组(秒)    组数  重复张数")
+
+    for radius in radii:
+        build, indexed, linear, grouping, groups, duplicates = bench_radius(hashes, queries, radius)
+        print(f"{radius:>4}  {build:>10.2f}  {indexed * 1000:>12.3f}  {linear * 1000:>12.1f}  "
+              f"{grouping:>12.2f}  {groups:>6}  {duplicates:>8}")
+
+    print(f"两两比较的全库分组估计需要 {linear * size / 2:.0f} 秒（与半径无关）")
+
+
+if __name__ == '__main__':
+    main()
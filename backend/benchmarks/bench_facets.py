@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分面筛选基准测试
+在模拟的10万张图片快照上测量 /api 的方向、最小宽度、主色调筛选（位图求与）耗时，
+并与逐张图片判断条件的实现对比
+
+用法：python benchmarks/bench_facets.py [图片数量，默认100000]
+"""
+
+import os
+import sys
+import time
+import random
+import hashlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from library_index import LibrarySnapshot, image_orientation
+from color_features import color_family
+from image_record import ImageRecord
+
+TYPES = ['风光', '美女', '动漫', '汽车', '城市']
+SIZES = [(1920, 1080), (2560, 1440), (3840, 2160), (1080, 2400), (1440, 3200), (2000, 2000), (1280, 720)]
+
+QUERIES = [
+    ('all', ['landscape'], None, []),
+    ('all', [], 3840, []),
+    ('all', ['portrait'], None, ['blue', 'cyan']),
+    ('风光', ['landscape'], 2560, ['orange']),
+    ('城市', [], 1000, ['black', 'grey']),
+]
+
+
+def build_images(size):
+    random.seed(0)
+    images = []
+    for i in range(size):
+        image_type = random.choice(TYPES)
+        width, height = random.choice(SIZES)
+        image_id = hashlib.md5(str(i).encode()).hexdigest()
+        images.append(ImageRecord(f'{image_type}/{image_id}.jpg', image_id, width, height, None,
+                                  f'2025-01-01T00:00:{i % 60:02d}.{i:06d}', '#%06x' % random.getrandbits(24)))
+    return images
+
+
+def linear_filter(snapshot, cid, orientations, min_width, colors):
+    """逐张图片判断条件"""
+    postings = range(len(snapshot.images)) if cid == 'all' else snapshot.category_postings.get(cid, ())
+    result = []
+    for position in postings:
+        img = snapshot.images[position]
+        if orientations and image_orientation(img.width, img.height) not in orientations:
+            continue
+        if min_width and (img.width or 0) < min_width:
+            continue
+        if colors and color_family(img.color) not in colors:
+            continue
+        result.append(position)
+    return result
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    images = build_images(size)
+    started = time.perf_counter()
+    snapshot = LibrarySnapshot(images, generation=1)
+    print(f"图片数: {size}, 构建快照（含分面位图）: {time.perf_counter() - started:.2f} s")
+
+    for cid, orientations, min_width, colors in QUERIES:
+        snapshot.filter(cid, orientations, min_width, colors)
+        started = time.perf_counter()
+        for _ in range(20):
+            positions = snapshot.filter(cid, orientations, min_width, colors)
+            snapshot.paginate(positions, 0, 30)
+        bitmap = (time.perf_counter() - started) / 20
+
+        started = time.perf_counter()
+        expected = linear_filter(snapshot, cid, orientations, min_width, colors)
+        linear = time.perf_counter() - started
+        assert list(positions) == expected
+        print(f"cid={cid} orientation={','.join(orientations) or '-'} min_width={min_width or '-'} "
+              f"color={','.join(colors) or '-'}: {len(positions)} 张，位图 {bitmap * 1000:.2f} ms，"
+              f"逐张判断 {linear * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+缩略图ID查找基准测试
+对比线性遍历 image_cache 与反向索引在 1k ~ 100k 图片规模下的查找延迟
+
+用法：python benchmarks/bench_id_index.py
+"""
+
+import os
+import sys
+import random
+import hashlib
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import WallpaperManager
+from image_record import ImageRecord
+
+SIZES = [1000, 10000, 100000]
+LOOKUPS = 200
+
+
+def build_cache(size):
+    """构造指定规模的模拟图片缓存"""
+    cache = {}
+    for i in range(size):
+        image_id = hashlib.md5(str(i).encode()).hexdigest()
+        relative_path = f'风光/风光_黄昏_山脉_雾气_湖泊_森林_{i}.jpg'
+        cache[relative_path] = ImageRecord(relative_path, image_id, None, None, None, None)
+    return cache
+
+
+def linear_lookup(image_cache, image_id):
+    """旧实现：逐条比较缓存中的ID"""
+    for cache_key, record in image_cache.items():
+        if record.id == image_id:
+            return cache_key
+    return None
+
+
+def main():
+    manager = WallpaperManager()
+    random.seed(0)
+    print(f"{'图片数':>8} {'线性遍历(us)':>14} {'反向索引(us)':>14}")
+    for size in SIZES:
+        manager.image_cache = build_cache(size)
+        manager.rebuild_index()
+        ids = [record.id for record in manager.image_cache.values()]
+        targets = [random.choice(ids) for _ in range(LOOKUPS)]
+
+        linear = timeit.timeit(
+            lambda: [linear_lookup(manager.image_cache, t) for t in targets], number=1
+        ) / LOOKUPS
+        indexed = min(timeit.repeat(
+            lambda: [manager.get_image_path(t) for t in targets], number=10, repeat=5
+        )) / (LOOKUPS * 10)
+        print(f"{size:>8} {linear * 1e6:>14.2f} {indexed * 1e6:>14.3f}")
+
+
+if __name__ == '__main__':
+    main()
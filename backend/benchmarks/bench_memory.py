@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片缓存内存基准测试
+模拟从数据库加载10万张图片的缓存（每行字符串都是新对象，与 sqlite 读出的一样），用 tracemalloc 统计常驻内存，
+对比旧的嵌套字典缓存（url、thumbnail、srcset、tag、keywords 预先生成）与 ImageRecord，
+并给出输出时推导完整字段（to_dict）的耗时
+
+用法：python benchmarks/bench_memory.py [图片数量，默认100000]
+"""
+
+import os
+import gc
+import sys
+import time
+import random
+import hashlib
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config
+from image_record import ImageRecord, extract_tags
+from thumbnail_store import variant_widths
+
+TYPES = ['风光', '美女', '动漫', '汽车', '城市']
+KEYWORDS = ['黄昏', '山脉', '雾气', '湖泊', '森林', '日出', '海边', '日落', '沙滩', '椰树', '云彩', '晚霞']
+SIZES = [(1920, 1080), (2560, 1440), (3840, 2160), (1080, 2400), (1440, 3200)]
+
+
+def iter_rows(size):
+    """模拟数据库的图片记录：(path, id, width, height, size, uploaded_at, color, mtime, fingerprint, phash, feature_row)"""
+    random.seed(0)
+    for i in range(size):
+        image_type = random.choice(TYPES)
+        width, height = random.choice(SIZES)
+        file_size = random.randrange(200000, 8000000)
+        mtime_ns = 1735689600000000000 + i * 1000003
+        yield (f'{image_type}/{image_type}_{"_".join(random.sample(KEYWORDS, 6))}_{i}.jpg',
+               hashlib.md5(str(i).encode()).hexdigest(), width, height, file_size,
+               f'2025-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}.{i % 1000000:06d}', '#%06x' % random.getrandbits(24),
+               mtime_ns / 1e9, (file_size, mtime_ns, 1000000 + i), random.getrandbits(64), i)
+
+
+def build_dict_cache(size):
+    """旧实现：{path: {mtime, fingerprint, phash, feature_row, data: 完整图片信息字典}}"""
+    cache = {}
+    for path, image_id, width, height, file_size, uploaded_at, color, mtime, fingerprint, phash, row in iter_rows(size):
+        cache[path] = {
+            'mtime': mtime,
+            'fingerprint': fingerprint,
+            'phash': phash,
+            'feature_row': row,
+            'data': {
+                'id': image_id,
+                'url': f'/images/{path}',
+                'thumbnail': f'/thumbnails/{image_id}.jpg',
+                'srcset': ', '.join(f'/resized/{image_id}?w={bucket} {actual}w'
+                                    for bucket, actual in variant_widths(width, config.RESIZED_WIDTHS)),
+                'tag': extract_tags(path),
+                'width': width,
+                'height': height,
+                'size': file_size,
+                'uploaded_at': uploaded_at,
+                'color': color,
+                'keywords': os.path.splitext(path.rsplit('/', 1)[-1])[0].split('_')[1:7]
+            }
+        }
+    return cache
+
+
+def build_record_cache(size):
+    """新实现：{path: ImageRecord}"""
+    cache = {}
+    for path, image_id, width, height, file_size, uploaded_at, color, mtime, fingerprint, phash, row in iter_rows(size):
+        cache[path] = ImageRecord(path, image_id, width, height, file_size, uploaded_at, color,
+                                  mtime=mtime, fingerprint=fingerprint, phash=phash, feature_row=row)
+    return cache
+
+
+def resident(build, size):
+    """构建缓存并返回 (缓存, 常驻内存字节数)"""
+    gc.collect()
+    tracemalloc.start()
+    cache = build(size)
+    gc.collect()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return cache, current
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    print(f"图片数: {size}")
+
+    cache, old_bytes = resident(build_dict_cache, size)
+    del cache
+    print(f"嵌套字典缓存:  {old_bytes / 1024 / 1024:6.1f} MB，每张 {old_bytes / size:6.0f} 字节")
+
+    cache, new_bytes = resident(build_record_cache, size)
+    print(f"ImageRecord:   {new_bytes / 1024 / 1024:6.1f} MB，每张 {new_bytes / size:6.0f} 字节"
+          f"（为旧实现的 {new_bytes / old_bytes:.0%}）")
+
+    # 每张图片的输出与旧实现逐字段一致
+    expected = build_dict_cache(min(size, 1000))
+    for path, cache_data in expected.items():
+        assert cache[path].to_dict() == cache_data['data']
+    del expected
+
+    page = list(cache.values())[:1000]
+    started = time.perf_counter()
+    for _ in range(20):
+        [img.to_dict() for img in page]
+    print(f"一页1000条推导完整字段（to_dict）: {(time.perf_counter() - started) / 20 * 1000:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
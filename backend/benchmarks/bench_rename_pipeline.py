@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+rename.py 批量处理基准测试
+在临时目录生成模拟壁纸，对本地模拟接口分别运行逐张串行处理、流水线批量处理和多图合并请求
+
+用法：python benchmarks/bench_rename_pipeline.py [图片数量，默认40] [接口延迟秒数，默认0.5] [并发数，默认8]
+                                                [错误率，默认0] [每组图片数，默认8] [漏项率，默认0]
+错误率大于0时模拟接口按比例返回 429/500，用于观察重试统计；
+漏项率大于0时合并请求的结果会随机缺少部分图片，用于观察逐张重试
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+import rename
+from analysis_cache import AnalysisCache
+from benchmarks.stub_glm_server import start_stub_server
+
+
+def build_corpus(directory, size):
+    """生成 size 张 3840x2160 的模拟壁纸"""
+    random.seed(0)
+    os.makedirs(directory)
+    for i in range(size):
+        color = tuple(random.randrange(256) for _ in range(3))
+        Image.new('RGB', (3840, 2160), color).save(os.path.join(directory, f'IMG{i:04d}.jpg'), quality=90)
+
+
+def count_committed(directory):
+    return sum(len(files) for _, _, files in os.walk(directory))
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    error_rate = float(sys.argv[4]) if len(sys.argv) > 4 else 0.0
+    batch_size = int(sys.argv[5]) if len(sys.argv) > 5 else 8
+    drop_rate = float(sys.argv[6]) if len(sys.argv) > 6 else 0.0
+
+    server, url = start_stub_server(latency=latency, error_rate=error_rate, drop_rate=drop_rate)
+    rename.API_ENDPOINT = url
+    work_dir = tempfile.mkdtemp(prefix='bench-rename-')
+    rename._analysis_cache = AnalysisCache(os.path.join(work_dir, 'analysis_cache.db'))
+    try:
+        print(f"图片数量: {size}，接口延迟: {latency}秒，并发数: {concurrency}，错误率: {error_rate}")
+        for label, run in [
+            # 两组图片内容相同，force=True 忽略分析缓存，保证都实际调用接口
+            ('串行', lambda d, out: rename.process_directory(d, out, pipeline=False, force=True)),
+            ('流水线', lambda d, out: rename.process_directory(d, out, force=True, api_concurrency=concurrency)),
+            ('合并请求', lambda d, out: rename.process_directory(d, out, force=True, api_concurrency=concurrency,
+                                                              batch_size=batch_size)),
+        ]:
+            directory = os.path.join(work_dir, label)
+            build_corpus(directory, size)
+            server.stats.update(requests=0, bytes=0, max_in_flight=0)
+            started = time.perf_counter()
+            run(directory, os.path.join(work_dir, f'{label}.jsonl'))
+            elapsed = time.perf_counter() - started
+            print(f"[{label}] 耗时 {elapsed:.2f} 秒，{size / elapsed:.1f} 张/秒，"
+                  f"请求 {server.stats['requests']} 次（共 {server.stats['bytes'] / 1024:.0f} KB），"
+                  f"最大并发 {server.stats['max_in_flight']}，"
+                  f"已提交 {count_committed(directory)} 张")
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+冷扫描开销基准测试（不含MD5计算，两种实现相同）
+对比旧版 os.walk + os.stat + Image.open/getsize/getctime 与 os.scandir + 文件头探测
+
+用法：python benchmarks/bench_scan.py [图片数量，默认5000]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from app import wallpaper_manager
+from image_probe import probe_dimensions
+
+FORMATS = ['jpg', 'png', 'webp', 'gif', 'bmp']
+
+
+def build_library(directory, size):
+    """每种格式生成一张样图，按格式轮流复制到多个子目录"""
+    samples = {}
+    for image_format in FORMATS:
+        path = os.path.join(directory, f'sample.{image_format}')
+        Image.new('RGB', (640, 360), (40, 80, 120)).save(path)
+        samples[image_format] = path
+    for i in range(size):
+        image_format = FORMATS[i % len(FORMATS)]
+        folder = os.path.join(directory, 'library', f'folder{i % 20}')
+        os.makedirs(folder, exist_ok=True)
+        shutil.copyfile(samples[image_format], os.path.join(folder, f'IMG{i}.{image_format}'))
+    return os.path.join(directory, 'library')
+
+
+def old_scan(base_dir):
+    """旧实现：os.walk + relpath + os.stat，新文件再 Image.open 读尺寸并分别取大小和创建时间"""
+    results = []
+    for root, dirs, files in os.walk(base_dir):
+        for file in files:
+            if wallpaper_manager.is_image_file(file):
+                file_path = os.path.join(root, file)
+                relative_path = os.path.relpath(file_path, base_dir).replace(os.sep, '/')
+                st = os.stat(file_path)
+                with Image.open(file_path) as img:
+                    width, height = img.size
+                results.append((relative_path, st.st_mtime, width, height,
+                                os.path.getsize(file_path), os.path.getctime(file_path)))
+    return results
+
+
+def new_scan(base_dir):
+    """新实现：walk_images（scandir，每个文件一次stat）+ 文件头探测"""
+    results = []
+    for file_path, relative_path, st in wallpaper_manager.walk_images(base_dir):
+        width, height = probe_dimensions(file_path)
+        results.append((relative_path, st.st_mtime, width, height, st.st_size, st.st_ctime))
+    return results
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    work_dir = tempfile.mkdtemp(prefix='bench-scan-')
+    try:
+        base_dir = build_library(work_dir, size)
+        for label, scan in [('旧版', old_scan), ('新版', new_scan)]:
+            # 先预热一次，排除页缓存的影响，只比较系统调用与Python开销
+            scan(base_dir)
+            started = time.perf_counter()
+            results = scan(base_dir)
+            elapsed = time.perf_counter() - started
+            print(f"[{label}] {len(results)} 张，耗时 {elapsed:.3f} 秒，"
+                  f"{elapsed / len(results) * 1e6:.1f} 微秒/张")
+        assert sorted(old_scan(base_dir)) == sorted(new_scan(base_dir))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
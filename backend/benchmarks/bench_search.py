@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+关键词搜索基准测试
+在模拟的10万张图片快照上测量 /search 使用的倒排索引查询耗时
+
+用法：python benchmarks/bench_search.py [图片数量，默认100000]
+"""
+
+import os
+import sys
+import time
+import random
+import hashlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from library_index import LibrarySnapshot
+from image_record import ImageRecord
+
+TYPES = ['风光', '美女', '动漫', '汽车', '城市']
+# 关键词按长尾分布：少量高频词 + 大量低频词
+KEYWORDS = [f'词{i}' for i in range(2000)] + ['黄昏', '山脉', '雾气', '湖泊', '森林', '日出']
+
+
+def build_images(size):
+    random.seed(0)
+    images = []
+    weights = [1.0 / (i + 1) for i in range(len(KEYWORDS))]
+    weights.reverse()
+    for i in range(size):
+        image_type = random.choice(TYPES)
+        keywords = random.choices(KEYWORDS, weights=weights, k=6)
+        image_id = hashlib.md5(str(i).encode()).hexdigest()
+        name = f'{image_type}_{"_".join(keywords)}'
+        images.append(ImageRecord(f'{image_type}/{name}.jpg', image_id, None, None, None,
+                                  f'2025-01-01T00:00:{i % 60:02d}.{i:06d}'))
+    return images
+
+
+def measure(snapshot, terms, mode='and', prefix=False, repeat=20):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        positions = snapshot.search(terms, mode, prefix)
+        snapshot.paginate(positions, 0, 30)
+        snapshot.facets(positions)
+    return (time.perf_counter() - started) / repeat, len(positions)
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    images = build_images(size)
+
+    started = time.perf_counter()
+    snapshot = LibrarySnapshot(images, generation=1)
+    print(f"图片数: {size}, 关键词数: {len(snapshot.keyword_postings)}, 构建快照: {time.perf_counter() - started:.2f} s")
+
+    cases = [
+        (['黄昏'], 'and', False),
+        (['黄昏', '山脉'], 'and', False),
+        (['黄昏', '山脉', '雾气'], 'and', False),
+        (['黄昏', '词5'], 'and', False),
+        (['黄昏', '山脉'], 'or', False),
+        (['词19'], 'and', True),
+        (['词1'], 'and', True),
+    ]
+    for terms, mode, prefix in cases:
+        elapsed, total = measure(snapshot, terms, mode, prefix)
+        label = ' '.join(terms) + (' (前缀)' if prefix else '')
+        print(f"{label:<20} mode={mode:<3} 结果 {total:>6} 条  {elapsed * 1000:8.2f} ms（含分页与分面统计）")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+缩略图突发请求基准测试
+模拟打开新分类时大量并发请求同一批未缓存的缩略图（多个标签页/用户同时访问），
+在独立子进程中分别运行旧实现（每个请求各自解码原图）与当前实现（按文件合并请求并限制同时解码数），
+报告耗时、实际解码次数、CPU时间和进程峰值内存（VmHWM）
+
+用法：python benchmarks/bench_thumbnail_burst.py [请求数，默认200] [不同图片数，默认10]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import resource
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+
+from thumbnail_store import ThumbnailStore, render_file
+
+
+def build_corpus(directory, count):
+    """一半为4K JPEG、一半为4K PNG（PNG 不能按比例解码，最能体现内存占用）"""
+    random.seed(0)
+    paths = []
+    for i in range(count):
+        size = (3840, 2160)
+        base = Image.linear_gradient('L').resize(size).convert('RGB')
+        img = Image.blend(base, Image.effect_noise(size, random.randint(20, 60)).convert('RGB'), 0.4)
+        path = os.path.join(directory, f'{i}.{"jpg" if i % 2 == 0 else "png"}')
+        img.save(path)
+        paths.append(path)
+    return paths
+
+
+def peak_rss_mb():
+    """进程峰值内存（ru_maxrss 在 exec 后仍保留父进程的值，改读 VmHWM）"""
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_burst(name, corpus, requests):
+    """在当前（子）进程中发起一次突发请求，输出JSON结果"""
+    store = ThumbnailStore(tempfile.mkdtemp(prefix='thumbs-'), max_decodes=os.cpu_count() or 1)
+    decodes = 0
+    decodes_lock = threading.Lock()
+
+    def old_render(image_id, source_path):
+        """旧实现：缓存未命中时直接解码原图"""
+        nonlocal decodes
+        with decodes_lock:
+            decodes += 1
+        path = store.path_for(image_id)
+        render_file(source_path, path, *store.render_options())
+        store.add_rendered(path)
+        return path
+
+    render = old_render if name == 'old' else store.render
+    # 每张原图对应一个缩略图ID，请求按ID轮流分布
+    ids = [f'{i:032x}' for i in range(len(corpus))]
+    start_barrier = threading.Barrier(requests)
+
+    def handle(index):
+        image_id = ids[index % len(ids)]
+        start_barrier.wait()
+        return store.get(image_id) or render(image_id, corpus[index % len(corpus)])
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=requests) as pool:
+        list(pool.map(handle, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    stats = store.stats()
+    print(json.dumps({
+        'elapsed': elapsed,
+        'decodes': decodes if name == 'old' else stats['renders'],
+        'cpu': usage.ru_utime + usage.ru_stime,
+        'peak_mb': peak_rss_mb()
+    }))
+    shutil.rmtree(store.base_dir, ignore_errors=True)
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == '--run':
+        run_burst(sys.argv[2], json.loads(sys.argv[3]), int(sys.argv[4]))
+        return
+
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    workdir = tempfile.mkdtemp(prefix='bench-burst-')
+    try:
+        print(f"生成 {count} 张 4K 原图...")
+        corpus = build_corpus(workdir, count)
+        print(f"突发请求：{requests} 个请求，{count} 张图片，CPU核数 {os.cpu_count()}")
+        for name in ('old', 'new'):
+            for burst in sorted({max(1, requests // 4), requests // 2, requests}):
+                output = subprocess.run(
+                    [sys.executable, __file__, '--run', name, json.dumps(corpus), str(burst)],
+                    check=True, capture_output=True, text=True
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(f"{name:>4} 并发 {burst:>4}: 耗时 {result['elapsed']:6.2f} 秒，解码 {result['decodes']:>4} 次，"
+                      f"CPU {result['cpu']:6.2f} 秒，峰值内存 {result['peak_mb']:7.1f} MB")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
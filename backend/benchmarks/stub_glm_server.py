@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地模拟的智谱 chat/completions 接口，用于在不消耗API额度的情况下测试 rename.py
+每个请求等待固定延迟后返回一个合法的分析结果；可按比例返回 429/500 模拟限流和服务端错误
+一个请求中包含多张图片时返回按 index 编号的JSON数组，可按比例漏掉部分结果模拟批量请求的部分失败
+
+单独运行：python benchmarks/stub_glm_server.py [端口，默认8765] [延迟秒数，默认0.5]
+然后设置 ZHIPU_API_ENDPOINT=http://127.0.0.1:8765/v4/chat/completions 运行 rename.py
+"""
+
+import sys
+import json
+import time
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TYPES = ['风光', '美女', '动漫', '汽车', '城市']
+KEYWORDS = ['黄昏', '山脉', '雾气', '湖泊', '森林', '日出', '长发', '室内', '街道', '夜景', '云彩', '星空']
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """返回模拟分析结果的请求处理器（参数保存在 server 上）"""
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with server.stats_lock:
+            server.stats['requests'] += 1
+            server.stats['bytes'] += len(body)
+            server.in_flight += 1
+            server.stats['max_in_flight'] = max(server.stats['max_in_flight'], server.in_flight)
+        try:
+            time.sleep(server.latency)
+            if server.error_rate and random.random() < server.error_rate:
+                status = random.choice([429, 500])
+                with server.stats_lock:
+                    server.stats['errors'] += 1
+                self._reply(status, {'error': {'message': 'stub error'}}, {'Retry-After': '0'})
+                return
+
+            payload = json.loads(body)
+            parts = payload['messages'][0]['content']
+            image_count = sum(1 for part in parts if part.get('type') == 'image_url')
+            with server.stats_lock:
+                server.stats['images'] += image_count
+            if image_count > 1:
+                items = [
+                    {'index': index, 'type': random.choice(TYPES), 'keywords': random.sample(KEYWORDS, 6)}
+                    for index in range(1, image_count + 1)
+                    if not (server.drop_rate and random.random() < server.drop_rate)
+                ]
+                content = '```json\n' + json.dumps(items, ensure_ascii=False) + '\n```'
+            else:
+                content = json.dumps({
+                    'type': random.choice(TYPES),
+                    'keywords': random.sample(KEYWORDS, 6)
+                }, ensure_ascii=False)
+            self._reply(200, {
+                'model': payload.get('model'),
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}}]
+            })
+        finally:
+            with server.stats_lock:
+                server.in_flight -= 1
+
+    def _reply(self, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port=0, latency=0.5, error_rate=0.0, drop_rate=0.0):
+    """
+    在后台线程启动模拟服务器，返回 (server, 接口地址)；用完调用 server.shutdown()
+    error_rate：返回 429/500 的比例；drop_rate：批量请求中漏掉单张图片结果的比例
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.error_rate = error_rate
+    server.drop_rate = drop_rate
+    server.stats = {'requests': 0, 'images': 0, 'errors': 0, 'bytes': 0, 'max_in_flight': 0}
+    server.stats_lock = threading.Lock()
+    server.in_flight = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}/v4/chat/completions'
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    server, url = start_stub_server(port, latency)
+    print(f"模拟接口已启动: {url}（延迟 {latency} 秒），Ctrl+C 退出")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
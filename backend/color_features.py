@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+颜色特征与相似图片检索
+每张图片在 HSV 空间统计一个粗粒度颜色直方图（76维），全部向量保存在一个内存映射的 float32 矩阵文件中，
+相似检索就是整个矩阵与查询向量的一次矩阵-向量乘法加 top-k 选取；
+同一次解码还提取主色调，用于 /api 的颜色筛选
+"""
+
+import os
+import colorsys
+import threading
+
+import numpy as np
+from PIL import Image
+
+# 有彩色像素：色相12档 × 饱和度2档 × 明度3档；低饱和度或很暗的像素色相没有意义，按明度归入4个灰度档
+HUE_BINS, SAT_BINS, VAL_BINS, GREY_BINS = 12, 2, 3, 4
+FEATURE_DIM = HUE_BINS * SAT_BINS * VAL_BINS + GREY_BINS
+
+# 饱和度、明度低于该值（0-255）的像素视为灰色
+GREY_SATURATION = 40
+GREY_VALUE = 40
+
+# 统计直方图前把图片缩小到的最大边长（缩略图已经足够小，原图按 JPEG 草稿模式缩小解码）
+SAMPLE_SIZE = 128
+
+# 数据库中 feature_row 为该值表示无法提取特征（无法解码），文件变化前不再重试
+NO_ROW = -1
+
+# 主色调所属的颜色类别：有彩色按色相（度）划分，低饱和度按明度归为黑、灰、白
+HUE_FAMILIES = (
+    (15, 'red'), (45, 'orange'), (70, 'yellow'), (165, 'green'),
+    (200, 'cyan'), (260, 'blue'), (300, 'purple'), (345, 'pink'), (360, 'red'),
+)
+COLOR_FAMILIES = ('red', 'orange', 'yellow', 'green', 'cyan', 'blue', 'purple', 'pink', 'black', 'grey', 'white')
+
+
+def load_sample(file_path):
+    """解码一次图片并缩小到最大边长 SAMPLE_SIZE 的 RGB 图（颜色特征与感知哈希都从它计算）"""
+    with Image.open(file_path) as img:
+        img.draft('RGB', (SAMPLE_SIZE, SAMPLE_SIZE))
+        img = img.convert('RGB')
+    img.thumbnail((SAMPLE_SIZE, SAMPLE_SIZE), Image.Resampling.BILINEAR)
+    return img
+
+
+def sample_colors(img):
+    """
+    由 load_sample 得到的图片计算 (颜色特征向量, 主色调'#rrggbb')
+    特征向量为 float32、长度 FEATURE_DIM，是归一化直方图的平方根，模长为1，
+    两个向量的点积即 Bhattacharyya 系数（1为颜色分布相同）
+    主色调：RGB 各分4档（共64档），取像素最多的一档内像素的平均色
+    """
+    rgb = np.asarray(img, dtype=np.uint16).reshape(-1, 3)
+    hsv = np.asarray(img.convert('HSV'), dtype=np.uint16).reshape(-1, 3)
+
+    hue, sat, val = hsv[:, 0], hsv[:, 1], hsv[:, 2]
+    colour_bins = ((hue * HUE_BINS >> 8) * SAT_BINS + (sat * SAT_BINS >> 8)) * VAL_BINS + (val * VAL_BINS >> 8)
+    grey = (sat < GREY_SATURATION) | (val < GREY_VALUE)
+    bins = np.where(grey, HUE_BINS * SAT_BINS * VAL_BINS + (val * GREY_BINS >> 8), colour_bins)
+    histogram = np.bincount(bins, minlength=FEATURE_DIM).astype(np.float32)
+
+    cells = (rgb[:, 0] >> 6) << 4 | (rgb[:, 1] >> 6) << 2 | rgb[:, 2] >> 6
+    dominant = rgb[cells == np.bincount(cells).argmax()].mean(axis=0)
+    return np.sqrt(histogram / histogram.sum()), '#%02x%02x%02x' % tuple(int(round(c)) for c in dominant)
+
+
+def color_family(color):
+    """主色调'#rrggbb' -> 颜色类别（COLOR_FAMILIES 之一），没有主色调时返回None"""
+    if not color:
+        return None
+    red, green, blue = (int(color[i:i + 2], 16) / 255 for i in (1, 3, 5))
+    hue, sat, val = colorsys.rgb_to_hsv(red, green, blue)
+    if val < GREY_VALUE / 255:
+        return 'black'
+    if sat < GREY_SATURATION / 255:
+        return 'white' if val > 0.85 else 'grey'
+    degrees = hue * 360
+    return next(family for limit, family in HUE_FAMILIES if degrees < limit)
+
+
+class FeatureMatrix:
+    """
+    特征矩阵文件：第 i 行是某张图片的特征向量，行号记录在数据库的 feature_row 列
+    只有负责扫描的进程写入（按需以读写方式映射、容量不足时成倍扩展文件）；
+    其他进程只读映射同一文件，文件被扩展后在下一次查询时重新映射
+    删除图片时对应行清零并在之后复用
+    """
+
+    # 初始容量（行）
+    INITIAL_ROWS = 1024
+
+    def __init__(self, path, dim=FEATURE_DIM):
+        self.path = str(path)
+        self.dim = dim
+        self._row_bytes = dim * np.dtype(np.float32).itemsize
+        self._lock = threading.Lock()
+        # 当前映射（只读或读写）
+        self._map = None
+        self._writable = False
+        # 已使用的最大行号 + 1，以及空闲行
+        self.high = 0
+        self._free = []
+
+    def reserve(self, rows):
+        """按数据库中已占用的行号重建分配状态（加载、重新加载或清空数据库后调用）"""
+        rows = set(rows)
+        with self._lock:
+            self.high = max(rows) + 1 if rows else 0
+            self._free = sorted(set(range(self.high)) - rows, reverse=True)
+
+    def put(self, vector, row=None):
+        """写入一个特征向量，row 为None时分配新行，返回行号"""
+        with self._lock:
+            if row is None:
+                row = self._free.pop() if self._free else self.high
+            self.high = max(self.high, row + 1)
+            matrix = self._writable_map(row + 1)
+            matrix[row] = vector
+            return row
+
+    def free(self, row):
+        """释放一行（清零，避免仍在使用旧快照的查询命中已删除的图片）"""
+        with self._lock:
+            if row is None or row < 0 or row >= self.high:
+                return
+            matrix = self._writable_map(row + 1)
+            matrix[row] = 0
+            self._free.append(row)
+
+    def flush(self):
+        """把写入的内容同步到文件"""
+        with self._lock:
+            if self._map is not None and self._writable:
+                self._map.flush()
+
+    def view(self):
+        """当前文件内容的只读视图（文件不存在时为空矩阵）"""
+        with self._lock:
+            try:
+                rows = os.path.getsize(self.path) // self._row_bytes
+            except OSError:
+                rows = 0
+            if not rows:
+                return np.zeros((0, self.dim), dtype=np.float32)
+            if self._map is None or self._map.shape[0] != rows:
+                # 写入进程自己扩展文件时已经重新映射，这里只在其他进程扩展文件后发生
+                self._map = np.memmap(self.path, dtype=np.float32, mode='r+' if self._writable else 'r',
+                                      shape=(rows, self.dim))
+            return self._map
+
+    def _writable_map(self, rows):
+        """以读写方式映射文件，容量不足 rows 行时成倍扩展（调用方需持有锁）"""
+        if self._writable and self._map.shape[0] >= rows:
+            return self._map
+        try:
+            capacity = os.path.getsize(self.path) // self._row_bytes
+        except OSError:
+            capacity = 0
+        if capacity < rows:
+            capacity = max(self.INITIAL_ROWS, capacity * 2, rows)
+            with open(self.path, 'ab') as f:
+                f.truncate(capacity * self._row_bytes)
+        if self._map is not None and self._writable:
+            self._map.flush()
+        self._map = np.memmap(self.path, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+        self._writable = True
+        return self._map
@@ -25,12 +25,64 @@ class Config:
         # 缩略图缓存目录（基于backend目录）
         self.THUMBNAIL_DIR = Path(__file__).parent / 'thumbnails'
         
+        # 缩略图尺寸、JPEG质量与磁盘缓存上限（MB）
+        self.THUMBNAIL_SIZE = self._get_env_int('THUMBNAIL_SIZE', 300)
+        self.THUMBNAIL_QUALITY = self._get_env_int('THUMBNAIL_QUALITY', 85)
+        self.THUMBNAIL_CACHE_MAX_MB = self._get_env_int('THUMBNAIL_CACHE_MAX_MB', 1024)
+        # 同时解码原图生成缩略图的数量上限（通过锁文件在所有 gunicorn worker 之间共享，是全局上限）
+        self.THUMBNAIL_MAX_DECODES = self._get_env_int('THUMBNAIL_MAX_DECODES', min(os.cpu_count() or 1, 4))
+        
+        # 响应式尺寸变体（/resized）的宽度档位与编码质量，与缩略图共用磁盘缓存上限
+        self.RESIZED_WIDTHS = self._get_env_int_list('RESIZED_WIDTHS', [300, 800, 1920])
+        self.RESIZED_QUALITY = self._get_env_int('RESIZED_QUALITY', 80)
+        
+        # 近似重复判定的感知哈希（64位dHash）汉明距离，/duplicates 与 rename.py --skip-duplicates 共用
+        self.DUPLICATE_RADIUS = self._get_env_int('DUPLICATE_RADIUS', 4)
+        
+        # 后台扫描发现新图片后是否自动运行 pregenerate.py 预生成缩略图与变体
+        self.PREGENERATE_AFTER_INDEX = os.environ.get('PREGENERATE_AFTER_INDEX', '0').lower() in ('1', 'true', 'yes')
+        
+        # 数据目录与图片元数据数据库（基于backend目录）
+        self.DATA_DIR = Path(__file__).parent / 'data'
+        self.CACHE_DB = self.DATA_DIR / 'wallpaper_cache.db'
+        # rename.py 的AI分析结果缓存（按图片内容MD5）
+        self.ANALYSIS_CACHE_DB = self.DATA_DIR / 'analysis_cache.db'
+        # 颜色特征矩阵文件（float32，内存映射），用于相似图片检索
+        self.FEATURE_FILE = self.DATA_DIR / 'features.f32'
+        
+        # 后台索引扫描间隔（秒）
+        self.INDEX_INTERVAL = self._get_env_int('INDEX_INTERVAL', 60)
+        
+        # 扫描时并行计算哈希、读取尺寸的线程数
+        self.SCAN_WORKERS = self._get_env_int('SCAN_WORKERS', 4)
+        
+        # 原图浏览器缓存时间（秒）
+        self.IMAGE_CACHE_MAX_AGE = self._get_env_int('IMAGE_CACHE_MAX_AGE', 86400)
+        
+        # 开发服务器（python app.py）是否开启调试模式
+        self.DEBUG = os.environ.get('FLASK_DEBUG', '1').lower() in ('1', 'true', 'yes')
+        
         # 静态文件目录（基于项目根目录）
         self.STATIC_DIR = self.ROOT_DIR / 'static'
         
         # AI配置
         self.ZHIPU_API_KEY = self._get_zhipu_api_key()
-        self.ZHIPU_API_ENDPOINT = "https://open.bigmodel.cn/api/paas/v4/chat/completions"
+        self.ZHIPU_API_ENDPOINT = os.environ.get(
+            'ZHIPU_API_ENDPOINT', "https://open.bigmodel.cn/api/paas/v4/chat/completions"
+        )
+        
+        # rename.py 批量处理：同时进行的API请求数与每秒请求上限（0为不限）
+        self.RENAME_API_CONCURRENCY = self._get_env_int('RENAME_API_CONCURRENCY', 4)
+        self.RENAME_RATE_LIMIT = self._get_env_float('RENAME_RATE_LIMIT', 0)
+        # API请求的连接/读取超时（秒）与失败后的最大重试次数
+        self.RENAME_CONNECT_TIMEOUT = self._get_env_float('RENAME_CONNECT_TIMEOUT', 10)
+        self.RENAME_READ_TIMEOUT = self._get_env_float('RENAME_READ_TIMEOUT', 120)
+        self.RENAME_MAX_RETRIES = self._get_env_int('RENAME_MAX_RETRIES', 4)
+        # 每个API请求合并分析的图片数（1为不合并）及合并时图片缩小到的宽度
+        self.RENAME_BATCH_SIZE = self._get_env_int('RENAME_BATCH_SIZE', 1)
+        self.RENAME_BATCH_IMAGE_WIDTH = self._get_env_int('RENAME_BATCH_IMAGE_WIDTH', 512)
+        # 重命名日志每写入多少条记录执行一次 fsync
+        self.RENAME_JOURNAL_FSYNC_EVERY = self._get_env_int('RENAME_JOURNAL_FSYNC_EVERY', 20)
         
         # 确保目录存在
         self._create_directories()
@@ -55,11 +107,48 @@ class Config:
         # 最后使用默认值（仅用于开发环境）
         return "your_api_key_here"
     
+    def _get_env_int(self, name, default):
+        """从环境变量读取整数配置，未设置或格式错误时使用默认值"""
+        value = os.environ.get(name)
+        if value is None:
+            return default
+        try:
+            return int(value)
+        except ValueError:
+            print(f"环境变量 {name} 不是有效整数: {value}，使用默认值 {default}")
+            return default
+    
+    def _get_env_int_list(self, name, default):
+        """从环境变量读取逗号分隔的正整数列表（升序去重），未设置或格式错误时使用默认值"""
+        value = os.environ.get(name)
+        if value is None:
+            return default
+        try:
+            values = sorted({int(item) for item in value.split(',') if item.strip()})
+        except ValueError:
+            values = []
+        if not values or values[0] <= 0:
+            print(f"环境变量 {name} 不是有效的整数列表: {value}，使用默认值 {default}")
+            return default
+        return values
+    
+    def _get_env_float(self, name, default):
+        """从环境变量读取浮点数配置，未设置或格式错误时使用默认值"""
+        value = os.environ.get(name)
+        if value is None:
+            return default
+        try:
+            return float(value)
+        except ValueError:
+            print(f"环境变量 {name} 不是有效数字: {value}，使用默认值 {default}")
+            return default
+    
     def _create_directories(self):
         """创建必要的目录"""
         directories = [
             self.IMAGE_BASE_DIR,
             self.THUMBNAIL_DIR,
+            self.DATA_DIR,
         ]
         
         for directory in directories:
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件哈希与变化指纹
+图片ID即文件内容的MD5，app.py 与 rename.py 共用
+"""
+
+import hashlib
+
+# 读取缓冲区大小：壁纸普遍为数MB，1MB 分块可大幅减少系统调用次数
+HASH_BUFFER_SIZE = 1024 * 1024
+
+
+def md5_file(file_path, buffer_size=HASH_BUFFER_SIZE):
+    """计算文件内容的MD5（复用同一块缓冲区读取，不为每个分块分配新对象）"""
+    hasher = hashlib.md5()
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with open(file_path, 'rb', buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            # hashlib 处理大块数据时会释放GIL，多线程计算可以并行
+            hasher.update(view[:n])
+    return hasher.hexdigest()
+
+
+def stat_fingerprint(st):
+    """由 stat 结果生成变化指纹 (大小, 纳秒级修改时间, inode)，三者不变即视为文件未变"""
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
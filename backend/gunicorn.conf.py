@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+gunicorn 生产环境配置
+启动: gunicorn -c backend/gunicorn.conf.py（可在任意目录执行）
+
+- preload_app: 主进程加载应用并完成首次扫描，worker 通过 fork 以写时复制方式共享图库索引
+- post_fork: 每个 worker 启动后立即启动后台索引线程，其中只有一个负责扫描并写入数据库，其余 worker 从数据库同步（见 indexer.py）
+- 平滑重载: kill -HUP <主进程PID> 按新配置逐个替换 worker；
+  升级代码: kill -USR2 <主进程PID> 启动新的主进程，确认正常后对旧主进程发送 WINCH 和 QUIT
+"""
+
+import os
+import multiprocessing
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+chdir = BACKEND_DIR
+wsgi_app = 'app:app'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# 请求主要是读取内存中的快照和发送文件，线程即可充分利用IO等待
+worker_class = 'gthread'
+workers = _env_int('GUNICORN_WORKERS', min(multiprocessing.cpu_count(), 4))
+threads = _env_int('GUNICORN_THREADS', 8)
+
+preload_app = True
+timeout = _env_int('GUNICORN_TIMEOUT', 60)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = 5
+
+# 定期替换 worker，防止长时间运行后内存碎片增长
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 10000)
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def when_ready(server):
+    """主进程加载应用后、fork worker 之前：完成首次扫描，worker 直接继承快照"""
+    from app import wallpaper_manager
+
+    snapshot = wallpaper_manager.get_snapshot()
+    server.log.info(f"图库快照已就绪: {len(snapshot)} 张图片")
+    # SQLite 连接不能跨 fork 使用，worker 中会按需重新连接
+    wallpaper_manager.store.close()
+
+
+def post_fork(server, worker):
+    """worker 启动后立即启动后台索引线程：没有收到请求的 worker 也会同步快照、参与扫描进程选举"""
+    from app import library_indexer
+
+    library_indexer.ensure_started()
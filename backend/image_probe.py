@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片尺寸探测
+只读取文件头解析 JPEG/PNG/WebP/GIF/BMP 的宽高，不解码像素；无法识别时退回 PIL
+"""
+
+import struct
+
+from PIL import Image
+
+# 大多数格式的尺寸位于前几十字节；JPEG 需要跳过 APPn 段（EXIF 等）查找 SOF 段
+HEADER_SIZE = 64
+
+# 带尺寸信息的 JPEG SOF 段标记（排除 DHT=C4、JPG=C8、DAC=CC）
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def probe_dimensions(file_path):
+    """返回图片的 (宽, 高)；文件头无法解析时用 PIL 打开（仍然只读文件头，不解码）"""
+    with open(file_path, 'rb') as f:
+        head = f.read(HEADER_SIZE)
+        try:
+            size = _parse_header(head, f)
+        except (struct.error, ValueError):
+            size = None
+    if size and size[0] > 0 and size[1] > 0:
+        return size
+    with Image.open(file_path) as img:
+        return img.size
+
+
+def _parse_header(head, f):
+    if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+        return struct.unpack('>II', head[16:24])
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return struct.unpack('<HH', head[6:10])
+    if head.startswith(b'BM'):
+        header_size = struct.unpack('<I', head[14:18])[0]
+        if header_size == 12:
+            # OS/2 BITMAPCOREHEADER
+            return struct.unpack('<HH', head[18:22])
+        width, height = struct.unpack('<ii', head[18:26])
+        # 高度为负表示自上而下存储
+        return width, abs(height)
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return _parse_webp(head)
+    if head.startswith(b'\xff\xd8'):
+        return _parse_jpeg(f)
+    return None
+
+
+def _parse_webp(head):
+    chunk = head[12:16]
+    if chunk == b'VP8 ':
+        # 有损：帧头起始码之后为14位宽高
+        if head[23:26] != b'\x9d\x01\x2a':
+            return None
+        width, height = struct.unpack('<HH', head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L':
+        # 无损：签名字节0x2F之后为 (宽-1) 与 (高-1)，各14位
+        if head[20] != 0x2F:
+            return None
+        bits = int.from_bytes(head[21:25], 'little')
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X':
+        # 扩展格式：画布 (宽-1)、(高-1)，各24位
+        return int.from_bytes(head[24:27], 'little') + 1, int.from_bytes(head[27:30], 'little') + 1
+    return None
+
+
+def _parse_jpeg(f):
+    """按段跳读 JPEG，直到 SOF 段（EXIF 缩略图等大段直接 seek 跳过）"""
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        while byte and byte != b'\xff':
+            byte = f.read(1)
+        while byte == b'\xff':
+            # 段标记前可能有填充的0xFF
+            byte = f.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker == 0xD8 or marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            # 无长度字段的标记
+            continue
+        if marker == 0xD9 or marker == 0xDA:
+            # 图像结束或扫描数据开始，仍未找到 SOF
+            return None
+        length = struct.unpack('>H', f.read(2))[0]
+        if marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack('>xHH', f.read(5))
+            return width, height
+        f.seek(length - 2, 1)
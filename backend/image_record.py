@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+紧凑的图片记录
+每张图片只保存不可推导的字段（__slots__，没有实例字典）：
+url、thumbnail、srcset、tag、keywords 在输出时由相对路径、图片ID和宽度推导，
+上传时间保存为整数微秒、主色调保存为整数，分类与关键词字符串统一驻留（sys.intern），多张图片共用同一个对象
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+from config import config
+from thumbnail_store import variant_widths
+
+# 上传时间的整数表示：距 1970-01-01（不带时区）的微秒数，与 ISO 字符串一一对应，不受时区和夏令时影响
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_time(text):
+    """ISO 时间字符串 -> 整数微秒；无法无损还原的字符串（带时区等）原样保留"""
+    if not text:
+        return None
+    try:
+        value = datetime.fromisoformat(text)
+    except (TypeError, ValueError):
+        return text
+    if value.tzinfo is not None or value.isoformat() != text:
+        return text
+    return (value - _EPOCH) // _MICROSECOND
+
+
+def decode_time(value):
+    """整数微秒 -> ISO 时间字符串"""
+    if value is None or isinstance(value, str):
+        return value
+    return (_EPOCH + timedelta(microseconds=value)).isoformat()
+
+
+def _name_parts(relative_path):
+    """文件名（不含扩展名）按'_'拆分"""
+    return os.path.splitext(relative_path.rsplit('/', 1)[-1])[0].split('_')
+
+
+def extract_keywords(relative_path):
+    """提取重命名格式（类型_关键词1_..._关键词6）文件名中的6个关键词，其他文件名返回空列表"""
+    name_parts = _name_parts(relative_path)
+    if len(name_parts) >= 7:
+        return [sys.intern(keyword) for keyword in name_parts[1:7]]
+    return []
+
+
+def describe_path(relative_path):
+    """解析路径得到（顶层文件夹, 图片类型, 关键词列表），用于数据库索引字段"""
+    path_parts = relative_path.split('/')
+    category = sys.intern(path_parts[0]) if len(path_parts) > 1 else None
+    name_parts = _name_parts(relative_path)
+    image_type = sys.intern(name_parts[0]) if len(name_parts) >= 7 and name_parts[0] else None
+    return category, image_type, extract_keywords(relative_path)
+
+
+def extract_tags(relative_path):
+    """从路径中提取标签：各级文件夹名，加上重命名格式的类型与6个关键词（否则为文件名）"""
+    path_parts = relative_path.split('/')
+    tags = [part for part in path_parts[:-1] if part]
+    name_without_ext = os.path.splitext(path_parts[-1])[0]
+    if name_without_ext:
+        name_parts = name_without_ext.split('_')
+        if len(name_parts) >= 7:
+            tags.extend(part for part in name_parts[:7] if part)
+        else:
+            tags.append(name_without_ext)
+    return '_'.join(tags) if tags else 'uncategorized'
+
+
+class ImageRecord:
+    """
+    一张图片的缓存记录
+    path 为'/'分隔的相对路径（与图片缓存的键是同一个字符串对象）；
+    mtime、mtime_ns、inode 用于判断文件是否变化，phash、feature_row 为扫描时提取的感知哈希与颜色特征行号
+    """
+
+    __slots__ = ('path', 'id', 'width', 'height', 'size', 'uploaded', 'color_value',
+                 'mtime', 'mtime_ns', 'inode', 'phash', 'feature_row')
+
+    def __init__(self, path, image_id, width, height, size, uploaded_at, color=None,
+                 mtime=0.0, fingerprint=None, phash=None, feature_row=None):
+        self.path = path
+        self.id = image_id
+        self.width = width
+        self.height = height
+        self.size = size
+        self.uploaded = encode_time(uploaded_at)
+        self.color = color
+        self.mtime = mtime
+        self.fingerprint = fingerprint
+        self.phash = phash
+        self.feature_row = feature_row
+
+    @property
+    def uploaded_at(self):
+        return decode_time(self.uploaded)
+
+    @property
+    def color(self):
+        """主色调'#rrggbb'，尚未提取或无法提取时为None"""
+        return None if self.color_value is None else f'#{self.color_value:06x}'
+
+    @color.setter
+    def color(self, value):
+        self.color_value = int(value[1:], 16) if value else None
+
+    @property
+    def fingerprint(self):
+        """变化指纹 (大小, 纳秒级修改时间, inode)，旧记录没有时为None"""
+        if self.mtime_ns is None:
+            return None
+        return (self.size, self.mtime_ns, self.inode)
+
+    @fingerprint.setter
+    def fingerprint(self, value):
+        self.mtime_ns, self.inode = (value[1], value[2]) if value else (None, None)
+
+    @property
+    def url(self):
+        return f'/images/{self.path}'
+
+    @property
+    def thumbnail(self):
+        return f'/thumbnails/{self.id}.jpg'
+
+    @property
+    def srcset(self):
+        """响应式图片的 srcset：每个所需宽度档位一项，标注的宽度不超过原图宽度"""
+        return ', '.join(
+            f'/resized/{self.id}?w={bucket} {actual}w'
+            for bucket, actual in variant_widths(self.width, config.RESIZED_WIDTHS)
+        )
+
+    @property
+    def tag(self):
+        return extract_tags(self.path)
+
+    @property
+    def keywords(self):
+        return extract_keywords(self.path)
+
+    def copy(self, **changes):
+        """复制一份记录并修改部分字段（当前快照仍在使用的记录不能原地修改）"""
+        record = ImageRecord.__new__(ImageRecord)
+        for name in self.__slots__:
+            setattr(record, name, getattr(self, name))
+        for name, value in changes.items():
+            setattr(record, name, value)
+        return record
+
+    def to_dict(self):
+        """接口输出的完整图片信息（字段与旧版缓存字典一致）"""
+        return {
+            'id': self.id,
+            'url': self.url,
+            'thumbnail': self.thumbnail,
+            'srcset': self.srcset,
+            'tag': self.tag,
+            'width': self.width,
+            'height': self.height,
+            'size': self.size,
+            'uploaded_at': self.uploaded_at,
+            'color': self.color,
+            'keywords': self.keywords
+        }
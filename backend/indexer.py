@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+后台图库索引线程
+按固定间隔轮询扫描图片目录；安装了 watchdog 时同时监听文件变化，变化后尽快重新扫描
+多进程部署（gunicorn 多个 worker）时通过文件锁选出一个进程负责扫描并写入数据库，
+其余进程只从数据库同步，避免每个 worker 重复扫描整个图库
+"""
+
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，只会以单进程方式运行，始终负责扫描
+    fcntl = None
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # watchdog 为可选依赖，缺失时仅使用轮询
+    Observer = None
+    FileSystemEventHandler = object
+
+
+# 会改变图库内容的事件类型；只读打开、关闭（opened / closed_no_write）不算，
+# 否则发送图片、生成缩略图和扫描时计算MD5都会唤醒索引线程，引起反复全量扫描
+CHANGE_EVENTS = {'created', 'deleted', 'moved', 'modified', 'closed'}
+
+
+class _ChangeHandler(FileSystemEventHandler):
+    """文件变化事件处理器：只负责唤醒索引线程"""
+
+    def __init__(self, indexer):
+        self.indexer = indexer
+
+    def on_any_event(self, event):
+        if event.event_type not in CHANGE_EVENTS:
+            return
+        if event.is_directory:
+            # 目录的修改时间随其中文件变化，文件本身的事件已经处理
+            if event.event_type in ('created', 'deleted', 'moved'):
+                self.indexer.trigger()
+            return
+        paths = (event.src_path, getattr(event, 'dest_path', ''))
+        if any(self.indexer.is_image_path(path) for path in paths if path):
+            self.indexer.trigger()
+
+
+class LibraryIndexer:
+    """后台索引线程管理类"""
+
+    # 收到文件变化通知后等待的秒数，合并批量复制产生的连续事件
+    DEBOUNCE_SECONDS = 2.0
+
+    # 非扫描进程检查数据库版本的最长间隔（只读一行元信息，开销很小）
+    FOLLOWER_SYNC_SECONDS = 5.0
+
+    def __init__(self, manager, watch_dir, interval=60, use_watchdog=True, lock_file=None, on_change=None,
+                 extensions=None):
+        self.manager = manager
+        self.watch_dir = str(watch_dir)
+        self.interval = interval
+        self.use_watchdog = use_watchdog and Observer is not None
+        # 扫描进程选举用的锁文件，为None时当前进程总是负责扫描
+        self.lock_file = str(lock_file) if lock_file else None
+        self._lock_fd = None
+        # 图片文件扩展名（小写），其他文件的变化不触发扫描；为None时不过滤
+        self.extensions = {extension.lower() for extension in extensions} if extensions else None
+        # 每次扫描后的回调，参数为本次新增或变化的图片路径（仅扫描进程调用，例如启动缩略图预生成）
+        self.on_change = on_change
+
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._observer = None
+        # 启动线程的进程ID，fork 后（如 gunicorn worker）需要在子进程中重新启动
+        self._pid = None
+        self.last_error = None
+
+    @property
+    def mode(self):
+        if not self._is_leader():
+            return 'sync'
+        return 'watchdog' if self._observer is not None else 'polling'
+
+    @property
+    def role(self):
+        """leader：负责扫描文件系统；follower：只从数据库同步"""
+        return 'leader' if self._is_leader() else 'follower'
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive() and self._pid == os.getpid()
+
+    def ensure_started(self):
+        """确保当前进程中的索引线程已启动（可重复调用）"""
+        if self.running:
+            return
+        with self._start_lock:
+            if self.running:
+                return
+            self._pid = os.getpid()
+            # fork 继承来的锁文件描述符属于父进程，子进程需要重新竞争
+            self._lock_fd = None
+            self._observer = None
+            self._stop.clear()
+            self._wakeup.clear()
+            self._thread = threading.Thread(target=self._run, name='library-indexer', daemon=True)
+            self._thread.start()
+            print(f"图库索引线程已启动（进程: {self._pid}，间隔: {self.interval}秒）")
+
+    def is_image_path(self, path):
+        """路径是否为需要索引的图片文件"""
+        if isinstance(path, bytes):
+            path = os.fsdecode(path)
+        return self.extensions is None or os.path.splitext(path)[1].lower() in self.extensions
+
+    def trigger(self):
+        """请求尽快重新扫描"""
+        self._wakeup.set()
+
+    def stop(self):
+        """停止索引线程"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+
+    def _is_leader(self):
+        return self.lock_file is None or fcntl is None or self._lock_fd is not None
+
+    def _try_acquire_leadership(self):
+        """尝试获取扫描锁（非阻塞）；持有锁的进程退出后由其他进程接替"""
+        if self._is_leader():
+            return True
+        fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        print(f"进程 {os.getpid()} 负责扫描图库")
+        return True
+
+    def _start_observer(self):
+        """启动文件变化监听（失败时退回轮询）"""
+        if not self.use_watchdog:
+            return
+        try:
+            observer = Observer()
+            observer.schedule(_ChangeHandler(self), self.watch_dir, recursive=True)
+            observer.daemon = True
+            observer.start()
+            self._observer = observer
+        except Exception as e:
+            print(f"文件变化监听启动失败，使用轮询模式: {e}")
+            self._observer = None
+            self.use_watchdog = False
+
+    def _run(self):
+        """索引线程主循环"""
+        while not self._stop.is_set():
+            try:
+                if self._try_acquire_leadership():
+                    if self._observer is None:
+                        self._start_observer()
+                    self.manager.refresh_snapshot()
+                    if self.on_change:
+                        # 没有新图片时也调用，便于回调处理之前积压的图片
+                        self.on_change(self.manager.last_changed_paths)
+                else:
+                    self.manager.sync_from_store()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"后台扫描图库失败: {e}")
+
+            if self._is_leader():
+                self._wakeup.wait(self.interval)
+            else:
+                self._wakeup.wait(min(self.interval, self.FOLLOWER_SYNC_SECONDS))
+            if self._wakeup.is_set() and not self._stop.is_set():
+                # 合并短时间内的连续变化事件
+                self._stop.wait(self.DEBOUNCE_SECONDS)
+            self._wakeup.clear()
@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图库快照
+后台索引线程每次扫描后生成一个新的只读快照，请求处理只读取当前快照
+"""
+
+import time
+import base64
+import hashlib
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from functools import reduce
+from itertools import chain
+from operator import attrgetter, or_
+
+import numpy as np
+
+from config import config
+from perceptual_hash import HammingIndex
+from color_features import color_family
+from image_record import describe_path
+
+# 图片方向：宽高相差不超过长边的该比例时视为方形
+ORIENTATIONS = ('landscape', 'portrait', 'square')
+SQUARE_TOLERANCE = 0.05
+# 预先建好位图的最小宽度档位，以及 /api 的 min_width 可以使用的别名
+WIDTH_BUCKETS = (1280, 1920, 2560, 3840, 7680)
+WIDTH_ALIASES = {'hd': 1280, '1080p': 1920, 'fhd': 1920, '2k': 2560, 'qhd': 2560, '4k': 3840, 'uhd': 3840, '8k': 7680}
+# 接口输出格式版本，计入快照ETag：增删输出字段或修改字段的推导规则时递增，使客户端缓存的旧响应失效
+RESPONSE_FORMAT_VERSION = 2
+
+
+def image_orientation(width, height):
+    """图片方向（ORIENTATIONS 之一），尺寸未知时返回None"""
+    if not width or not height:
+        return None
+    if abs(width - height) <= SQUARE_TOLERANCE * max(width, height):
+        return 'square'
+    return 'landscape' if width > height else 'portrait'
+
+
+def tag_categories(tag):
+    """图片所属的分类ID集合：标签中的每一段（文件夹、类型、关键词）以及完整标签"""
+    categories = set(part for part in tag.split('_') if part)
+    categories.add(tag)
+    return categories
+
+
+def encode_cursor(img):
+    """分页游标：编码最后一张图片的排序键（上传时间, 相对路径），该图片被删除后仍能定位"""
+    key = f"{img.uploaded_at or ''}\n{img.path}"
+    return base64.urlsafe_b64encode(key.encode('utf-8')).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor):
+    """游标 -> (上传时间, 相对路径)，格式无效时抛出 ValueError"""
+    try:
+        key = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f'无效的游标: {cursor}')
+    uploaded_at, separator, path = key.partition('\n')
+    if not separator or not path:
+        raise ValueError(f'无效的游标: {cursor}')
+    return uploaded_at, path
+
+
+class CategoryIndex:
+    """
+    分类树（顶层文件夹 → 图片类型 → 关键词）及精确计数
+    由 WallpaperManager 在图片增删时增量维护，不需要重新遍历全部图片
+    """
+
+    def __init__(self):
+        # 分类ID -> 属于该分类的图片数（与 /api 的 cid 过滤规则一致）
+        self.counts = Counter()
+        # 顶层分类 -> {'images': 标签以该分类开头的图片数, 'composite': 复合标签图片数,
+        #             'types': {类型 -> {'count': 图片数, 'keywords': Counter}}}
+        # （节点在 images 降为0时删除；counts 还包含关键词命中，不能用来判断节点是否还存在）
+        self.tree = {}
+        # 每次修改递增，用于判断分类列表是否需要重建
+        self.version = 0
+        self._cached_list = None
+        self._cached_version = -1
+
+    def add(self, tag, image_type=None, keywords=()):
+        """登记一张图片"""
+        self._update(tag, image_type, keywords, 1)
+
+    def remove(self, tag, image_type=None, keywords=()):
+        """移除一张图片"""
+        self._update(tag, image_type, keywords, -1)
+
+    def _update(self, tag, image_type, keywords, delta):
+        self.version += 1
+        for cid in tag_categories(tag):
+            self.counts[cid] += delta
+            if self.counts[cid] <= 0:
+                del self.counts[cid]
+
+        top = tag.split('_')[0]
+        node = self.tree.setdefault(top, {'images': 0, 'composite': 0, 'types': {}})
+        node['images'] += delta
+        if '_' in tag:
+            node['composite'] += delta
+
+        if image_type:
+            type_node = node['types'].setdefault(image_type, {'count': 0, 'keywords': Counter()})
+            type_node['count'] += delta
+            for keyword in set(keywords):
+                type_node['keywords'][keyword] += delta
+                if type_node['keywords'][keyword] <= 0:
+                    del type_node['keywords'][keyword]
+            if type_node['count'] <= 0:
+                del node['types'][image_type]
+
+        if node['images'] <= 0:
+            del self.tree[top]
+
+    def to_list(self):
+        """
+        生成 /categories 返回的分类列表（未变化时复用上次结果）
+        树的结构按文件夹划分，但每个节点的 id 都是全局的分类ID，count 取该ID的全局计数，
+        与 /api?cid=<id> 的 total 一致
+        """
+        if self._cached_version == self.version:
+            return self._cached_list
+
+        categories = []
+        for top in sorted(self.tree):
+            node = self.tree[top]
+            children = []
+            for image_type in sorted(node['types']):
+                type_node = node['types'][image_type]
+                keywords = sorted(type_node['keywords'], key=lambda keyword: (-self.counts[keyword], keyword))
+                children.append({
+                    'id': image_type,
+                    'name': image_type,
+                    'type': 'type',
+                    'count': self.counts[image_type],
+                    'children': [
+                        {'id': keyword, 'name': keyword, 'type': 'keyword', 'count': self.counts[keyword]}
+                        for keyword in keywords
+                    ]
+                })
+            categories.append({
+                'id': top,
+                'name': top,
+                # 与旧接口一致：含复合标签的为文件夹，否则为单个文件
+                'type': 'folder' if node['composite'] else 'file',
+                'count': self.counts[top],
+                'children': children
+            })
+
+        self._cached_list = categories
+        self._cached_version = self.version
+        return categories
+
+
+class LibrarySnapshot:
+    """某一时刻的图库只读视图（创建后不再修改，可在线程间安全共享）"""
+
+    # 搜索结果分面统计最多扫描的条数，保证宽泛查询的耗时有上限
+    FACET_SCAN_LIMIT = 20000
+
+    def __init__(self, images, generation, scanned_at=None, scan_duration=0.0, categories=(), phashes=None,
+                 features=None, feature_rows=None):
+        # 图片记录（ImageRecord）列表，按上传时间从新到旧排序（同一时间按路径），保证分页顺序稳定
+        ordered = sorted(images, key=attrgetter('path'))
+        ordered.sort(key=lambda img: img.uploaded_at or '', reverse=True)
+        self.images = tuple(ordered)
+        # 快照代数，每次生成新快照时递增
+        self.generation = generation
+        # 扫描完成时间（时间戳）与扫描耗时（秒）
+        self.scanned_at = scanned_at if scanned_at is not None else time.time()
+        self.scan_duration = scan_duration
+        # 预先生成的分类列表（来自 CategoryIndex）
+        self.categories = categories
+        # 快照内容摘要，作为列表接口的弱ETag（内容相同则不同进程、重启前后都一致）。
+        # 覆盖全部输出字段：url、tag、keywords 由路径推导，srcset 由图片ID、宽度和尺寸档位推导
+        digest = hashlib.md5(f"{RESPONSE_FORMAT_VERSION}:{config.RESIZED_WIDTHS}\n".encode('utf-8'))
+        for img in self.images:
+            digest.update(f"{img.id}:{img.path}:{img.uploaded_at}:{img.width}:{img.height}:{img.size}:"
+                          f"{img.color}\n".encode('utf-8'))
+        self.etag = digest.hexdigest()
+
+        # 图片ID -> 排序位置，用于游标分页
+        self.rank = {}
+        # 分类ID -> 该分类图片的排序位置（升序数组）
+        self.category_postings = {}
+        # 关键词倒排索引：关键词 -> 含该关键词图片的排序位置（升序数组）
+        self.keyword_postings = {}
+        # 排序位置 -> 图片类型（非重命名格式的图片为None）/ 关键词，用于搜索结果分面统计
+        self.image_types = []
+        self.image_keywords = []
+        # 分面位图：方向 / 主色调类别 -> 位图（整数，第 i 位表示排序位置 i 的图片），多个条件按位与即可
+        orientation_postings = {}
+        color_postings = {}
+        widths = array('l')
+        for position, img in enumerate(self.images):
+            self.rank.setdefault(img.id, position)
+            for cid in tag_categories(img.tag):
+                self._append(self.category_postings, cid, position)
+            _, image_type, keywords = describe_path(img.path)
+            for keyword in set(keywords):
+                self._append(self.keyword_postings, keyword, position)
+            # 类型与关键词字符串已驻留，各图片共用同一个对象
+            self.image_types.append(image_type)
+            self.image_keywords.append(tuple(keywords))
+            widths.append(img.width or 0)
+            orientation = image_orientation(img.width, img.height)
+            if orientation:
+                self._append(orientation_postings, orientation, position)
+            family = color_family(img.color)
+            if family:
+                self._append(color_postings, family, position)
+        # 有序关键词表，用于前缀匹配
+        self.sorted_keywords = sorted(self.keyword_postings)
+
+        size = len(self.images)
+        self.orientation_bitmaps = {key: _to_bitmap(postings, size) for key, postings in orientation_postings.items()}
+        self.color_bitmaps = {key: _to_bitmap(postings, size) for key, postings in color_postings.items()}
+        # 排序位置 -> 宽度，按最小宽度筛选时向量化比较；常用档位预先建好位图
+        self.widths = np.frombuffer(widths, dtype='l') if size else np.zeros(0, dtype=np.intp)
+        self.width_bitmaps = {bucket: _to_bitmap(np.flatnonzero(self.widths >= bucket), size)
+                              for bucket in WIDTH_BUCKETS}
+
+        # 相对路径 -> 感知哈希（扫描时计算，尚未计算的图片不在其中）；
+        # 按路径而不是图片ID保存，内容完全相同的副本ID相同，也要作为重复图片报告
+        self.phashes = phashes or {}
+        # 按需构建的索引（近似重复、相似检索、分辨率筛选）共用的锁
+        self._lazy_lock = threading.Lock()
+        # 近似重复索引与分组按汉明距离半径缓存，首次查询时构建
+        self._duplicate_indexes = {}
+        self._duplicate_groups = {}
+
+        # 颜色特征矩阵（FeatureMatrix）与 图片ID -> 矩阵行号
+        self.features = features
+        self.feature_rows = feature_rows or {}
+        # 矩阵行号 -> 图片ID 及有效行掩码，首次相似查询时构建
+        self._row_ids = None
+        self._valid_rows = None
+
+    @staticmethod
+    def _append(postings_map, key, position):
+        postings = postings_map.get(key)
+        if postings is None:
+            postings = postings_map[key] = array('l')
+        postings.append(position)
+
+    def __len__(self):
+        return len(self.images)
+
+    @property
+    def age(self):
+        """快照距今的秒数"""
+        return time.time() - self.scanned_at
+
+    def page(self, cid='all', start=0, count=30, after=None, orientations=(), min_width=None, colors=()):
+        """
+        分页查询，返回 (图片列表, 总数, 是否还有更多)
+        after 为上一页响应中的游标（encode_cursor），给出时忽略 start；
+        游标对应的图片已被删除时从其原来的排序位置之后继续，游标格式无效时抛出 ValueError
+        orientations / colors 为方向、主色调类别（同一分面内任一匹配即可），min_width 为最小宽度
+        """
+        return self.paginate(self.positions(cid, orientations, min_width, colors), start, count, after)
+
+    def positions(self, cid='all', orientations=(), min_width=None, colors=()):
+        """分类与筛选条件匹配的全部图片的升序位置序列"""
+        if orientations or colors or min_width:
+            return self.filter(cid, orientations, min_width, colors)
+        if cid == 'all':
+            return range(len(self.images))
+        return self.category_postings.get(cid, ())
+
+    def width_bitmap(self, min_width):
+        """宽度不小于 min_width 的图片位图（不在预建档位中的值按需计算并缓存）"""
+        bitmap = self.width_bitmaps.get(min_width)
+        if bitmap is None:
+            bitmap = _to_bitmap(np.flatnonzero(self.widths >= min_width), len(self.images))
+            with self._lazy_lock:
+                # 限制缓存条数，避免任意取值的请求占满内存
+                if len(self.width_bitmaps) < len(WIDTH_BUCKETS) + 32:
+                    self.width_bitmaps[min_width] = bitmap
+        return bitmap
+
+    def filter(self, cid='all', orientations=(), min_width=None, colors=()):
+        """
+        按分类与分面筛选，返回匹配图片的升序位置数组
+        分面条件在位图上求与（同一分面内的多个取值先求或），最后按分类倒排列表取出匹配的位置
+        """
+        size = len(self.images)
+        bitmap = (1 << size) - 1
+        if orientations:
+            bitmap &= reduce(or_, (self.orientation_bitmaps.get(key, 0) for key in orientations))
+        if colors:
+            bitmap &= reduce(or_, (self.color_bitmaps.get(key, 0) for key in colors))
+        if min_width:
+            bitmap &= self.width_bitmap(min_width)
+
+        mask = _bitmap_mask(bitmap, size)
+        if cid == 'all':
+            return np.flatnonzero(mask)
+        postings = self.category_postings.get(cid)
+        if postings is None:
+            return np.zeros(0, dtype=np.intp)
+        postings = np.frombuffer(postings, dtype='l')
+        return postings[mask[postings]]
+
+    def paginate(self, postings, start=0, count=30, after=None):
+        """对升序位置序列分页，规则同 page()"""
+        if after:
+            if after in self.rank:
+                # 旧版游标（图片ID）
+                start = bisect_right(postings, self.rank[after])
+            else:
+                start = self._cursor_start(postings, *decode_cursor(after))
+
+        end = start + count
+        page = [self.images[position] for position in postings[start:end]]
+        return page, len(postings), end < len(postings)
+
+    def _cursor_start(self, postings, uploaded_at, path):
+        """在有序位置数组中二分查找第一张排在游标之后的图片（上传时间更早，或时间相同、路径更大），O(log N)"""
+        low, high = 0, len(postings)
+        while low < high:
+            middle = (low + high) // 2
+            img = self.images[postings[middle]]
+            key = img.uploaded_at or ''
+            if key > uploaded_at or (key == uploaded_at and img.path <= path):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def expand_keyword(self, term, prefix=False):
+        """关键词 -> 匹配的倒排列表（prefix为True时匹配所有以term开头的关键词）"""
+        if not prefix:
+            postings = self.keyword_postings.get(term)
+            return [postings] if postings else []
+        matched = []
+        index = bisect_left(self.sorted_keywords, term)
+        while index < len(self.sorted_keywords) and self.sorted_keywords[index].startswith(term):
+            matched.append(self.keyword_postings[self.sorted_keywords[index]])
+            index += 1
+        return matched
+
+    def search(self, terms, mode='and', prefix=False):
+        """
+        多关键词搜索，返回匹配图片的升序位置列表
+        terms 中以'*'结尾的词按前缀匹配；mode 为 'and'（交集）或 'or'（并集）
+        """
+        term_postings = []
+        for term in terms:
+            term_prefix = prefix or term.endswith('*')
+            term = term.rstrip('*')
+            if not term:
+                continue
+            matched = self.expand_keyword(term, term_prefix)
+            if len(matched) == 1:
+                term_postings.append(matched[0])
+            elif matched:
+                # 前缀匹配到多个关键词，先求并集
+                term_postings.append(_union(matched))
+            elif mode == 'and':
+                return []
+
+        if not term_postings:
+            return []
+        if mode == 'or':
+            return _union(term_postings)
+
+        # 从最短的列表开始求交集，结果只会越来越短
+        term_postings.sort(key=len)
+        result = term_postings[0]
+        for postings in term_postings[1:]:
+            result = _intersect(result, postings)
+            if not result:
+                break
+        return result
+
+    def duplicate_index(self, radius):
+        """指定半径的感知哈希多索引表，键为排序位置（按需构建，同一快照内复用）"""
+        with self._lazy_lock:
+            index = self._duplicate_indexes.get(radius)
+            if index is None:
+                index = HammingIndex(radius)
+                for position, img in enumerate(self.images):
+                    phash = self.phashes.get(img.path)
+                    if phash is not None:
+                        index.add(position, phash)
+                self._duplicate_indexes[radius] = index
+            return index
+
+    def near_duplicates(self, image_id, radius):
+        """
+        与指定图片近似重复的图片 [(距离, 排序位置), ...]（不含自身，内容完全相同的副本距离为0），
+        图片没有感知哈希时返回空列表
+        """
+        position = self.rank.get(image_id)
+        phash = self.phashes.get(self.images[position].path) if position is not None else None
+        if phash is None:
+            return []
+        return [(distance, other) for distance, other in self.duplicate_index(radius).search(phash)
+                if other != position]
+
+    def duplicate_groups(self, radius):
+        """
+        近似重复分组，每组按分辨率、文件大小从高到低排列（第一张为建议保留的图片），
+        组按图片数从多到少排列
+        """
+        groups = self._duplicate_groups.get(radius)
+        if groups is not None:
+            return groups
+        groups = []
+        for members in self.duplicate_index(radius).groups():
+            images = sorted((self.images[position] for position in sorted(members)),
+                            key=lambda img: ((img.width or 0) * (img.height or 0), img.size or 0),
+                            reverse=True)
+            groups.append(images)
+        groups.sort(key=lambda images: (-len(images), images[0].id))
+        with self._lazy_lock:
+            self._duplicate_groups[radius] = groups
+        return groups
+
+    def _similar_rows(self):
+        """矩阵行号 -> 图片ID 的列表与有效行掩码（只含当前快照中的图片）"""
+        with self._lazy_lock:
+            if self._row_ids is None:
+                high = max(self.feature_rows.values(), default=-1) + 1
+                row_ids = [None] * high
+                valid = np.zeros(high, dtype=bool)
+                for image_id, row in self.feature_rows.items():
+                    if image_id in self.rank:
+                        row_ids[row] = image_id
+                        valid[row] = True
+                self._row_ids, self._valid_rows = row_ids, valid
+            return self._row_ids, self._valid_rows
+
+    def similar(self, image_id, count=30):
+        """
+        颜色分布最相似的图片 [(相似度, 图片ID), ...]（不含自身），按相似度从高到低排列
+        整个特征矩阵与查询向量做一次矩阵-向量乘法，再用 argpartition 取前 count 个；图片没有特征时返回空列表
+        """
+        row = self.feature_rows.get(image_id)
+        if row is None or self.features is None:
+            return []
+        row_ids, valid = self._similar_rows()
+        matrix = self.features.view()
+        high = min(len(row_ids), matrix.shape[0])
+        if row >= high:
+            return []
+        scores = matrix[:high] @ np.array(matrix[row])
+        scores[~valid[:high]] = -np.inf
+        scores[row] = -np.inf
+        count = min(count, int(np.count_nonzero(valid[:high])) - 1)
+        if count <= 0:
+            return []
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(float(scores[index]), row_ids[index]) for index in top]
+
+    def facets(self, positions, limit=20):
+        """
+        统计搜索结果中的图片类型与关键词分布
+        结果超过 FACET_SCAN_LIMIT 条时只统计最新的部分，并标记 sampled
+        """
+        sampled = len(positions) > self.FACET_SCAN_LIMIT
+        if sampled:
+            positions = positions[:self.FACET_SCAN_LIMIT]
+        types = Counter(map(self.image_types.__getitem__, positions))
+        types.pop(None, None)
+        keywords = Counter(chain.from_iterable(map(self.image_keywords.__getitem__, positions)))
+        return {
+            'type': [{'id': name, 'count': count} for name, count in types.most_common()],
+            'keyword': [{'id': name, 'count': count} for name, count in keywords.most_common(limit)],
+            'sampled': sampled
+        }
+
+
+def _to_bitmap(positions, size):
+    """位置序列 -> 位图整数（第 i 位为1表示位置 i 匹配）"""
+    mask = np.zeros(size, dtype=bool)
+    mask[np.asarray(positions, dtype=np.intp)] = True
+    return int.from_bytes(np.packbits(mask, bitorder='little').tobytes(), 'little')
+
+
+def _bitmap_mask(bitmap, size):
+    """位图整数 -> 长度为 size 的布尔数组"""
+    data = np.frombuffer(bitmap.to_bytes((size + 7) // 8, 'little'), dtype=np.uint8)
+    return np.unpackbits(data, count=size, bitorder='little').view(bool)
+
+
+def _intersect(small, large):
+    """
+    两个升序位置列表求交集
+    长度悬殊时遍历较短列表、在较长列表中二分查找，O(s·log l)；否则用集合求交
+    """
+    if len(small) > len(large):
+        small, large = large, small
+    if len(small) * 32 > len(large):
+        return sorted(set(small).intersection(large))
+    result = []
+    lo = 0
+    size = len(large)
+    for position in small:
+        lo = bisect_left(large, position, lo)
+        if lo == size:
+            break
+        if large[lo] == position:
+            result.append(position)
+    return result
+
+
+def _union(postings_lists):
+    """多个升序位置列表求并集"""
+    return sorted(set(chain.from_iterable(postings_lists)))
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片元数据存储
+基于 SQLite（WAL 模式），替代整体读写的 wallpaper_cache.json
+"""
+
+import os
+import json
+import sqlite3
+import threading
+
+# 每个版本对应一组建表/升级语句，按 PRAGMA user_version 依次执行
+_SCHEMA_STEPS = [
+    # 版本1：图片表与关键词表
+    """
+    CREATE TABLE images (
+        path TEXT PRIMARY KEY,
+        id TEXT NOT NULL,
+        mtime REAL NOT NULL,
+        tag TEXT NOT NULL,
+        category TEXT,
+        type TEXT,
+        width INTEGER,
+        height INTEGER,
+        size INTEGER,
+        uploaded_at TEXT
+    );
+    CREATE INDEX idx_images_id ON images(id);
+    CREATE INDEX idx_images_category ON images(category);
+    CREATE TABLE image_keywords (
+        path TEXT NOT NULL REFERENCES images(path) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        keyword TEXT NOT NULL,
+        PRIMARY KEY (path, position)
+    );
+    CREATE INDEX idx_image_keywords_keyword ON image_keywords(keyword);
+    CREATE TABLE meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    """,
+    # 版本2：文件变化指纹（大小使用已有的 size 列）
+    """
+    ALTER TABLE images ADD COLUMN mtime_ns INTEGER;
+    ALTER TABLE images ADD COLUMN inode INTEGER;
+    """,
+    # 版本3：感知哈希（dHash，16位十六进制），用于近似重复检测
+    """
+    ALTER TABLE images ADD COLUMN phash TEXT;
+    """,
+    # 版本4：颜色特征向量在特征矩阵文件中的行号，用于相似图片检索
+    """
+    ALTER TABLE images ADD COLUMN feature_row INTEGER;
+    """,
+    # 版本5：主色调（'#rrggbb'），与颜色特征同一次解码提取；清空特征行号，让下次扫描一并重新计算
+    """
+    ALTER TABLE images ADD COLUMN color TEXT;
+    UPDATE images SET feature_row = NULL;
+    """,
+]
+
+
+def normalize_path(relative_path):
+    """统一相对路径分隔符为'/'（兼容旧缓存中的Windows路径）"""
+    return relative_path.replace('\\', '/')
+
+
+class MetadataStore:
+    """图片元数据存储类"""
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        # 每个线程（及 fork 后的每个进程）使用独立连接
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self):
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def close(self):
+        """关闭当前线程的连接（gunicorn 主进程 fork worker 前调用，避免子进程继承打开的连接）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
+
+    def _init_schema(self):
+        """建表或升级到最新结构"""
+        conn = self._connect()
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for step in range(version, len(_SCHEMA_STEPS)):
+            with conn:
+                conn.executescript(_SCHEMA_STEPS[step])
+                conn.execute(f'PRAGMA user_version = {step + 1}')
+
+    def iter_images(self):
+        """遍历全部图片记录（附带按顺序排列的关键词列表）"""
+        conn = self._connect()
+        keywords = {}
+        for row in conn.execute('SELECT path, keyword FROM image_keywords ORDER BY path, position'):
+            keywords.setdefault(row['path'], []).append(row['keyword'])
+        for row in conn.execute('SELECT * FROM images'):
+            yield row, keywords.get(row['path'], [])
+
+    @staticmethod
+    def row_fingerprint(row):
+        """从记录中取出变化指纹 (大小, 纳秒级修改时间, inode)，旧记录没有时返回None"""
+        if row['mtime_ns'] is None:
+            return None
+        return (row['size'], row['mtime_ns'], row['inode'])
+
+    def upsert_image(self, path, mtime, data, category=None, image_type=None, keywords=(), fingerprint=None,
+                     phash=None, feature_row=None, color=None):
+        """写入或更新一张图片的记录（单独事务）"""
+        mtime_ns, inode = (fingerprint[1], fingerprint[2]) if fingerprint else (None, None)
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                '''
+                INSERT INTO images (path, id, mtime, tag, category, type, width, height, size, uploaded_at,
+                                    mtime_ns, inode, phash, feature_row, color)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    id = excluded.id, mtime = excluded.mtime, tag = excluded.tag,
+                    category = excluded.category, type = excluded.type,
+                    width = excluded.width, height = excluded.height,
+                    size = excluded.size, uploaded_at = excluded.uploaded_at,
+                    mtime_ns = excluded.mtime_ns, inode = excluded.inode, phash = excluded.phash,
+                    feature_row = excluded.feature_row, color = excluded.color
+                ''',
+                (path, data['id'], mtime, data['tag'], category, image_type,
+                 data['width'], data['height'], data['size'], data['uploaded_at'],
+                 mtime_ns, inode, phash, feature_row, color)
+            )
+            conn.execute('DELETE FROM image_keywords WHERE path = ?', (path,))
+            conn.executemany(
+                'INSERT INTO image_keywords (path, position, keyword) VALUES (?, ?, ?)',
+                [(path, position, keyword) for position, keyword in enumerate(keywords)]
+            )
+
+    def update_fingerprint(self, path, fingerprint):
+        """为旧记录补充变化指纹"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'UPDATE images SET mtime_ns = ?, inode = ? WHERE path = ?',
+                (fingerprint[1], fingerprint[2], path)
+            )
+
+    def update_phash(self, path, phash):
+        """为旧记录补充感知哈希"""
+        conn = self._connect()
+        with conn:
+            conn.execute('UPDATE images SET phash = ? WHERE path = ?', (phash, path))
+
+    def update_colors(self, path, feature_row, color):
+        """为旧记录补充颜色特征行号与主色调"""
+        conn = self._connect()
+        with conn:
+            conn.execute('UPDATE images SET feature_row = ?, color = ? WHERE path = ?', (feature_row, color, path))
+
+    def delete_image(self, path):
+        """删除一张图片的记录"""
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM images WHERE path = ?', (path,))
+
+    def clear(self):
+        """清空全部图片记录"""
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM image_keywords')
+            conn.execute('DELETE FROM images')
+
+    def get_meta(self, key, default=None):
+        """读取元信息"""
+        row = self._connect().execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row['value'] if row else default
+
+    def set_meta(self, key, value):
+        """写入元信息"""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                'INSERT INTO meta (key, value) VALUES (?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+                (key, value)
+            )
+
+    def migrate_from_json(self, json_file, describe):
+        """
+        从旧版 wallpaper_cache.json 一次性导入
+        describe(path) 返回 (category, type, keywords)，由调用方按路径解析
+        成功后记录迁移标记并尽量把旧文件重命名为 .migrated，返回导入条数
+        """
+        with open(json_file, 'r', encoding='utf-8') as f:
+            legacy = json.load(f)
+
+        rows = []
+        keyword_rows = []
+        for cache_key, cache_data in legacy.items():
+            path = normalize_path(cache_key)
+            data = cache_data['data']
+            category, image_type, keywords = describe(path)
+            rows.append((path, data['id'], cache_data['mtime'], data['tag'], category, image_type,
+                         data.get('width'), data.get('height'), data.get('size'), data.get('uploaded_at')))
+            keyword_rows.extend((path, position, keyword) for position, keyword in enumerate(keywords))
+
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO images (path, id, mtime, tag, category, type, width, height, size, uploaded_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                rows
+            )
+            conn.executemany(
+                'INSERT OR REPLACE INTO image_keywords (path, position, keyword) VALUES (?, ?, ?)',
+                keyword_rows
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_from', ?)",
+                (os.path.basename(json_file),)
+            )
+
+        try:
+            os.replace(json_file, json_file + '.migrated')
+        except OSError as e:
+            # 例如旧文件以单文件卷挂载进容器时无法重命名，依靠迁移标记避免重复导入
+            print(f"旧缓存文件重命名失败（已导入，不影响使用）: {e}")
+        return len(rows)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+感知哈希与近似重复检测
+dHash：缩小为 9x8 灰度图，比较每行相邻像素的明暗得到64位哈希，重新编码、缩放后的同一张图片哈希相同或只差几位；
+HammingIndex：多索引哈希，按汉明距离查找相似哈希，不需要两两比较
+"""
+
+from PIL import Image
+
+from color_features import load_sample
+
+HASH_BITS = 64
+
+# 无法得到可靠哈希的图片（纯色、对比度极低或无法解码）：数据库中存为空字符串，不参与重复检测
+NO_HASH = -1
+
+# 缩小后的灰度图最亮与最暗像素之差低于该值时视为纯色图（dHash 只剩噪声，不同纯色图会互相误判为重复）
+MIN_CONTRAST = 8
+
+
+def dhash(file_path, hash_size=8):
+    """
+    计算图片文件的 dHash（hash_size=8 时为64位整数），纯色或对比度极低的图片返回 NO_HASH
+    与扫描时一样从 load_sample 缩小解码的图计算，同一张图片在 rename.py 与图库中的哈希一致
+    """
+    return dhash_image(load_sample(file_path), hash_size)
+
+
+def dhash_image(img, hash_size=8):
+    """计算已打开（或已缩小）的图片的 dHash，扫描时与颜色特征共用同一次解码"""
+    small = img.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS, reducing_gap=2.0)
+    pixels = small.tobytes()
+    if max(pixels) - min(pixels) < MIN_CONTRAST:
+        return NO_HASH
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return value
+
+
+def hamming(a, b):
+    """两个哈希的汉明距离"""
+    return (a ^ b).bit_count()
+
+
+def to_hex(value):
+    """哈希 -> 16位十六进制字符串（数据库存储格式，SQLite 整数不支持无符号64位），NO_HASH 存为空字符串"""
+    return '' if value == NO_HASH else f'{value:016x}'
+
+
+def from_hex(text):
+    """十六进制字符串 -> 哈希；空字符串为 NO_HASH，NULL（尚未计算）返回None"""
+    if text is None:
+        return None
+    return int(text, 16) if text else NO_HASH
+
+
+class HammingIndex:
+    """
+    多索引哈希（Multi-Index Hashing）
+    把64位哈希切成 radius+1 段，每段各建一张 段值 -> 键 的表。
+    由抽屉原理，汉明距离不超过 radius 的两个哈希至少有一段完全相同，
+    所以查询只需检查与查询哈希某一段相同的候选，比较次数远小于图库规模
+    """
+
+    def __init__(self, radius=4, bits=HASH_BITS):
+        self.radius = radius
+        chunks = radius + 1
+        bounds = [bits * i // chunks for i in range(chunks + 1)]
+        # 每段的 (右移位数, 掩码)
+        self._segments = [(low, (1 << (high - low)) - 1) for low, high in zip(bounds, bounds[1:])]
+        self._tables = [{} for _ in self._segments]
+        self.hashes = {}
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def add(self, key, value):
+        """登记一个哈希（同一个键重复登记时先移除旧值）"""
+        if key in self.hashes:
+            self.remove(key)
+        self.hashes[key] = value
+        for table, (shift, mask) in zip(self._tables, self._segments):
+            table.setdefault((value >> shift) & mask, []).append(key)
+
+    def remove(self, key):
+        value = self.hashes.pop(key, None)
+        if value is None:
+            return
+        for table, (shift, mask) in zip(self._tables, self._segments):
+            segment = (value >> shift) & mask
+            bucket = table[segment]
+            bucket.remove(key)
+            if not bucket:
+                del table[segment]
+
+    def search(self, value, radius=None):
+        """查找汉明距离不超过 radius（不能超过建索引时的 radius）的键，返回 [(距离, 键), ...]，按距离升序"""
+        radius = self.radius if radius is None else min(radius, self.radius)
+        seen = set()
+        results = []
+        for table, (shift, mask) in zip(self._tables, self._segments):
+            for key in table.get((value >> shift) & mask, ()):
+                if key in seen:
+                    continue
+                seen.add(key)
+                distance = (self.hashes[key] ^ value).bit_count()
+                if distance <= radius:
+                    results.append((distance, key))
+        results.sort(key=lambda item: item[0])
+        return results
+
+    def groups(self):
+        """
+        近似重复分组：距离不超过 radius 的图片归为一组（传递闭包，用并查集合并），
+        只返回包含两个以上键的组
+        """
+        parent = {}
+
+        def find(key):
+            root = key
+            while parent.get(root, root) != root:
+                root = parent[root]
+            # 路径压缩
+            while parent.get(key, key) != root:
+                parent[key], key = root, parent[key]
+            return root
+
+        # 同一段值的桶内两两比较即可覆盖全部候选对（每对至少共享一个桶）
+        for table in self._tables:
+            for bucket in table.values():
+                if len(bucket) < 2:
+                    continue
+                for i, key in enumerate(bucket):
+                    value = self.hashes[key]
+                    for other in bucket[i + 1:]:
+                        if (value ^ self.hashes[other]).bit_count() <= self.radius:
+                            root, other_root = find(key), find(other)
+                            if root != other_root:
+                                parent[other_root] = root
+
+        # 被合并过的键都在 parent 中，根节点不在，分组时补上
+        groups = {}
+        for key in parent:
+            root = find(key)
+            groups.setdefault(root, [root]).append(key)
+        return list(groups.values())
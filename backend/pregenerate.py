@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+缩略图预生成
+用进程池提前生成缩略图和响应式尺寸变体，避免新分类首次浏览时在 Web 进程中集中解码大图；
+已生成的文件直接跳过，可以反复运行
+
+用法：
+  python pregenerate.py                    处理图库数据库中的全部图片
+  python pregenerate.py 路径 [路径 ...]     只处理指定的图片或目录（例如 rename.py 刚整理完的目录）
+  python pregenerate.py --paths-from 文件   只处理文件中列出的图片（每行一个，读取后删除该文件）
+
+  --workers N       进程数（默认CPU核数）
+  --formats 列表    变体格式，逗号分隔（默认 webp；可选 jpeg、webp、avif）
+  --no-variants     只生成缩略图
+  --quiet           不输出进度，只输出汇总
+  --nice N          降低进程优先级（后台自动运行时使用）
+  --ignore-limit    预计生成的文件超过缩略图缓存上限（THUMBNAIL_CACHE_MAX_MB）时仍然生成（默认停止）
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from config import config
+from file_hash import md5_file
+from image_probe import probe_dimensions
+from metadata_store import MetadataStore
+from thumbnail_store import ThumbnailStore, render_targets, variant_widths
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 后台自动运行的子进程（同一时间只运行一个）
+_background = None
+# 子进程运行期间新增或变化、尚未交给子进程处理的图片
+_pending_paths = set()
+
+
+# 估算生成文件大小用的每像素字节数（按编码格式，偏保守）与假定的宽高比
+ESTIMATED_BYTES_PER_PIXEL = {'JPEG': 0.6, 'WEBP': 0.35, 'AVIF': 0.25}
+ESTIMATED_ASPECT = 9 / 16
+
+
+def create_store():
+    """
+    与 app.py 使用相同参数的缩略图存储
+    只用于确定文件路径与编码参数：不扫描已有文件、不淘汰，容量上限由 Web 进程管理
+    """
+    return ThumbnailStore(
+        config.THUMBNAIL_DIR,
+        size=config.THUMBNAIL_SIZE,
+        quality=config.THUMBNAIL_QUALITY,
+        max_bytes=config.THUMBNAIL_CACHE_MAX_MB * 1024 * 1024,
+        variant_quality=config.RESIZED_QUALITY,
+        manage=False
+    )
+
+
+def iter_library():
+    """图库数据库中的全部图片：(原图路径, 图片ID, 宽度)"""
+    store = MetadataStore(config.CACHE_DB)
+    try:
+        for row, _ in store.iter_images():
+            yield os.path.join(config.IMAGE_BASE_DIR, row['path']), row['id'], row['width']
+    finally:
+        store.close()
+
+
+def iter_paths(paths):
+    """指定的图片或目录：并行计算MD5并读取宽度，返回 (原图路径, 图片ID, 宽度)"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names)
+                             if os.path.splitext(name)[1].lower() in config.ALLOWED_EXTENSIONS)
+        elif os.path.exists(path):
+            files.append(path)
+        else:
+            print(f"路径不存在：{path}")
+
+    def describe(file_path):
+        return file_path, md5_file(file_path), probe_dimensions(file_path)[0]
+
+    with ThreadPoolExecutor(max_workers=max(1, config.SCAN_WORKERS)) as pool:
+        yield from pool.map(describe, files)
+
+
+def plan_jobs(store, images, widths, formats):
+    """
+    找出缺少的缩略图/变体，返回 (任务列表, 已是最新的文件数)
+    每个任务对应一张原图：(原图路径, [(目标路径, 最大边长, 宽度, 编码参数), ...])
+    """
+    jobs, up_to_date = [], 0
+    for source_path, image_id, width in images:
+        wanted = [(None, 'jpeg')]
+        wanted += [(bucket, image_format) for bucket, _ in variant_widths(width, widths)
+                   for image_format in formats]
+        targets = []
+        for bucket, image_format in wanted:
+            path = store.path_for(image_id, bucket, image_format)
+            if os.path.exists(path):
+                up_to_date += 1
+            else:
+                targets.append((path, *store.render_options(bucket, image_format)))
+        if targets:
+            jobs.append((source_path, targets))
+    return jobs, up_to_date
+
+
+def estimate_bytes(jobs):
+    """粗略估算任务生成的文件总字节数（缩略图按最大边长、变体按宽度，宽高比按 ESTIMATED_ASPECT）"""
+    total = 0
+    for _, targets in jobs:
+        for _, max_size, width, save_options in targets:
+            edge = width or max_size
+            total += edge * edge * ESTIMATED_ASPECT * ESTIMATED_BYTES_PER_PIXEL.get(save_options['format'], 0.6)
+    return int(total)
+
+
+def _render_job(job):
+    """子进程：解码一次原图并生成全部缺少的文件，返回 (原图路径, 生成的文件, 错误信息)"""
+    source_path, targets = job
+    try:
+        render_targets(source_path, targets)
+    except Exception as e:
+        return source_path, [], str(e)
+    return source_path, [target[0] for target in targets], None
+
+
+def pregenerate(paths=None, workers=None, formats=('webp',), variants=True, quiet=False, ignore_limit=False):
+    """
+    生成缺少的缩略图与变体，返回统计信息
+    预计生成的文件超过缩略图缓存上限时不生成（生成后也会被 Web 进程的 LRU 淘汰、之后再次生成），
+    ignore_limit 为True时仍然生成
+    """
+    started = time.perf_counter()
+    store = create_store()
+    unsupported = [image_format for image_format in formats if image_format not in store.formats]
+    if unsupported:
+        print(f"当前环境不支持的格式将被跳过：{', '.join(unsupported)}")
+    formats = [image_format for image_format in formats if image_format in store.formats]
+    widths = config.RESIZED_WIDTHS if variants else []
+
+    images = iter_paths(paths) if paths else iter_library()
+    jobs, up_to_date = plan_jobs(store, images, widths, formats)
+    total_files = sum(len(targets) for _, targets in jobs)
+    if not quiet:
+        print(f"待生成 {total_files} 个文件（{len(jobs)} 张图片），已是最新 {up_to_date} 个")
+
+    stats = {'images': 0, 'files': 0, 'bytes': 0, 'failed': 0, 'up_to_date': up_to_date}
+    planned = estimate_bytes(jobs)
+    if planned > store.max_bytes and not ignore_limit:
+        print(f"预计生成约 {planned / 1024 / 1024:.0f} MB，超过缩略图缓存上限 THUMBNAIL_CACHE_MAX_MB"
+              f"（{store.max_bytes / 1024 / 1024:.0f} MB），生成后会被陆续淘汰，已停止。"
+              f"请调大上限、减少格式（--formats）或只生成缩略图（--no-variants），或使用 --ignore-limit")
+        stats['elapsed'] = time.perf_counter() - started
+        stats['over_limit'] = planned
+        return stats
+    if jobs:
+        workers = workers or os.cpu_count() or 1
+        last_report = 0.0
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            for source_path, rendered, error in pool.map(_render_job, jobs, chunksize=4):
+                stats['images'] += 1
+                if error:
+                    stats['failed'] += 1
+                    print(f"\n生成失败：{source_path}：{error}")
+                # 不在这里登记或淘汰：Web 进程访问时会登记这些文件，并按全局LRU统一淘汰
+                for path in rendered:
+                    stats['files'] += 1
+                    stats['bytes'] += os.path.getsize(path)
+
+                now = time.perf_counter()
+                if not quiet and (now - last_report >= 1.0 or stats['images'] == len(jobs)):
+                    last_report = now
+                    elapsed = now - started
+                    print(f"\r[{stats['images']}/{len(jobs)}] {stats['images'] / elapsed:.1f} 张/秒，"
+                          f"已生成 {stats['files']} 个文件", end='', flush=True)
+        if not quiet:
+            print()
+
+    stats['elapsed'] = time.perf_counter() - started
+    print(f"预生成完成：{stats['images']} 张图片，生成 {stats['files']} 个文件"
+          f"（{stats['bytes'] / 1024 / 1024:.1f} MB），跳过 {up_to_date} 个，失败 {stats['failed']} 张，"
+          f"耗时 {stats['elapsed']:.1f} 秒（{stats['images'] / stats['elapsed']:.1f} 张/秒）")
+    return stats
+
+
+def spawn_background(paths=()):
+    """
+    在后台子进程中以较低优先级为新增或变化的图片运行预生成（索引扫描后调用）
+    只处理传入的图片，不重新规划整个图库；上一次运行尚未结束时先记下这些图片，
+    之后的调用中一并处理。返回是否已启动
+    """
+    global _background
+    _pending_paths.update(os.path.abspath(path) for path in paths)
+    if not _pending_paths or (_background is not None and _background.poll() is None):
+        return False
+    # 路径可能很多（例如首次扫描），通过文件传给子进程，避免超出命令行长度限制
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', prefix='pregenerate-', suffix='.txt',
+                                     delete=False) as f:
+        f.write('\n'.join(sorted(_pending_paths)))
+    _pending_paths.clear()
+    command = [sys.executable, os.path.join(BACKEND_DIR, 'pregenerate.py'), '--quiet', '--nice', '10',
+               '--paths-from', f.name]
+    _background = subprocess.Popen(command, cwd=BACKEND_DIR)
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='预生成缩略图与响应式尺寸变体')
+    parser.add_argument('paths', nargs='*', help='要处理的图片或目录（默认处理图库数据库中的全部图片）')
+    parser.add_argument('--workers', type=int, default=None, help='进程数（默认CPU核数）')
+    parser.add_argument('--formats', default='webp', help='变体格式，逗号分隔（jpeg、webp、avif）')
+    parser.add_argument('--no-variants', action='store_true', help='只生成缩略图')
+    parser.add_argument('--quiet', action='store_true', help='不输出进度')
+    parser.add_argument('--nice', type=int, default=0, help='降低进程优先级')
+    parser.add_argument('--paths-from', help='从文件读取要处理的图片（每行一个，读取后删除该文件）')
+    parser.add_argument('--ignore-limit', action='store_true', help='预计生成的文件超过缩略图缓存上限时仍然生成')
+    args = parser.parse_args()
+
+    paths = list(args.paths)
+    if args.paths_from:
+        with open(args.paths_from, encoding='utf-8') as f:
+            paths.extend(line for line in f.read().splitlines() if line)
+        os.remove(args.paths_from)
+        if not paths:
+            return
+
+    if args.nice and hasattr(os, 'nice'):
+        os.nice(args.nice)
+    formats = [item.strip() for item in args.formats.split(',') if item.strip()]
+    pregenerate(paths, args.workers, formats, not args.no_variants, args.quiet, args.ignore_limit)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,138 +1,254 @@
 import os
+import io
 import json
+import time
 import base64
 import shutil
-import requests
+import atexit
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
 from PIL import Image, ImageOps
 from typing import Dict, Optional, List
 
 # 导入配置
 from config import config
+from api_client import ApiClient
+from analysis_cache import AnalysisCache
+from file_hash import md5_file
+from rename_journal import RenameJournal, DEFAULT_JOURNAL, import_json
+from pregenerate import pregenerate
+from metadata_store import MetadataStore
+from perceptual_hash import NO_HASH, HammingIndex, dhash, from_hex
 
 # 配置API密钥和端点
 API_KEY = config.ZHIPU_API_KEY  # 智谱API密钥
 API_ENDPOINT = config.ZHIPU_API_ENDPOINT  # 智谱AI的API端点
+MODEL = "glm-4.5v"  # 使用GLM-4.5V模型
+
+# 共享的API客户端（首次使用时创建）
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> ApiClient:
+    """获取共享的API客户端（连接池在所有API线程间复用）"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ApiClient(
+                    API_KEY,
+                    connect_timeout=config.RENAME_CONNECT_TIMEOUT,
+                    read_timeout=config.RENAME_READ_TIMEOUT,
+                    max_retries=config.RENAME_MAX_RETRIES,
+                    pool_size=max(10, config.RENAME_API_CONCURRENCY)
+                )
+    return _client
+
+# 按图片内容MD5缓存的分析结果（首次使用时打开）
+_analysis_cache = None
+
+def get_analysis_cache() -> AnalysisCache:
+    """获取分析结果缓存"""
+    global _analysis_cache
+    if _analysis_cache is None:
+        with _client_lock:
+            if _analysis_cache is None:
+                _analysis_cache = AnalysisCache(config.ANALYSIS_CACHE_DB)
+    return _analysis_cache
+
+# 近似重复预检查：图库中已有图片（及本次运行中检查过的图片）的感知哈希索引，首次使用时从图库数据库加载
+_duplicate_index = None
+
+def get_duplicate_index() -> HammingIndex:
+    """获取感知哈希索引，键为图片的真实路径"""
+    global _duplicate_index
+    if _duplicate_index is None:
+        with _client_lock:
+            if _duplicate_index is None:
+                index = HammingIndex(config.DUPLICATE_RADIUS)
+                if os.path.exists(config.CACHE_DB):
+                    store = MetadataStore(config.CACHE_DB)
+                    try:
+                        for row, _ in store.iter_images():
+                            if row['phash']:
+                                path = os.path.join(config.IMAGE_BASE_DIR, row['path'])
+                                index.add(os.path.realpath(path), from_hex(row['phash']))
+                    finally:
+                        store.close()
+                _duplicate_index = index
+    return _duplicate_index
+
+def find_near_duplicate(image_path: str):
+    """
+    查找与图片近似重复（感知哈希的汉明距离不超过 DUPLICATE_RADIUS）的已有图片，
+    返回 (距离, 已有图片路径)，没有时返回None
+    不重复的图片加入索引，同一次运行中后出现的重复图片也会被跳过
+    """
+    real_path = os.path.realpath(image_path)
+    try:
+        phash = dhash(image_path)
+    except Exception:
+        return None
+    if phash == NO_HASH:
+        return None
+    index = get_duplicate_index()
+    for distance, other in index.search(phash):
+        if other != real_path:
+            return distance, other
+    index.add(real_path, phash)
+    return None
+
+def report_duplicate(image_path: str) -> bool:
+    """近似重复时输出提示并返回True"""
+    duplicate = find_near_duplicate(image_path)
+    if duplicate is None:
+        return False
+    distance, other = duplicate
+    print(f"近似重复，跳过：{os.path.basename(image_path)}（与 {other} 相似，距离 {distance}）")
+    return True
+
+def _move_duplicate_key(image_path: str, target_path: str):
+    """图片被重命名、移动后更新感知哈希索引中的路径"""
+    if _duplicate_index is None:
+        return
+    real_path = os.path.realpath(image_path)
+    phash = _duplicate_index.hashes.get(real_path)
+    if phash is not None:
+        _duplicate_index.remove(real_path)
+        _duplicate_index.add(os.path.realpath(target_path), phash)
+
+def print_cache_stats():
+    """输出分析结果缓存的命中统计"""
+    if _analysis_cache is None:
+        return
+    stats = _analysis_cache.stats()
+    if stats['hits'] or stats['misses']:
+        print(f"分析缓存：命中 {stats['hits']}，未命中 {stats['misses']}，"
+              f"命中率 {stats['hit_rate']:.0%}，共缓存 {stats['entries']} 条")
+
+def reset_batch_stats():
+    """批量处理开始前清空缓存命中与API请求统计，结束时输出的是本批次的数据"""
+    get_analysis_cache().reset_stats()
+    if _client is not None:
+        _client.reset_stats()
+
+def print_api_stats():
+    """输出API请求统计（耗时分位数、重试分布），用于根据服务商配额调整并发与速率"""
+    if _client is None:
+        return
+    stats = _client.stats()
+    latency = stats.get('latency', {})
+    print(f"API统计：调用 {stats['calls']} 次，实际请求 {stats['attempts']} 次，成功 {stats['succeeded']}，"
+          f"失败 {stats['failed']}，重试 {stats['retries']} 次，熔断拒绝 {stats['rejected']} 次")
+    if latency:
+        print(f"API耗时：平均 {latency['avg']}s，P50 {latency['p50']}s，P95 {latency['p95']}s，最大 {latency['max']}s；"
+              f"重试分布 {stats['retry_histogram']}")
+
+# JPEG在75质量下每像素字节数的保守上限，用于编码前一次性选定质量
+JPEG_BYTES_PER_PIXEL_Q75 = 1.0
+
+# 每个线程（压缩进程池中即每个进程）复用的编码缓冲区
+_encode_buffers = threading.local()
+
+def _encode_buffer() -> io.BytesIO:
+    """获取当前线程复用的编码缓冲区（清空后返回）"""
+    buffer = getattr(_encode_buffers, 'buffer', None)
+    if buffer is None:
+        buffer = _encode_buffers.buffer = io.BytesIO()
+    buffer.seek(0)
+    buffer.truncate()
+    return buffer
 
 def compress_image(image_path: str, max_size_mb: float = 2.0, target_width: int = 800) -> bytes:
     """压缩图片以减少带宽占用"""
+    max_bytes = max_size_mb * 1024 * 1024
     with Image.open(image_path) as img:
         # 检查文件大小
-        file_size = os.path.getsize(image_path) / (1024 * 1024)  # MB
+        file_size = os.path.getsize(image_path)
         
         # 如果文件小于阈值且尺寸合适，直接返回原图数据
-        if file_size <= max_size_mb and img.width <= target_width:
+        if file_size <= max_bytes and img.width <= target_width:
             with open(image_path, 'rb') as f:
                 return f.read()
         
         # 保持宽高比缩放
-        if img.width > target_width:
-            ratio = target_width / img.width
-            new_width = target_width
-            new_height = int(img.height * ratio)
-            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        new_width = min(img.width, target_width)
+        new_height = max(1, int(img.height * new_width / img.width))
+        if img.format == 'JPEG':
+            # JPEG按 1/2、1/4、1/8 比例直接解码到接近目标尺寸，4K/8K原图不必完整解码
+            img.draft('RGB', (new_width, new_height))
+        if img.size != (new_width, new_height):
+            # reducing_gap：先用整数倍快速缩小，再对小图做LANCZOS，效果与直接LANCZOS几乎相同
+            img = img.resize((new_width, new_height), Image.Resampling.LANCZOS, reducing_gap=3.0)
         
         # 转换为RGB模式（处理RGBA等格式）
         if img.mode not in ('RGB', 'L'):
-            if img.mode == 'RGBA':
+            if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
                 # 创建白色背景
+                img = img.convert('RGBA')
                 background = Image.new('RGB', img.size, (255, 255, 255))
                 background.paste(img, mask=img.split()[-1])
                 img = background
             else:
                 img = img.convert('RGB')
         
-        # 压缩图片
-        import io
-        output = io.BytesIO()
-        
-        # 根据原格式选择压缩参数
-        if image_path.lower().endswith(('.jpg', '.jpeg')):
-            img.save(output, format='JPEG', quality=75, optimize=True)
-        elif image_path.lower().endswith('.png'):
-            # PNG转JPEG
-            img.save(output, format='JPEG', quality=75, optimize=True)
-        else:
-            img.save(output, format='JPEG', quality=75, optimize=True)
-        
-        compressed_data = output.getvalue()
-        
-        # 如果压缩后 still 太大，进一步降低质量
-        if len(compressed_data) > max_size_mb * 1024 * 1024:
-            output = io.BytesIO()
-            img.save(output, format='JPEG', quality=60, optimize=True)
-            compressed_data = output.getvalue()
-        
-        return compressed_data
+        # 按像素数预估体积，一次选定质量，不再先编码再判断是否需要降低质量
+        quality = 75 if img.width * img.height * JPEG_BYTES_PER_PIXEL_Q75 <= max_bytes else 60
+        output = _encode_buffer()
+        img.save(output, format='JPEG', quality=quality, optimize=True)
+        return output.getvalue()
 
-def encode_image(image_path: str) -> str:
+def encode_image(image_path: str, target_width: int = 800) -> str:
     """将图片文件编码为base64字符串（支持压缩）"""
     # 压缩图片
-    compressed_data = compress_image(image_path)
+    compressed_data = compress_image(image_path, target_width=target_width)
     # 编码为base64
     return base64.b64encode(compressed_data).decode('utf-8')
 
-def analyze_image(image_path: str) -> Dict:
-    """调用智谱GLM-4.5V模型API分析图片"""
-    # 检查图片格式
+def check_image_format(image_path: str):
+    """检查图片格式是否支持分析"""
     if not (image_path.lower().endswith('.jpg') or 
             image_path.lower().endswith('.jpeg') or 
             image_path.lower().endswith('.png')):
         raise ValueError("不支持的图片格式，请使用JPG或PNG格式的图片")
+
+def analyze_image(image_path: str) -> Dict:
+    """调用智谱GLM-4.5V模型API分析图片"""
+    # 检查图片格式
+    check_image_format(image_path)
     
     # 编码图片
     base64_image = encode_image(image_path)
-    
-    # 构建请求头
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {API_KEY}"
-    }
-    
-    # 构建prompt，告诉模型我们需要什么样的分析结果
-    prompt = """
-    请分析这张图片，并严格按照以下JSON格式返回结果：
-    {
-        "type": "图片类型（必须是以下之一：风光、美女、动漫、汽车、城市）",
-        "keywords": ["关键词1", "关键词2", "关键词3", "关键词4", "关键词5", "关键词6"]
+    return request_analysis(base64_image)
+
+VALID_TYPES = ["风光", "美女", "动漫", "汽车", "城市"]
+
+def _image_part(base64_image: str) -> Dict:
+    return {
+        "type": "image_url",
+        "image_url": {
+            "url": f"data:image/jpeg;base64,{base64_image}"
+        }
     }
-    
-    注意：
-    1. 图片类型必须是"风光"、"美女"、"动漫"、"汽车"、"城市"之一
-    2. 关键词应该是描述这张图片的标签词语，比如"黄昏"、"山脉"、"雾气"等
-    3. 关键词中不能包含图片类型名称本身（例如如果类型是"动漫"，关键词中就不能出现"动漫"）
-    4. 只返回JSON格式的结果，不要包含其他解释或说明
-    """
-    
+
+def _chat_completion(content_parts: List[Dict], max_tokens: int) -> str:
+    """发送一次对话请求，返回模型回复的文本内容"""
     # 构建请求体
     payload = {
-        "model": "glm-4.5v",  # 使用GLM-4.5V模型
+        "model": MODEL,
         "messages": [
             {
                 "role": "user",
-                "content": [
-                    {
-                        "type": "text",
-                        "text": prompt
-                    },
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}"
-                        }
-                    }
-                ]
+                "content": content_parts
             }
         ],
         "temperature": 0.2,  # 降低温度以获得更确定的结果
-        "max_tokens": 500
+        "max_tokens": max_tokens
     }
     
-    # 发送请求
-    try:
-        response = requests.post(API_ENDPOINT, headers=headers, json=payload)
-        response.raise_for_status()  # 如果请求失败，抛出HTTPError异常
-    except requests.exceptions.RequestException as e:
-        raise Exception(f"API请求失败：{e}")
+    # 发送请求（连接复用、超时与失败重试由 ApiClient 处理，失败时抛出 ApiError）
+    response = get_client().post_json(API_ENDPOINT, payload)
     
     # 解析响应
     try:
@@ -148,35 +264,53 @@ def analyze_image(image_path: str) -> Dict:
         raise Exception("API响应格式不正确")
     
     # 提取模型返回的内容
-    content = result["choices"][0]["message"]["content"]
-    
-    # 尝试解析JSON
+    return result["choices"][0]["message"]["content"]
+
+def _extract_json(content: str, open_char: str, close_char: str):
+    """解析模型回复中的JSON（回复中夹带说明文字时截取第一个开括号到最后一个闭括号之间的部分）"""
     try:
         # 尝试直接解析整个内容为JSON
-        analysis = json.loads(content)
+        return json.loads(content)
     except json.JSONDecodeError:
-        # 如果直接解析失败，尝试提取JSON部分
-        try:
-            # 查找JSON开始和结束的位置
-            start_idx = content.find('{')
-            end_idx = content.rfind('}') + 1
-            if start_idx != -1 and end_idx != -1:
-                json_str = content[start_idx:end_idx]
-                analysis = json.loads(json_str)
-            else:
-                raise Exception("无法从响应中提取JSON")
-        except Exception as e:
-            raise Exception(f"模型返回的格式不正确，无法解析为JSON：{content}")
+        pass
+    # 如果直接解析失败，尝试提取JSON部分
+    start_idx = content.find(open_char)
+    end_idx = content.rfind(close_char) + 1
+    if start_idx == -1 or end_idx <= start_idx:
+        raise Exception(f"模型返回的格式不正确，无法解析为JSON：{content}")
+    try:
+        return json.loads(content[start_idx:end_idx])
+    except json.JSONDecodeError:
+        raise Exception(f"模型返回的格式不正确，无法解析为JSON：{content}")
+
+def request_analysis(base64_image: str) -> Dict:
+    """把已编码的图片发送给模型并解析分析结果"""
+    # 构建prompt，告诉模型我们需要什么样的分析结果
+    prompt = """
+    请分析这张图片，并严格按照以下JSON格式返回结果：
+    {
+        "type": "图片类型（必须是以下之一：风光、美女、动漫、汽车、城市）",
+        "keywords": ["关键词1", "关键词2", "关键词3", "关键词4", "关键词5", "关键词6"]
+    }
+    
+    注意：
+    1. 图片类型必须是"风光"、"美女"、"动漫"、"汽车"、"城市"之一
+    2. 关键词应该是描述这张图片的标签词语，比如"黄昏"、"山脉"、"雾气"等
+    3. 关键词中不能包含图片类型名称本身（例如如果类型是"动漫"，关键词中就不能出现"动漫"）
+    4. 只返回JSON格式的结果，不要包含其他解释或说明
+    """
+    
+    content = _chat_completion([{"type": "text", "text": prompt}, _image_part(base64_image)], 500)
+    analysis = _extract_json(content, '{', '}')
     
     # 检查解析结果是否包含所需的字段
-    if "type" not in analysis or "keywords" not in analysis:
+    if not isinstance(analysis, dict) or "type" not in analysis or "keywords" not in analysis:
         raise Exception("模型返回的结果不包含所需的字段")
     
     # 验证图片类型是否合法
-    valid_types = ["风光", "美女", "动漫", "汽车", "城市"]
-    if analysis["type"] not in valid_types:
+    if analysis["type"] not in VALID_TYPES:
         # 如果类型不合法，尝试从内容中推断
-        for valid_type in valid_types:
+        for valid_type in VALID_TYPES:
             if valid_type in content:
                 analysis["type"] = valid_type
                 break
@@ -189,6 +323,58 @@ def analyze_image(image_path: str) -> Dict:
     
     return analysis
 
+def _validate_batch_item(item) -> Optional[Dict]:
+    """校验批量结果中的一项，合法时返回 {'type', 'keywords'}，否则返回None（该图片改为单独请求）"""
+    if not isinstance(item, dict) or item.get("type") not in VALID_TYPES:
+        return None
+    keywords = item.get("keywords")
+    if not isinstance(keywords, list) or not keywords or not all(isinstance(k, str) and k for k in keywords):
+        return None
+    keywords = [keyword for keyword in keywords if keyword != item["type"]][:6]
+    # 确保至少有六个关键词
+    while len(keywords) < 6:
+        keywords.append("未知")
+    return {"type": item["type"], "keywords": keywords}
+
+def request_batch_analysis(base64_images: List[str]) -> List[Optional[Dict]]:
+    """
+    把多张图片放在同一个请求中分析，按顺序返回每张图片的结果
+    模型漏掉、序号错乱或格式不合法的图片对应位置为None，由调用方单独重试
+    """
+    count = len(base64_images)
+    prompt = f"""
+    下面依次给出 {count} 张图片，分别标记为"图片1"到"图片{count}"。请逐张分析，并严格按照以下JSON数组格式返回结果：
+    [
+        {{"index": 1, "type": "图片类型（必须是以下之一：风光、美女、动漫、汽车、城市）", "keywords": ["关键词1", "关键词2", "关键词3", "关键词4", "关键词5", "关键词6"]}},
+        ...
+    ]
+    
+    注意：
+    1. 数组中必须有 {count} 项，index 为图片序号（1到{count}），每张图片一项
+    2. 图片类型必须是"风光"、"美女"、"动漫"、"汽车"、"城市"之一
+    3. 关键词应该是描述这张图片的标签词语，比如"黄昏"、"山脉"、"雾气"等
+    4. 关键词中不能包含图片类型名称本身（例如如果类型是"动漫"，关键词中就不能出现"动漫"）
+    5. 只返回JSON数组，不要包含其他解释或说明
+    """
+    
+    content_parts = [{"type": "text", "text": prompt}]
+    for index, base64_image in enumerate(base64_images, 1):
+        content_parts.append({"type": "text", "text": f"图片{index}"})
+        content_parts.append(_image_part(base64_image))
+    
+    content = _chat_completion(content_parts, 150 * count + 100)
+    items = _extract_json(content, '[', ']')
+    if not isinstance(items, list):
+        raise Exception(f"模型返回的不是JSON数组：{content}")
+    
+    results = [None] * count
+    for item in items:
+        index = item.get("index") if isinstance(item, dict) else None
+        if not isinstance(index, int) or not 1 <= index <= count or results[index - 1] is not None:
+            continue
+        results[index - 1] = _validate_batch_item(item)
+    return results
+
 def generate_new_name(analysis: Dict) -> str:
     """根据分析结果生成新的文件名"""
     image_type = analysis.get("type", "风光")
@@ -202,68 +388,100 @@ def generate_new_name(analysis: Dict) -> str:
     
     return new_name
 
-def save_rename_result(original_name: str, new_name: str, output_file: str = "rename.json"):
-    """将重命名结果保存到JSON文件中"""
-    result = {
-        "原名": original_name,
-        "重命名": new_name
-    }
-    
-    # 如果文件已存在，读取现有内容
-    existing_results = []
-    if os.path.exists(output_file):
-        with open(output_file, "r", encoding="utf-8") as f:
-            try:
-                existing_results = json.load(f)
-                if not isinstance(existing_results, list):
-                    existing_results = [existing_results]
-            except json.JSONDecodeError:
-                existing_results = []
-    
-    # 添加新结果
-    existing_results.append(result)
-    
-    # 写入文件
-    with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(existing_results, f, ensure_ascii=False, indent=2)
+# 已打开的重命名日志（日志路径 -> RenameJournal）
+_journals = {}
+
+# 本次运行中重命名并移动后的图片路径（供 --pregenerate 生成缩略图）
+_committed_paths = []
+
+def get_journal(output_file: str = DEFAULT_JOURNAL) -> RenameJournal:
+    """获取重命名日志；首次使用时自动导入同名的旧版 rename.json"""
+    with _client_lock:
+        journal = _journals.get(output_file)
+        if journal is None:
+            legacy_file = output_file[:-1] if output_file.endswith('.jsonl') else None
+            if legacy_file and not os.path.exists(output_file) and os.path.exists(legacy_file):
+                count = import_json(legacy_file, output_file)
+                print(f"已从 {legacy_file} 导入 {count} 条重命名记录到 {output_file}")
+            journal = _journals[output_file] = RenameJournal(
+                output_file,
+                fsync_every=config.RENAME_JOURNAL_FSYNC_EVERY
+            )
+        return journal
 
-def process_image(image_path: str, output_file: str = "rename.json") -> Optional[str]:
-    """处理单个图片文件"""
+def close_journals():
+    """把日志中尚未落盘的记录写入磁盘并关闭"""
+    with _client_lock:
+        for journal in _journals.values():
+            journal.close()
+        _journals.clear()
+
+# 作为模块被其他脚本调用时，退出前同样保证日志落盘
+atexit.register(close_journals)
+
+def save_rename_result(original_name: str, new_name: str, output_file: str = DEFAULT_JOURNAL,
+                       md5: Optional[str] = None, target_path: Optional[str] = None):
+    """将重命名结果追加到日志中"""
+    get_journal(output_file).append(original_name, new_name, md5, target_path)
+
+def process_image(image_path: str, output_file: str = DEFAULT_JOURNAL, force: bool = False,
+                  resume: bool = True, skip_duplicates: bool = False) -> Optional[str]:
+    """
+    处理单个图片文件
+    force为True时忽略缓存重新分析；resume为True时跳过日志中已提交过的图片（按内容MD5）；
+    skip_duplicates为True时跳过与图库中已有图片近似重复的图片
+    """
     try:
-        # 分析图片
-        analysis = analyze_image(image_path)
-        
-        # 生成新文件名
-        new_name = generate_new_name(analysis)
-        
-        # 获取原文件名（不含路径）
-        original_name = os.path.basename(image_path)
-        
-        # 获取文件扩展名
-        file_ext = os.path.splitext(image_path)[1]
-        
-        # 构建新的文件路径
-        new_file_path = os.path.join(os.path.dirname(image_path), new_name + file_ext)
-        
-        # 实际重命名文件
-        os.rename(image_path, new_file_path)
-        
-        # 按文件名类型移动到对应文件夹
-        move_to_category_folder(new_file_path, new_name, file_ext)
-        
-        # 保存重命名结果
-        save_rename_result(original_name, new_name + file_ext, output_file)
-        
-        print(f"图片处理完成：{original_name} -> {new_name}{file_ext}")
-        
-        return new_name + file_ext
+        md5 = md5_file(image_path)
+        if resume and get_journal(output_file).is_committed(md5):
+            print(f"已处理过，跳过：{os.path.basename(image_path)}")
+            return None
+        if skip_duplicates and report_duplicate(image_path):
+            return None
+        # 相同内容的图片直接使用缓存的分析结果
+        analysis = None if force else get_analysis_cache().get(md5)
+        if analysis is None:
+            # 分析图片
+            analysis = analyze_image(image_path)
+            get_analysis_cache().put(md5, analysis, MODEL)
+        return commit_rename(image_path, analysis, output_file, md5)
     
     except Exception as e:
         print(f"处理图片时出错：{e}")
         return None
 
-def move_to_category_folder(file_path: str, new_name: str, file_ext: str):
-    """根据文件名类型将图片移动到对应的分类文件夹"""
+def commit_rename(image_path: str, analysis: Dict, output_file: str = DEFAULT_JOURNAL,
+                  md5: Optional[str] = None) -> str:
+    """根据分析结果重命名、移动文件并记录结果，返回新文件名"""
+    # 生成新文件名
+    new_name = generate_new_name(analysis)
+    
+    # 获取原文件名（不含路径）
+    original_name = os.path.basename(image_path)
+    
+    # 获取文件扩展名
+    file_ext = os.path.splitext(image_path)[1]
+    
+    # 构建新的文件路径
+    new_file_path = os.path.join(os.path.dirname(image_path), new_name + file_ext)
+    
+    # 实际重命名文件
+    os.rename(image_path, new_file_path)
+    
+    # 按文件名类型移动到对应文件夹（失败时文件保留在原目录）
+    target_path = move_to_category_folder(new_file_path, new_name, file_ext) or new_file_path
+    _committed_paths.append(target_path)
+    _move_duplicate_key(image_path, target_path)
+    
+    # 保存重命名结果
+    save_rename_result(original_name, new_name + file_ext, output_file, md5, target_path)
+    
+    print(f"图片处理完成：{original_name} -> {new_name}{file_ext}")
+    
+    return new_name + file_ext
+
+def move_to_category_folder(file_path: str, new_name: str, file_ext: str) -> Optional[str]:
+    """根据文件名类型将图片移动到对应的分类文件夹，返回移动后的路径（失败时返回None）"""
     try:
         # 提取文件类型（文件名的第一个部分）
         file_type = new_name.split('_')[0]
@@ -282,12 +500,193 @@ def move_to_category_folder(file_path: str, new_name: str, file_ext: str):
         shutil.move(file_path, target_file_path)
         
         print(f"图片已移动到分类文件夹：{file_type}/")
+        return target_file_path
         
     except Exception as e:
         print(f"移动文件到分类文件夹时出错：{e}")
 
-def process_directory(directory: str, output_file: str = "rename.json"):
-    """处理目录中的所有图片文件"""
+class RateLimiter:
+    """简单的速率限制器：保证相邻两次请求的发起间隔不小于 1/rate 秒（线程安全）"""
+    
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate and rate > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+    
+    def acquire(self):
+        """阻塞到允许发起下一次请求"""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait_for = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if wait_for > 0:
+            time.sleep(wait_for)
+
+def _analyze_prepared(prepared_list: List, limiter: RateLimiter):
+    """
+    API线程：等待一组图片的压缩结果并发起请求
+    多张图片时先合并为一个请求；整个请求失败或个别图片的结果不合法时，这些图片再逐张单独请求
+    返回 (与输入顺序一致的结果列表（分析结果或异常）, 单独重试的图片数)
+    """
+    results = [None] * len(prepared_list)
+    images = []
+    for position, prepared in enumerate(prepared_list):
+        try:
+            images.append((position, prepared.result()))
+        except Exception as e:
+            results[position] = e
+    
+    retry = images
+    if len(images) > 1:
+        limiter.acquire()
+        try:
+            batch_results = request_batch_analysis([base64_image for _, base64_image in images])
+        except Exception as e:
+            print(f"批量请求失败，改为逐张请求：{e}")
+            batch_results = [None] * len(images)
+        retry = []
+        for (position, base64_image), analysis in zip(images, batch_results):
+            if analysis is None:
+                retry.append((position, base64_image))
+            else:
+                results[position] = analysis
+    
+    for position, base64_image in retry:
+        limiter.acquire()
+        try:
+            results[position] = request_analysis(base64_image)
+        except Exception as e:
+            results[position] = e
+    return results, (len(retry) if len(images) > 1 else 0)
+
+def process_batch(image_paths: List[str], output_file: str = DEFAULT_JOURNAL,
+                  compress_workers: Optional[int] = None,
+                  api_concurrency: int = config.RENAME_API_CONCURRENCY,
+                  rate_limit: float = config.RENAME_RATE_LIMIT,
+                  force: bool = False, resume: bool = True,
+                  batch_size: int = config.RENAME_BATCH_SIZE,
+                  skip_duplicates: bool = False) -> Dict:
+    """
+    流水线批量处理图片
+    0. 计算内容MD5：日志中已提交过的图片跳过（resume为False时不跳过），
+       skip_duplicates为True时跳过与图库中已有图片近似重复的图片（感知哈希），
+       缓存中已有分析结果的图片直接提交，不再压缩和调用API（force为True时忽略缓存）
+    1. 进程池压缩、编码图片（CPU密集）
+    2. 线程池并发调用API（最多 api_concurrency 个请求同时进行，每秒最多 rate_limit 个，0为不限）；
+       batch_size 大于1时每 batch_size 张缩小后的图片合并为一个请求
+    3. 主线程按完成顺序逐个重命名、移动并记录结果（文件操作串行，不会互相冲突）
+    返回处理统计
+    """
+    started = time.time()
+    reset_batch_stats()
+    stats = {'total': len(image_paths), 'succeeded': 0, 'failed': 0, 'skipped': 0, 'retried': 0,
+             'duplicates': 0}
+    limiter = RateLimiter(rate_limit)
+    cache = get_analysis_cache()
+    journal = get_journal(output_file)
+    batch_size = max(1, batch_size)
+    # 合并请求时图片再缩小一些，控制单个请求的体积和图片token数
+    target_width = config.RENAME_BATCH_IMAGE_WIDTH if batch_size > 1 else 800
+    # 同时在途（压缩中或请求中）的图片数上限，避免一次性把所有压缩结果堆在内存里
+    window = max(1, api_concurrency) * batch_size * 2
+    
+    def commit(image_path, analysis, md5):
+        try:
+            commit_rename(image_path, analysis, output_file, md5)
+            stats['succeeded'] += 1
+        except Exception as e:
+            stats['failed'] += 1
+            print(f"处理图片时出错：{os.path.basename(image_path)}: {e}")
+    
+    def submit_group():
+        future = api_pool.submit(_analyze_prepared, [prepared for _, prepared in group], limiter)
+        pending[future] = [md5 for md5, _ in group]
+        group.clear()
+    
+    def finish(future):
+        md5s = pending.pop(future)
+        try:
+            results, retried = future.result()
+        except Exception as e:
+            results, retried = [e] * len(md5s), 0
+        stats['retried'] += retried
+        for md5, result in zip(md5s, results):
+            # 同一批次中内容相同的图片共用一次分析
+            image_paths_for_hash = waiting.pop(md5)
+            if isinstance(result, Exception):
+                stats['failed'] += len(image_paths_for_hash)
+                for image_path in image_paths_for_hash:
+                    print(f"处理图片时出错：{os.path.basename(image_path)}: {result}")
+                continue
+            cache.put(md5, result, MODEL)
+            for image_path in image_paths_for_hash:
+                commit(image_path, result, md5)
+    
+    with ProcessPoolExecutor(max_workers=compress_workers) as compress_pool, \
+            ThreadPoolExecutor(max_workers=max(1, api_concurrency)) as api_pool:
+        # API请求 -> 该请求中各图片的MD5；MD5 -> 等待该结果的图片路径列表；尚未凑满一组的 (MD5, 压缩任务)
+        pending = {}
+        waiting = {}
+        group = []
+        for image_path in image_paths:
+            while sum(map(len, pending.values())) >= window:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(future)
+            try:
+                check_image_format(image_path)
+                md5 = md5_file(image_path)
+            except (ValueError, OSError) as e:
+                stats['failed'] += 1
+                print(f"处理图片时出错：{e}")
+                continue
+            
+            if resume and journal.is_committed(md5):
+                stats['skipped'] += 1
+                print(f"已处理过，跳过：{os.path.basename(image_path)}")
+                continue
+            if skip_duplicates and report_duplicate(image_path):
+                stats['duplicates'] += 1
+                continue
+            if md5 in waiting:
+                waiting[md5].append(image_path)
+                continue
+            analysis = None if force else cache.get(md5)
+            if analysis is not None:
+                commit(image_path, analysis, md5)
+                continue
+            waiting[md5] = [image_path]
+            group.append((md5, compress_pool.submit(encode_image, image_path, target_width)))
+            if len(group) >= batch_size:
+                submit_group()
+        
+        if group:
+            submit_group()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                finish(future)
+    
+    journal.sync()
+    stats['elapsed'] = round(time.time() - started, 3)
+    print(f"批量处理完成：成功 {stats['succeeded']}，失败 {stats['failed']}，跳过 {stats['skipped']}，"
+          f"近似重复 {stats['duplicates']}，共 {stats['total']} 张，耗时 {stats['elapsed']} 秒")
+    if batch_size > 1:
+        print(f"合并请求：每组 {batch_size} 张，{stats['retried']} 张因结果缺失或不合法改为单独请求")
+    print_cache_stats()
+    print_api_stats()
+    return stats
+
+def process_directory(directory: str, output_file: str = DEFAULT_JOURNAL, pipeline: bool = True,
+                      force: bool = False, resume: bool = True, skip_duplicates: bool = False,
+                      **batch_options):
+    """
+    处理目录中的所有图片文件
+    pipeline为False时逐张串行处理；force为True时忽略分析缓存；resume为True时跳过已提交过的图片；
+    skip_duplicates为True时跳过与图库中已有图片近似重复的图片
+    """
     if not os.path.isdir(directory):
         print(f"目录不存在：{directory}")
         return
@@ -296,28 +695,85 @@ def process_directory(directory: str, output_file: str = "rename.json"):
     supported_extensions = (".jpg", ".jpeg", ".png")
     
     # 遍历目录中的文件
-    for filename in os.listdir(directory):
-        if filename.lower().endswith(supported_extensions):
-            image_path = os.path.join(directory, filename)
-            process_image(image_path, output_file)
+    image_paths = [
+        os.path.join(directory, filename)
+        for filename in sorted(os.listdir(directory))
+        if filename.lower().endswith(supported_extensions)
+    ]
+    if pipeline:
+        return process_batch(image_paths, output_file, force=force, resume=resume,
+                             skip_duplicates=skip_duplicates, **batch_options)
+    reset_batch_stats()
+    for image_path in image_paths:
+        process_image(image_path, output_file, force, resume, skip_duplicates)
+    get_journal(output_file).sync()
+    print_cache_stats()
+    print_api_stats()
 
 def main():
     """主函数"""
-    # 示例用法
-    
-    # 1. 处理单个图片
-    image_path = "example.jpg"  # 替换为你要处理的图片路径
-    if os.path.exists(image_path):
-        process_image(image_path)
-    else:
-        print(f"图片文件不存在：{image_path}")
-    
-    # 2. 处理目录中的所有图片
-    directory_path = "wallpapers"  # 替换为包含图片的目录路径
-    if os.path.exists(directory_path):
-        process_directory(directory_path)
-    else:
-        print(f"目录不存在：{directory_path}")
+    parser = argparse.ArgumentParser(description='使用AI分析并重命名壁纸')
+    parser.add_argument('paths', nargs='*', help='要处理的图片或目录（默认处理 example.jpg 和 wallpapers 目录）')
+    parser.add_argument('--serial', action='store_true', help='逐张串行处理（不使用流水线）')
+    parser.add_argument('--concurrency', type=int, default=config.RENAME_API_CONCURRENCY,
+                        help='同时进行的API请求数')
+    parser.add_argument('--rate', type=float, default=config.RENAME_RATE_LIMIT,
+                        help='每秒最多发起的API请求数（0为不限）')
+    parser.add_argument('--workers', type=int, default=None, help='压缩图片的进程数（默认CPU核数）')
+    parser.add_argument('--batch-size', type=int, default=config.RENAME_BATCH_SIZE,
+                        help='每个API请求合并分析的图片数（1为每张单独请求）')
+    parser.add_argument('--output', default=DEFAULT_JOURNAL, help='重命名结果日志（JSONL）')
+    parser.add_argument('--force', action='store_true', help='忽略分析结果缓存，重新调用API分析')
+    parser.add_argument('--no-resume', action='store_true', help='不跳过日志中已提交过的图片')
+    parser.add_argument('--skip-duplicates', action='store_true',
+                        help='跳过与图库中已有图片近似重复的图片（按感知哈希，不调用API）')
+    parser.add_argument('--pregenerate', action='store_true',
+                        help='处理完成后为重命名的图片预生成缩略图和尺寸变体')
+    args = parser.parse_args()
+    try:
+        run(args)
+        if args.pregenerate and _committed_paths:
+            pregenerate(_committed_paths)
+    finally:
+        close_journals()
+
+def run(args):
+    """按命令行参数处理图片"""
+    batch_options = {
+        'compress_workers': args.workers,
+        'api_concurrency': args.concurrency,
+        'rate_limit': args.rate,
+        'batch_size': args.batch_size,
+        'force': args.force,
+        'resume': not args.no_resume,
+        'skip_duplicates': args.skip_duplicates
+    }
+    
+    if not args.paths:
+        # 示例用法
+        
+        # 1. 处理单个图片
+        image_path = "example.jpg"  # 替换为你要处理的图片路径
+        if os.path.exists(image_path):
+            process_image(image_path, args.output, args.force, not args.no_resume, args.skip_duplicates)
+        else:
+            print(f"图片文件不存在：{image_path}")
+        
+        # 2. 处理目录中的所有图片
+        directory_path = "wallpapers"  # 替换为包含图片的目录路径
+        if os.path.exists(directory_path):
+            process_directory(directory_path, args.output, pipeline=not args.serial, **batch_options)
+        else:
+            print(f"目录不存在：{directory_path}")
+        return
+    
+    for path in args.paths:
+        if os.path.isdir(path):
+            process_directory(path, args.output, pipeline=not args.serial, **batch_options)
+        elif os.path.exists(path):
+            process_image(path, args.output, args.force, not args.no_resume, args.skip_duplicates)
+        else:
+            print(f"路径不存在：{path}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
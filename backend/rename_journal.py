@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+重命名结果日志
+每处理一张图片追加一行JSON（JSONL），替代每次整体读写 rename.json；
+多条记录合并一次 fsync，异常退出最多丢失最后一批未落盘的记录，不会破坏已有内容
+
+用法：
+  python rename_journal.py compact [rename.jsonl]          压缩日志（每张图片只保留最新一条）
+  python rename_journal.py export [rename.jsonl] [rename.json]  导出为旧版 rename.json 列表格式
+  python rename_journal.py import rename.json [rename.jsonl]    把旧版 rename.json 追加到日志
+"""
+
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+from datetime import datetime
+
+DEFAULT_JOURNAL = 'rename.jsonl'
+
+
+def read_journal(path):
+    """逐条读取日志记录；最后一行不完整（写入时异常退出）时忽略"""
+    if not os.path.exists(path):
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"跳过无法解析的日志记录：{path} 第 {line_number} 行")
+
+
+def _entry_key(entry):
+    """同一张图片的记录键：有MD5时按内容，旧记录按原文件名"""
+    return entry.get('md5') or f"name:{entry.get('原名')}"
+
+
+def rebuild_mapping(path):
+    """由日志重建 图片 -> 最新一条记录 的映射（键见 _entry_key，保持首次出现的顺序）"""
+    mapping = {}
+    for entry in read_journal(path):
+        mapping[_entry_key(entry)] = entry
+    return mapping
+
+
+class RenameJournal:
+    """追加写入的重命名日志（线程安全）"""
+
+    def __init__(self, path=DEFAULT_JOURNAL, fsync_every=20, fsync_interval=2.0):
+        self.path = str(path)
+        self.fsync_every = max(1, fsync_every)
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        # 已提交图片的内容MD5，用于中断后重新运行时跳过
+        self.committed = {entry['md5'] for entry in read_journal(self.path) if entry.get('md5')}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if self._file.tell() and not self._ends_with_newline():
+            # 上次写入时异常退出留下了半行，先换行，避免新记录接在残缺内容后面
+            self._file.write('\n')
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def _ends_with_newline(self):
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    def append(self, original_name, new_name, md5=None, target_path=None):
+        """追加一条记录（写入操作系统缓冲区，按批次 fsync）"""
+        entry = {'原名': original_name, '重命名': new_name}
+        if md5:
+            entry['md5'] = md5
+        if target_path:
+            entry['path'] = target_path
+        entry['time'] = datetime.now().isoformat(timespec='seconds')
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            if md5:
+                self.committed.add(md5)
+            self._unsynced += 1
+            if (self._unsynced >= self.fsync_every
+                    or time.monotonic() - self._synced_at >= self.fsync_interval):
+                self._sync_locked()
+        return entry
+
+    def is_committed(self, md5):
+        return md5 in self.committed
+
+    def sync(self):
+        """立即把已写入的记录落盘"""
+        with self._lock:
+            self._sync_locked()
+
+    def _sync_locked(self):
+        if self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._sync_locked()
+            self._file.close()
+
+
+def _write_atomic(path, write):
+    """写入同目录临时文件并 fsync 后原子替换目标文件"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def compact(path=DEFAULT_JOURNAL):
+    """压缩日志：每张图片只保留最新一条记录，返回 (压缩前条数, 压缩后条数)"""
+    before = sum(1 for _ in read_journal(path))
+    entries = list(rebuild_mapping(path).values())
+
+    def write(f):
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+    _write_atomic(path, write)
+    return before, len(entries)
+
+
+def export_json(path=DEFAULT_JOURNAL, json_file='rename.json'):
+    """导出为旧版 rename.json 格式（[{原名, 重命名}, ...]），返回条数"""
+    entries = [{'原名': entry.get('原名'), '重命名': entry.get('重命名')} for entry in read_journal(path)]
+    _write_atomic(json_file, lambda f: json.dump(entries, f, ensure_ascii=False, indent=2))
+    return len(entries)
+
+
+def import_json(json_file, path=DEFAULT_JOURNAL):
+    """把旧版 rename.json 的记录追加到日志，返回条数"""
+    with open(json_file, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        entries = [entries]
+    journal = RenameJournal(path, fsync_every=len(entries) + 1)
+    try:
+        for entry in entries:
+            journal.append(entry.get('原名'), entry.get('重命名'))
+    finally:
+        journal.close()
+    return len(entries)
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ('compact', 'export', 'import'):
+        print(__doc__)
+        sys.exit(1)
+
+    command, args = sys.argv[1], sys.argv[2:]
+    if command == 'compact':
+        path = args[0] if args else DEFAULT_JOURNAL
+        before, after = compact(path)
+        print(f"日志压缩完成：{before} 条 -> {after} 条")
+    elif command == 'export':
+        path = args[0] if args else DEFAULT_JOURNAL
+        json_file = args[1] if len(args) > 1 else 'rename.json'
+        print(f"已导出 {export_json(path, json_file)} 条记录到 {json_file}")
+    else:
+        if not args:
+            print(__doc__)
+            sys.exit(1)
+        path = args[1] if len(args) > 1 else DEFAULT_JOURNAL
+        print(f"已导入 {import_json(args[0], path)} 条记录到 {path}")
+
+
+if __name__ == '__main__':
+    main()
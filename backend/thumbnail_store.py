@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+缩略图磁盘存储
+按图片 id（文件MD5）寻址，原子写入，超出容量上限时按 LRU 淘汰
+除固定尺寸的JPEG缩略图外，还保存按宽度分档的尺寸变体（WebP/AVIF/JPEG），共用同一容量上限
+同一文件只生成一次、同时解码原图的数量上限都通过锁文件在共用该目录的所有进程（gunicorn worker）间生效
+"""
+
+import os
+import re
+import time
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows 没有 fcntl，只会以单进程方式运行，只在进程内限制
+    fcntl = None
+
+from PIL import Image
+
+try:
+    import pillow_avif  # noqa: F401  为 Pillow 注册 AVIF 编码器（可选依赖）
+except ImportError:
+    pass
+
+# 图片 id 为32位小写十六进制MD5，同时用于防止路径穿越
+_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# 输出格式 -> (文件扩展名, MIME类型)
+FORMATS = {
+    'jpeg': ('jpg', 'image/jpeg'),
+    'webp': ('webp', 'image/webp'),
+    'avif': ('avif', 'image/avif'),
+}
+
+
+def _encoder_available(image_format):
+    Image.init()
+    return image_format.upper() in Image.SAVE
+
+
+def variant_widths(width, buckets):
+    """
+    原图需要的变体档位 [(档位, 实际宽度), ...]：变体不放大，
+    原图较窄时只保留到第一个不小于原图宽度的档位（与 srcset 一致）
+    """
+    widths = []
+    for bucket in buckets:
+        widths.append((bucket, min(bucket, width) if width else bucket))
+        if width and bucket >= width:
+            break
+    return widths
+
+
+def render_file(source_path, path, max_size=None, width=None, save_options=None):
+    """
+    解码原图，生成最大边长为 max_size 的缩略图或宽度为 width 的变体，原子写入 path
+    不依赖存储状态，可在子进程中调用
+    """
+    render_targets(source_path, [(path, max_size, width, save_options)])
+
+
+def render_targets(source_path, targets):
+    """
+    只解码一次原图，生成多个缩略图/变体：targets 为 [(path, max_size, width, save_options), ...]
+    JPEG 按最大的目标尺寸选择解码比例（1/2、1/4、1/8），其余目标从解码结果缩小
+    """
+    with Image.open(source_path) as img:
+        sizes = [_target_size(img.size, max_size, width) for _, max_size, width, _ in targets]
+        if img.format == 'JPEG':
+            img.draft('RGB', (max(w for w, _ in sizes), max(h for _, h in sizes)))
+        img.load()
+        for (path, _, _, save_options), size in zip(targets, sizes):
+            _save_rendition(img, path, size, save_options or {'format': 'JPEG'})
+
+
+def _target_size(size, max_size, width):
+    """缩略图按最大边长、变体按宽度等比缩放，不放大"""
+    original_width, original_height = size
+    if width is None:
+        scale = min(max_size / original_width, max_size / original_height)
+    else:
+        scale = width / original_width
+    if scale >= 1:
+        return size
+    return max(1, round(original_width * scale)), max(1, round(original_height * scale))
+
+
+def _save_rendition(img, path, size, save_options):
+    # 先转换模式再缩放（调色板图像只能按最近邻缩放）
+    if save_options['format'] == 'JPEG':
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+    elif img.mode not in ('RGB', 'RGBA'):
+        # WebP/AVIF 保留透明通道
+        has_alpha = 'A' in img.getbands() or 'transparency' in img.info
+        img = img.convert('RGBA' if has_alpha else 'RGB')
+
+    if img.size != size:
+        img = img.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    # 先写入同目录临时文件，再原子替换，避免读到半截文件
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    suffix = os.path.splitext(path)[1]
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', suffix=suffix, dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            img.save(f, **save_options)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class _Flight:
+    """一次进行中的生成：完成（成功或失败）后唤醒等待者"""
+
+    __slots__ = ('done', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.error = None
+
+
+class ThumbnailStore:
+    """缩略图存储管理类"""
+
+    # 缩略图生成逻辑变化时递增，旧版本文件会在启动时清理
+    FORMAT_VERSION = 1
+
+    # 命中时最多每隔这么久刷新一次文件 mtime（mtime 用作重启后的 LRU 顺序）
+    TOUCH_INTERVAL = 3600
+
+    # 跨进程的生成锁按图片ID分成的组数（锁文件数量固定，不随图库增长）
+    RENDER_LOCK_STRIPES = 256
+
+    # 解码名额全部被占用时重新尝试的间隔（秒）
+    SLOT_RETRY_INTERVAL = 0.02
+
+    def __init__(self, base_dir, size=300, quality=85, max_bytes=1024 * 1024 * 1024, variant_quality=80,
+                 max_decodes=4, manage=True):
+        self.base_dir = str(base_dir)
+        self.size = size
+        self.quality = quality
+        self.max_bytes = max_bytes
+        # 尺寸变体的编码质量（参与文件名，修改后旧变体不再使用，随LRU淘汰）
+        self.variant_quality = variant_quality
+        # 当前环境可以编码的变体格式
+        self.formats = {name for name in FORMATS if _encoder_available(name)}
+        # 尺寸、质量参与版本号，修改配置后旧缩略图自动失效
+        self.version = f'v{self.FORMAT_VERSION}-{size}-q{quality}'
+        self.root = os.path.join(self.base_dir, self.version)
+
+        self._lock = threading.Lock()
+        # 缩略图路径 -> (文件大小, 最近一次刷新mtime的时间)，按访问顺序排列
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        # 正在生成的文件：路径 -> _Flight，同一文件的并发请求等待第一个请求的结果
+        self._inflight = {}
+        # 限制同时解码原图的数量，突发请求时CPU和内存占用不随并发数或 worker 数增长：
+        # 进程内用信号量，进程间用 max_decodes 个名额锁文件
+        self.max_decodes = max(1, max_decodes)
+        self._decode_slots = threading.BoundedSemaphore(self.max_decodes)
+        # 跨进程锁文件目录（使用同一缩略图目录的进程共用）
+        self.lock_dir = os.path.join(self.base_dir, '.locks')
+        self._render_stats = {'renders': 0, 'coalesced': 0, 'adopted': 0}
+
+        os.makedirs(self.root, exist_ok=True)
+        os.makedirs(self.lock_dir, exist_ok=True)
+        # manage 为False时只用于计算路径和编码参数（pregenerate.py）：
+        # 不清理旧版本、不扫描已有文件、不淘汰，容量统一由 Web 进程管理
+        if manage:
+            self._purge_old_versions()
+            self._load_entries()
+
+    @staticmethod
+    def is_valid_id(image_id):
+        """检查图片ID格式是否合法"""
+        return bool(_ID_PATTERN.match(image_id or ''))
+
+    def path_for(self, image_id, width=None, image_format='jpeg'):
+        """
+        缩略图（width为None）或尺寸变体的文件路径
+        按ID前两位分目录，避免单目录文件过多
+        """
+        if width is None:
+            name = f'{image_id}.jpg'
+        else:
+            name = f'{image_id}-w{width}-q{self.variant_quality}.{FORMATS[image_format][0]}'
+        return os.path.join(self.root, image_id[:2], name)
+
+    def etag_for(self, image_id, width=None, image_format='jpeg'):
+        """缩略图/变体的ETag：图片ID加版本、宽度档位与格式（内容由这些参数唯一确定）"""
+        if width is None:
+            return f'{image_id}-{self.version}'
+        return f'{image_id}-{self.version}-w{width}-q{self.variant_quality}-{image_format}'
+
+    def get(self, image_id, width=None, image_format='jpeg'):
+        """查找已生成的缩略图或变体，命中返回文件路径，未命中返回None"""
+        path = self.path_for(image_id, width, image_format)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                return self._adopt(path)
+            self._entries.move_to_end(path)
+            size, touched_at = entry
+            now = time.time()
+            if now - touched_at < self.TOUCH_INTERVAL:
+                return path
+            self._entries[path] = (size, now)
+
+        try:
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            # 文件被外部删除，从索引中移除
+            self.forget(image_id, width, image_format)
+            return None
+        return path
+
+    def _adopt(self, path):
+        """
+        登记其他进程（同一目录下的其他 gunicorn worker）已生成的缩略图（调用方需持有锁）
+        不存在时返回None
+        """
+        try:
+            size = os.stat(path).st_size
+        except FileNotFoundError:
+            return None
+        self._entries[path] = (size, time.time())
+        self._total_bytes += size
+        return path
+
+    def render(self, image_id, source_path, width=None, image_format='jpeg'):
+        """
+        从原图生成缩略图（width为None）或指定宽度档位的变体，原子写入存储，返回文件路径
+        同一文件同时只生成一次：并发请求等待第一个请求的结果（失败时抛出同样的异常）
+        """
+        path = self.path_for(image_id, width, image_format)
+        with self._lock:
+            flight = self._inflight.get(path)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[path] = _Flight()
+            else:
+                self._render_stats['coalesced'] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return path
+
+        try:
+            # 其他 worker 正在生成同一文件时等待其完成，之后直接使用其结果
+            with self._render_lock(image_id):
+                # 等待期间其他进程（另一个 gunicorn worker 或 pregenerate.py）可能已生成
+                if os.path.exists(path):
+                    self._render_stats['adopted'] += 1
+                else:
+                    with self._decode_slot():
+                        render_file(source_path, path, *self.render_options(width, image_format))
+                    self._render_stats['renders'] += 1
+            self.add_rendered(path)
+            return path
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[path]
+            flight.done.set()
+
+    @contextmanager
+    def _render_lock(self, image_id):
+        """跨进程的生成锁（按图片ID分组的锁文件，阻塞等待）"""
+        if fcntl is None:
+            yield
+            return
+        stripe = int(image_id[:4], 16) % self.RENDER_LOCK_STRIPES
+        fd = os.open(os.path.join(self.lock_dir, f'render-{stripe}.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            # 关闭文件描述符即释放锁
+            os.close(fd)
+
+    @contextmanager
+    def _decode_slot(self):
+        """占用一个解码名额：先取进程内名额，再取 max_decodes 个名额锁文件中空闲的一个"""
+        with self._decode_slots:
+            if fcntl is None:
+                yield
+                return
+            fd = self._acquire_slot_file()
+            try:
+                yield
+            finally:
+                os.close(fd)
+
+    def _acquire_slot_file(self):
+        """依次尝试各名额锁文件（非阻塞），都被其他进程占用时稍后重试，返回持有锁的文件描述符"""
+        while True:
+            for slot in range(self.max_decodes):
+                fd = os.open(os.path.join(self.lock_dir, f'decode-{slot}.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return fd
+                except OSError:
+                    os.close(fd)
+            time.sleep(self.SLOT_RETRY_INTERVAL)
+
+    def render_options(self, width=None, image_format='jpeg'):
+        """render_file 的参数 (缩略图最大边长, 变体宽度, 编码参数)，可传给其他进程使用"""
+        if width is None:
+            return self.size, None, {'format': 'JPEG', 'quality': self.quality}
+        return None, width, self._variant_options(image_format)
+
+    def add_rendered(self, path):
+        """登记本进程生成的文件并按需淘汰"""
+        self._add_entry(path, os.path.getsize(path))
+
+    def _variant_options(self, image_format):
+        """尺寸变体的编码参数"""
+        if image_format == 'webp':
+            return {'format': 'WEBP', 'quality': self.variant_quality, 'method': 4}
+        if image_format == 'avif':
+            # AVIF 同等观感下可用更低的质量值
+            return {'format': 'AVIF', 'quality': max(1, self.variant_quality - 20), 'speed': 8}
+        return {'format': 'JPEG', 'quality': self.variant_quality, 'optimize': True, 'progressive': True}
+
+    def forget(self, image_id, width=None, image_format='jpeg'):
+        """从索引中移除缩略图或变体（文件已不存在时使用）"""
+        path = self.path_for(image_id, width, image_format)
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry:
+                self._total_bytes -= entry[0]
+
+    def stats(self):
+        """存储统计信息"""
+        with self._lock:
+            return {
+                'version': self.version,
+                'count': len(self._entries),
+                'total_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+                'rendering': len(self._inflight),
+                **self._render_stats
+            }
+
+    def _add_entry(self, path, size):
+        """登记新缩略图并按需淘汰最久未访问的文件"""
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old:
+                self._total_bytes -= old[0]
+            self._entries[path] = (size, time.time())
+            self._total_bytes += size
+            evicted = self._evict_locked()
+        self._remove_files(evicted)
+
+    def _evict_locked(self):
+        """超出容量时淘汰最久未访问的条目（调用方需持有锁），返回待删除文件"""
+        evicted = []
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            old_path, (old_size, _) = self._entries.popitem(last=False)
+            self._total_bytes -= old_size
+            evicted.append(old_path)
+        return evicted
+
+    @staticmethod
+    def _remove_files(paths):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _load_entries(self):
+        """启动时扫描已有缩略图，按 mtime 恢复 LRU 顺序"""
+        found = []
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                st = entry.stat()
+                if entry.name.startswith('.tmp-'):
+                    # 上次异常退出遗留的临时文件（较新的可能是其他进程正在写入）
+                    if time.time() - st.st_mtime > self.TOUCH_INTERVAL:
+                        os.remove(entry.path)
+                    continue
+                found.append((st.st_mtime, entry.path, st.st_size))
+
+        found.sort()
+        for mtime, path, size in found:
+            self._entries[path] = (size, mtime)
+            self._total_bytes += size
+
+        # 容量上限被调小时立即淘汰
+        with self._lock:
+            evicted = self._evict_locked()
+        self._remove_files(evicted)
+
+    def _purge_old_versions(self):
+        """删除其他版本（旧尺寸/旧质量）的缩略图目录"""
+        for entry in os.scandir(self.base_dir):
+            if entry.is_dir() and entry.name.startswith('v') and entry.name != self.version:
+                print(f"清理旧版本缩略图: {entry.name}")
+                shutil.rmtree(entry.path, ignore_errors=True)
@@ -7,7 +7,9 @@ var jigsaw = {
     count: 0,
     halfHtml: '',
     loadBig: false,
-    ajaxing: false
+    ajaxing: false,
+    cursor: null,  // 下一页游标（上一页响应中的 next_cursor）
+    finished: false
 };
 
 window.onresize = function () {
@@ -68,7 +70,9 @@ function loadData(types, newload) {
             count: 0,
             halfHtml: '',
             loadBig: false,
-            ajaxing: false
+            ajaxing: false,
+            cursor: null,
+            finished: false
         };
         $("#walBox").html('');
         $(".onepage-pagination").remove();
@@ -79,7 +83,7 @@ function loadData(types, newload) {
         $("#categories-list li").removeClass("active");
         $("#categories-list li[data-id='" + types + "']").addClass("active");
     }
-    ajax360Wal(seting.types, jigsaw.count, 30)
+    ajax360Wal(seting.types, jigsaw.cursor, 30)
 }
 
 resizeHeight();
@@ -94,7 +98,19 @@ function resizeHeight() {
     return true
 }
 
-function addJigsaw(thumbnail, original, alt) {
+// 图片链接：缩略图带 srcset 由浏览器按显示宽度选择尺寸变体，
+// 大图浏览同样通过 data-srcset 加载合适宽度的变体，原图仅用于下载
+function jigsawLink(thumbnail, original, alt, srcset, sizes) {
+    var link = '<a href="' + original + '" data-fancybox="images"';
+    var img = '<img src="' + thumbnail + '"';
+    if (srcset) {
+        link += ' data-srcset="' + srcset + '" data-sizes="100vw" data-download-src="' + original + '"';
+        img += ' srcset="' + srcset + '" sizes="' + sizes + '"';
+    }
+    return link + '>' + img + ' alt="' + alt + '" title="标签：' + alt + '" class="pimg"></a>';
+}
+
+function addJigsaw(thumbnail, original, alt, srcset) {
     var newHtml;
     var imgWidth, imgHeight;
     jigsaw.count++;
@@ -102,7 +118,7 @@ function addJigsaw(thumbnail, original, alt) {
     if (jigsaw.halfHtml !== '') {
         imgWidth = parseInt(screen.width / 4);
         imgHeight = parseInt(imgWidth * seting.ratio);
-        newHtml = '<div class="Hhalf oneImg"><a href="' + original + '" data-fancybox="images"><img src="' + thumbnail + '" alt="' + alt + '" title="标签：' + alt + '" class="pimg"></a></div></div>';
+        newHtml = '<div class="Hhalf oneImg">' + jigsawLink(thumbnail, original, alt, srcset, '25vw') + '</div></div>';
         contAdd(jigsaw.halfHtml + newHtml);
         jigsaw.halfHtml = '';
         return true;
@@ -115,7 +131,7 @@ function addJigsaw(thumbnail, original, alt) {
     if ((jigsaw.loadBig === false) && ((Math.floor(Math.random() * 3) === 0) || ((jigsaw.count % 5) === 0))) {
         imgWidth = parseInt(screen.width / 2);
         imgHeight = parseInt(imgWidth * seting.ratio);
-        newHtml = '<div class="item half oneImg"><a href="' + original + '" data-fancybox="images"><img src="' + thumbnail + '" alt="' + alt + '" title="标签：' + alt + '" class="pimg"></a></div>';
+        newHtml = '<div class="item half oneImg">' + jigsawLink(thumbnail, original, alt, srcset, '50vw') + '</div>';
         contAdd(newHtml);
         jigsaw.loadBig = true;
         return true;
@@ -123,7 +139,7 @@ function addJigsaw(thumbnail, original, alt) {
     
     imgWidth = parseInt(screen.width / 4);
     imgHeight = parseInt(imgWidth * seting.ratio);
-    jigsaw.halfHtml = '<div class="item quater"><div class="Hhalf oneImg"><a href="' + original + '" data-fancybox="images"><img src="' + thumbnail + '" alt="' + alt + '" title="标签：' + alt + '" class="pimg"></a></div>';
+    jigsaw.halfHtml = '<div class="item quater"><div class="Hhalf oneImg">' + jigsawLink(thumbnail, original, alt, srcset, '25vw') + '</div>';
     return true;
 }
 
@@ -137,8 +153,8 @@ function contAdd(html) {
     })
 }
 
-function ajax360Wal(cid, start, count) {
-    if (jigsaw.ajaxing === true) return false;
+function ajax360Wal(cid, cursor, count) {
+    if (jigsaw.ajaxing === true || jigsaw.finished === true) return false;
     $("#loadmore").html('努力加载中……');
     $("#loadmore").show();
     jigsaw.ajaxing = true;
@@ -146,7 +162,7 @@ function ajax360Wal(cid, start, count) {
     $.ajax({
         type: "GET",
         url: seting.apiUrl,
-        data: "cid=" + cid + "&start=" + start + "&count=" + count,
+        data: "cid=" + cid + "&count=" + count + (cursor ? "&after=" + cursor : "&start=0"),
         dataType: "json",
         success: function (jsonData) {
             console.log("API响应:", jsonData);
@@ -156,13 +172,17 @@ function ajax360Wal(cid, start, count) {
                 for (var i = 0; i < jsonData.data.length; i++) {
                     var imgData = jsonData.data[i];
                     console.log("处理图片:", imgData);
-                    addJigsaw(imgData.thumbnail, imgData.url, imgData.tag || '未分类')
+                    addJigsaw(imgData.thumbnail, imgData.url, imgData.tag || '未分类', imgData.srcset)
                 }
                 resizeHeight();
                 jigsaw.ajaxing = false;
+                jigsaw.cursor = jsonData.next_cursor;
                 
-                if (jsonData.data.length === 0) {
-                    $("#loadmore").html('所有的壁纸都已经加载完啦！')
+                if (!jsonData.next_cursor) {
+                    // 没有下一页游标，说明已经加载到最后
+                    jigsaw.finished = true;
+                    $("#loadmore").html('所有的壁纸都已经加载完啦！');
+                    $("#loadmore").show()
                 } else {
                     $("#loadmore").hide()
                 }